@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""This code benchmarks the game ticks on a synthetic world without starting the server"""
+
+import argparse
+import json
+import os
+
+from website.benchmark import (
+    backup_database,
+    create_benchmark_app,
+    facility_mixes,
+    format_query_results,
+    format_results,
+    generate_world,
+    load_world,
+    make_scratch_dir,
+    query_configurations,
+    run_query_benchmark,
+    run_ticks,
+    save_world,
+)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--ticks", type=int, default=100, help="Number of ticks to simulate (default: 100)")
+parser.add_argument("--players", type=int, default=50, help="Number of synthetic players (default: 50)")
+parser.add_argument("--networks", type=int, default=5, help="Number of networks (default: 5)")
+parser.add_argument(
+    "--network_share",
+    type=float,
+    default=0.8,
+    help="Share of the players that are in a network (default: 0.8)",
+)
+parser.add_argument(
+    "--mix",
+    choices=list(facility_mixes),
+    default="mixed",
+    help="Facility mix of the players (default: mixed)",
+)
+parser.add_argument("--scale", type=int, default=1, help="Multiplier of the number of facilities (default: 1)")
+parser.add_argument("--storage", type=int, default=2, help="Storage facilities per player (default: 2)")
+parser.add_argument("--shipments", type=int, default=2, help="Ongoing shipments per player (default: 2)")
+parser.add_argument("--constructions", type=int, default=2, help="Ongoing constructions per player (default: 2)")
+parser.add_argument("--seed", type=int, default=0, help="Seed of the world generation (default: 0)")
+parser.add_argument(
+    "--in_game_seconds_per_tick",
+    type=int,
+    default=240,
+    help="Set how many in-game seconds are in a tick (default: 240)",
+)
+parser.add_argument(
+    "--market_clearing",
+    choices=["serial", "threads", "processes"],
+    default="serial",
+    help="Clear the markets of the networks serially or in a pool of threads or processes (default: serial)",
+)
+parser.add_argument("--market_workers", type=int, default=None, help="Number of market clearing workers")
+parser.add_argument("--save", help="Save the generated world to this directory before running the ticks")
+parser.add_argument("--load", help="Load a world saved with --save instead of generating one")
+parser.add_argument(
+    "--queries",
+    help="Also compare the hot database queries and commits before and after the indexes and the performance profile",
+    action="store_true",
+)
+parser.add_argument("--json", help="Write the results to this file as JSON")
+parser.add_argument("--scratch_dir", help="Directory for the files written by the engine (default: temporary)")
+
+args = parser.parse_args()
+
+# the paths given by the user are relative to the current directory, the benchmark runs in the scratch directory
+save_path = os.path.abspath(args.save) if args.save else None
+load_path = os.path.abspath(args.load) if args.load else None
+json_path = os.path.abspath(args.json) if args.json else None
+scratch_dir = os.path.abspath(args.scratch_dir) if args.scratch_dir else make_scratch_dir()
+
+app, engine = create_benchmark_app(
+    scratch_dir,
+    in_game_seconds_per_tick=args.in_game_seconds_per_tick,
+    market_clearing=args.market_clearing,
+    market_workers=args.market_workers,
+)
+with app.app_context():
+    if load_path:
+        parameters = load_world(engine, load_path)
+        engine.log(f"loaded world {parameters}")
+    else:
+        parameters = {
+            "players": args.players,
+            "networks": args.networks,
+            "network_share": args.network_share,
+            "mix": args.mix,
+            "scale": args.scale,
+            "storage": args.storage,
+            "shipments": args.shipments,
+            "constructions": args.constructions,
+            "seed": args.seed,
+        }
+        engine.log(f"generating world {parameters}")
+        generate_world(engine, **parameters)
+        if save_path:
+            save_world(engine, save_path, parameters)
+            engine.log(f"saved world to {save_path}")
+    results = run_ticks(engine, args.ticks)
+    query_results = {}
+    if args.queries:
+        # the profiles only apply to database files, the benchmark runs on a copy of the in-memory database
+        backup_database("query_benchmark.db")
+        for profile, indexes in query_configurations:
+            configuration = f"{profile}{' + indexes' if indexes else ''}"
+            query_results[configuration] = run_query_benchmark("query_benchmark.db", profile, indexes)
+
+engine.clearing_pool.shutdown()
+print(format_results(results))
+if query_results:
+    print(format_query_results(query_results))
+if json_path:
+    with open(json_path, "w") as file:
+        json.dump({"world": parameters, "results": results, "queries": query_results}, file, indent=4)
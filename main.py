@@ -37,6 +37,62 @@ parser.add_argument(
     default=42,
     help="Set the random seed",
 )
+parser.add_argument(
+    "--admins",
+    nargs="*",
+    default=[],
+    help="Usernames of the players that have access to the admin endpoints",
+)
+parser.add_argument(
+    "--market_clearing",
+    choices=["serial", "threads", "processes"],
+    default="serial",
+    help="Clear the markets of the networks serially or in a pool of processes, threads don't scale with the number of "
+    "cores and are only meant for debugging (default: serial)",
+)
+parser.add_argument(
+    "--market_workers",
+    type=int,
+    default=None,
+    help="Number of workers used to clear the markets in parallel (default: number of CPUs)",
+)
+
+parser.add_argument(
+    "--weather_forecast_ticks",
+    type=int,
+    default=180,
+    help="Number of ticks for which the weather is precomputed in the background, 0 to disable (default: 180)",
+)
+parser.add_argument(
+    "--time_series_dtype",
+    choices=["float64", "float32"],
+    default="float64",
+    help="Precision of the stored chart data, float32 halves the size of the files (default: float64)",
+)
+parser.add_argument(
+    "--migration_workers",
+    type=int,
+    default=None,
+    help="Number of processes that migrate the instance data to a new schema at startup (default: number of CPUs)",
+)
+parser.add_argument(
+    "--database_profile",
+    choices=["default", "performance"],
+    default="performance",
+    help="SQLite settings: default, or performance for WAL, larger caches and connection pool (default: performance)",
+)
+parser.add_argument(
+    "--chart_cache_mb",
+    type=int,
+    default=64,
+    help="Memory limit of the cache of the chart payloads of the players in MB (default: 64)",
+)
+parser.add_argument(
+    "--compression_min_size",
+    type=int,
+    default=1024,
+    help="Minimum size in bytes of the HTTP responses that are compressed with gzip or deflate (default: 1024)",
+)
 
 args = parser.parse_args()
 
@@ -46,6 +102,15 @@ socketio, sock, app = create_app(
     run_init_test_players=args.run_init_test_players,
     rm_instance=args.rm_instance,
     random_seed=args.random_seed,
+    admins=args.admins,
+    market_clearing=args.market_clearing,
+    market_workers=args.market_workers,
+    weather_forecast_ticks=args.weather_forecast_ticks,
+    time_series_dtype=args.time_series_dtype,
+    migration_workers=args.migration_workers,
+    database_profile=args.database_profile,
+    chart_cache_mb=args.chart_cache_mb,
+    compression_min_size=args.compression_min_size,
 )
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+"""Tests of the capacity data loaded from the saves made before the capacities were updated incrementally"""
+
+import pickle
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from website import db
+from website.config.assets import const_config
+from website.database.engine_data import CapacityData
+from website.database.map import Hex  # noqa: F401 (mapped for the relationships of the players)
+from website.database.player_assets import ActiveFacility
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["engine"] = SimpleNamespace(
+        const_config=const_config,
+        in_game_seconds_per_tick=240,
+        power_facilities=["steam_engine", "coal_burner", "gas_burner"],
+        storage_facilities=["small_pumped_hydro"],
+        extraction_facilities=["coal_mine"],
+        data={"player_capacities": {}, "network_capacities": {}},
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def add_facility(player_id, facility):
+    db.session.add(
+        ActiveFacility(
+            facility=facility,
+            player_id=player_id,
+            price_multiplier=1.0,
+            multiplier_1=1.0,
+            multiplier_2=1.0,
+            multiplier_3=1.0,
+        )
+    )
+
+
+def old_save(capacities):
+    """Pickles and loads `capacities` as they were saved before `_counts` existed"""
+    state = {"_data": capacities.get_all()}
+    old = CapacityData.__new__(CapacityData)
+    old.__setstate__(pickle.loads(pickle.dumps(state)))
+    return old
+
+
+def test_update_network_from_old_save(app):
+    engine = app.config["engine"]
+    players = [SimpleNamespace(id=1, network=None), SimpleNamespace(id=2, network=None)]
+    add_facility(1, "steam_engine")
+    add_facility(1, "coal_burner")
+    add_facility(2, "steam_engine")
+    add_facility(2, "gas_burner")
+    add_facility(2, "small_pumped_hydro")
+    db.session.commit()
+
+    for player in players:
+        capacities = CapacityData()
+        capacities.update(player, None)
+        engine.data["player_capacities"][player.id] = old_save(capacities)
+    network = SimpleNamespace(id=1, members=players)
+    network_capacities = old_save(CapacityData())
+    engine.data["network_capacities"][network.id] = network_capacities
+
+    network_capacities.update_network(network)
+
+    steam_engine_power = const_config["assets"]["steam_engine"]["base_power_generation"]
+    assert network_capacities.counts() == {
+        "steam_engine": 2,
+        "coal_burner": 1,
+        "gas_burner": 1,
+        "small_pumped_hydro": 1,
+    }
+    assert network_capacities["steam_engine"]["power"] == pytest.approx(2 * steam_engine_power)
+    for player in players:
+        assert engine.data["player_capacities"][player.id].counts() is not None
+
+    # the network is then updated incrementally
+    network_capacities.change_network_power(network, "gas_burner", 1.0, -1)
+    assert "gas_burner" not in network_capacities.get_all()
@@ -1,5 +1,10 @@
 """This code is run once at the start of the game"""
 
+import time
+
+# the import of the modules is the first phase of the startup timing breakdown
+import_start = time.perf_counter()
+
 import eventlet
 
 eventlet.monkey_patch(thread=True, time=True)
@@ -10,9 +15,7 @@ eventlet.monkey_patch(thread=True, time=True)
 import atexit
 import base64
 import cProfile
-import csv
 import os
-import pickle
 import platform
 import pstats
 import secrets
@@ -34,7 +37,13 @@ db = SQLAlchemy()
 
 import website.game_engine
 
+from .database import checkpoint, market_log, migrations, sqlite_profile, time_series
 from .database.player import Player
+from .utils import binary_messages
+from .utils.compression import compress_response
+from .utils.electricity_market import ClearingPool
+from .utils.tick_metrics import StartupTimer
+from .utils.weather_forecast import WeatherForecast
 
 
 def get_or_create_flask_secret_key() -> str:
@@ -81,8 +90,25 @@ def get_or_create_vapid_keys() -> type[str, str]:
         return public_key, private_key
 
 
-def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_instance, random_seed):
+def create_app(
+    clock_time,
+    in_game_seconds_per_tick,
+    run_init_test_players,
+    rm_instance,
+    random_seed,
+    admins=(),
+    market_clearing="serial",
+    market_workers=None,
+    weather_forecast_ticks=0,
+    time_series_dtype="float64",
+    migration_workers=None,
+    database_profile="default",
+    chart_cache_mb=64,
+    compression_min_size=None,
+):
     """This function sets up the app and the game engine"""
+    timer = StartupTimer(import_start)
+    timer.mark("imports")
     # gets lock to avoid multiple instances
     if platform.system() == "Linux":
         lock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
@@ -93,12 +119,17 @@ def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_i
     Path("instance").mkdir(exist_ok=True)
     app.config["SECRET_KEY"] = get_or_create_flask_secret_key()
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///database.db"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_profile.engine_options(database_profile)
     (app.config["VAPID_PUBLIC_KEY"], app.config["VAPID_PRIVATE_KEY"]) = get_or_create_vapid_keys()
     app.config["VAPID_CLAIMS"] = {"sub": "mailto:felixvonsamson@gmail.com"}
+    app.config["ADMINS"] = set(admins)
     db.init_app(app)
+    with app.app_context():
+        sqlite_profile.set_pragmas(db.engine, database_profile)
 
     # creates the engine (and loading the save if it exists)
-    engine = website.game_engine.GameEngine(clock_time, in_game_seconds_per_tick, random_seed)
+    with timer.measure("engine"):
+        engine = website.game_engine.GameEngine(clock_time, in_game_seconds_per_tick, random_seed)
 
     if rm_instance:
         engine.log("removing instance")
@@ -107,28 +138,46 @@ def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_i
     from .utils.game_engine import data_init_climate
 
     Path("instance/player_data").mkdir(parents=True, exist_ok=True)
-    if not os.path.isfile("instance/server_data/climate_data.pck"):
-        Path("instance/server_data").mkdir(parents=True, exist_ok=True)
-        with open("instance/server_data/climate_data.pck", "wb") as file:
+    Path("instance/server_data").mkdir(parents=True, exist_ok=True)
+    engine.time_series_dtype = time_series_dtype
+    with timer.measure("instance"):
+        time_series.convert_pickles(time_series_dtype, engine.log)
+        market_log.convert_pickles(engine.log)
+        migrations.migrate_instance(migration_workers, engine.log)
+        if not os.path.isdir(time_series.climate_store_path):
             climate_data = data_init_climate(
                 in_game_seconds_per_tick, engine.data["random_seed"], engine.data["delta_t"]
             )
-            pickle.dump(climate_data, file)
+            time_series.create_store(time_series.climate_store_path, climate_data, time_series_dtype)
+
+    # the clear sky irradiance table is built at the first start and then loaded from the disk
+    from .utils.clear_sky import load_table
+
+    with timer.measure("clear sky table"):
+        load_table(engine.log)
 
-    if os.path.isfile("instance/engine_data.pck"):
-        with open("instance/engine_data.pck", "rb") as file:
-            engine.data = pickle.load(file)
-            engine.log("Loaded engine data from disk.")
+    with timer.measure("engine data"):
+        engine_data = checkpoint.load_engine_data()
+    if engine_data is not None:
+        engine.data = engine_data
+        engine.log("Loaded engine data from disk.")
     app.config["engine"] = engine
+    engine.clearing_pool = ClearingPool(market_clearing, market_workers)
+    if engine.clearing_pool.mode != "serial":
+        engine.log(f"clearing the markets with {engine.clearing_pool.workers} {engine.clearing_pool.mode}")
+    engine.weather_forecast = WeatherForecast(weather_forecast_ticks)
+    engine.chart_cache.max_bytes = chart_cache_mb * 1024 * 1024
 
     # initialize socketio :
+    handlers_start = time.perf_counter()
     socketio = SocketIO(app, cors_allowed_origins="*")  # engineio_logger=True
     engine.socketio = socketio
     from .api.socketio_handlers import add_handlers
 
     add_handlers(socketio=socketio, engine=engine)
 
-    # initialize sock for WebSockets:
+    # initialize sock for WebSockets, the clients can opt into the binary encoding of the messages at the handshake:
+    app.config["SOCK_SERVER_OPTIONS"] = {"subprotocols": [binary_messages.subprotocol]}
     sock = Sock(app)
     engine.sock = sock
     from .api.websocket import add_sock_handlers
@@ -148,6 +197,14 @@ def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_i
     app.register_blueprint(auth, url_prefix="/")
     app.register_blueprint(http, url_prefix="/api/")
     app.register_blueprint(websocket_blueprint, url_prefix="/api/")
+    timer.phases["handlers"] = time.perf_counter() - handlers_start
+
+    if compression_min_size is not None:
+
+        @app.after_request
+        def compress(response):
+            """Compresses the responses larger than `compression_min_size` for the clients that accept it"""
+            return compress_response(response, compression_min_size)
 
     @app.route("/subscribe", methods=["GET", "POST"])
     def subscribe():
@@ -181,29 +238,17 @@ def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_i
         """
         return send_file("static/apple-app-site-association", as_attachment=True)
 
-    from .database.map import Hex
+    from .database.map import Hex, insert_map
     from .database.messages import Chat
 
     # initialize database :
-    with app.app_context():
+    with app.app_context(), timer.measure("database"):
         db.create_all()
+        with db.engine.begin() as connection:
+            migrations.migrate_database(connection, engine.log)
         # if map data not already stored in database, read map.csv and store it in database
         if Hex.query.count() == 0:
-            with open("website/static/data/map.csv", "r") as file:
-                csv_reader = csv.DictReader(file)
-                for row in csv_reader:
-                    hex = Hex(
-                        q=row["q"],
-                        r=row["r"],
-                        solar=float(row["solar"]),
-                        wind=float(row["wind"]),
-                        hydro=float(row["hydro"]),
-                        coal=float(row["coal"]),
-                        gas=float(row["gas"]),
-                        uranium=float(row["uranium"]),
-                        climate_risk=float(row["climate_risk"]),
-                    )
-                    db.session.add(hex)
+            insert_map()
 
         # creating general chat
         if Chat.query.count() == 0:
@@ -235,10 +280,13 @@ def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_i
             if check_password_hash(player.pwhash, password):
                 return player
 
+    engine.startup_timings = timer.phases
+    engine.log(timer.summary())
+
     # initialize the schedulers and add the recurrent functions :
     # This function is to run the following only once, TO REMOVE IF DEBUG MODE IS SET TO FALSE
     if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        from .utils.game_engine import state_update
+        from .utils.game_engine import flush_facility_usage, flush_write_behind, state_update
 
         scheduler = APScheduler()
         scheduler.init_app(app)
@@ -252,6 +300,11 @@ def create_app(clock_time, in_game_seconds_per_tick, run_init_test_players, rm_i
             misfire_grace_time=10,
         )
         scheduler.start()
+        # exit handlers run in reverse order: the scheduler is stopped before the usages are written
+        atexit.register(flush_write_behind, app)
+        atexit.register(flush_facility_usage, engine, app)
+        atexit.register(engine.checkpointer.wait)
+        atexit.register(engine.clearing_pool.shutdown)
         atexit.register(lambda: scheduler.shutdown())
 
         if run_init_test_players:
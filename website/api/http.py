@@ -1,12 +1,9 @@
 """These functions make the link between the website and the database"""
 
 import json
-import pickle
 from datetime import datetime
 from functools import wraps
-from pathlib import Path
 
-import numpy as np
 from flask import Blueprint, current_app, flash, g, jsonify, redirect, request
 from flask_login import current_user, login_required
 
@@ -16,6 +13,7 @@ import website.utils.misc
 import website.utils.network
 import website.utils.resource_market
 from website.config.assets import wind_power_curve
+from website.database import market_log
 from website.database.map import Hex
 from website.database.player import Network, Player
 from website.technology_effects import get_current_technology_values
@@ -45,6 +43,18 @@ def log_action(func):
     return wrapper
 
 
+def admin_required(func):
+    """This decorator restricts an endpoint to the admins of the server"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if current_user.username not in current_app.config["ADMINS"]:
+            return "", 403
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
 @http.before_request
 @login_required
 def check_user():
@@ -89,6 +99,17 @@ def get_wind_power_curve():
     return jsonify(wind_power_curve)
 
 
+@http.route("/get_weather_forecast", methods=["GET"])
+def get_weather_forecast():
+    """
+    Gets the solar irradiance, wind speed and river discharge at the tile of the player for the next ticks, one list
+    per value starting at tick `first_tick`
+    """
+    if current_user.tile is None:
+        return "", 404
+    return jsonify(g.engine.weather_forecast.package(g.engine, current_user))
+
+
 # gets the map data from the database and returns it as a array of dictionaries :
 @http.route("/get_map", methods=["GET"])
 def get_map():
@@ -148,67 +169,31 @@ def get_resource_data():
 
 @http.route("/get_chart_data", methods=["GET"])
 def get_chart_data():
-    """gets the data for the overview charts"""
-
-    def calculate_mean_subarrays(array, x):
-        return [np.mean(array[i : i + x]) for i in range(0, len(array), x)]
-
-    def concat_slices(dict1, dict2):
-        for key, value in dict2.items():
-            for sub_key, array2 in value.items():
-                if sub_key not in dict1[key]:
-                    dict1[key][sub_key] = [[0.0] * 360] * 5
-                array = dict1[key][sub_key]
-                concatenated_array = list(array[0]) + array2
-                dict1[key][sub_key][0] = concatenated_array[-360:]
-                new_5days = calculate_mean_subarrays(array2, 5)
-                dict1[key][sub_key][1] = dict1[key][sub_key][1][len(new_5days) :]
-                dict1[key][sub_key][1].extend(new_5days)
-                new_month = calculate_mean_subarrays(new_5days, 6)
-                l2v = dict1[key][sub_key][2][-2:]
-                dict1[key][sub_key][2] = dict1[key][sub_key][2][len(new_month) :]
-                dict1[key][sub_key][2].extend(new_month)
-                new_6month = calculate_mean_subarrays(new_month, 6)
-                if total_t % 180 >= 120:
-                    new_6month[0] = new_6month[0] / 3 + l2v[0] / 3 + l2v[1] / 3
-                elif total_t % 180 >= 60:
-                    new_6month[0] = new_6month[0] / 2 + l2v[1] / 2
-                dict1[key][sub_key][3] = dict1[key][sub_key][3][len(new_6month) :]
-                dict1[key][sub_key][3].extend(new_6month)
-
+    """
+    gets the data for the overview charts. The payload is cached until the next tick and has an ETag, a request with
+    the ETag of the current payload in `If-None-Match` gets an empty 304 response. With `since=<total_t>`, the tick of
+    the charts the client already has, only the points that have changed since are sent when possible.
+    """
     if current_user.tile is None:
         return "", 404
-    total_t = g.engine.data["total_t"]
-    current_data = g.engine.data["current_data"][current_user.id].get_data(t=total_t % 216 + 1)
-    filename = f"instance/player_data/player_{current_user.id}.pck"
-    with open(filename, "rb") as file:
-        data = pickle.load(file)
-    concat_slices(data, current_data)
-
-    network_data = None
-    if current_user.network is not None:
-        current_network_data = g.engine.data["network_data"][current_user.network.id].get_data(t=total_t % 216 + 1)
-        filename = f"instance/network_data/{current_user.network.id}/time_series.pck"
-        with open(filename, "rb") as file:
-            network_data = pickle.load(file)
-        concat_slices(network_data, current_network_data)
-
-    current_climate_data = g.engine.data["current_climate_data"].get_data(t=total_t % 216 + 1)
-    with open("instance/server_data/climate_data.pck", "rb") as file:
-        climate_data = pickle.load(file)
-    concat_slices(climate_data, current_climate_data)
-
-    cumulative_emissions = g.engine.data["player_cumul_emissions"][current_user.id].get_all()
-
-    return jsonify(
-        {
-            "total_t": total_t,
-            "data": data,
-            "network_data": network_data,
-            "climate_data": climate_data,
-            "cumulative_emissions": cumulative_emissions,
-        }
+    since = request.args.get("since", type=int)
+    if since is not None:
+        # without a delta, the full payload is served from the cache
+        chart_data = misc.package_chart_data(g.engine, current_user, since, fallback=False)
+        if chart_data is not None:
+            return jsonify(chart_data)
+    network_id = current_user.network.id if current_user.network is not None else None
+    payload, etag = g.engine.chart_cache.get(
+        current_user.id,
+        g.engine.data["total_t"],
+        network_id,
+        lambda: jsonify(misc.package_chart_data(g.engine, current_user)).get_data(),
     )
+    response = current_app.response_class(payload, mimetype="application/json")
+    response.set_etag(etag)
+    # the browsers have to revalidate their copy at every request
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @http.route("/get_current_weather", methods=["GET"])
@@ -217,6 +202,21 @@ def get_current_weather():
     return jsonify(website.utils.misc.package_weather_data(g.engine, current_user))
 
 
+@http.route("/get_tick_metrics", methods=["GET"])
+@admin_required
+def get_tick_metrics():
+    """gets the p50, p95 and max durations of the phases of the last ticks, the cache counters and the startup"""
+    return jsonify(
+        g.engine.tick_metrics.package()
+        | {
+            "weather_cache": g.engine.weather_cache.package(),
+            "chart_cache": g.engine.chart_cache.package(),
+            "shared_payloads": g.engine.shared_payloads.package(),
+            "startup": g.engine.startup_timings,
+        }
+    )
+
+
 @http.route("/get_network_capacities", methods=["GET"])
 def get_network_capacities():
     """gets the network capacities for the current player"""
@@ -229,18 +229,10 @@ def get_network_capacities():
 @http.route("/get_market_data", methods=["GET"])
 def get_market_data():
     """gets the data for the market graph at a specific tick"""
-    market_data = {}
     if current_user.network is None:
         return "", 404
     t = int(request.args.get("t"))
-    filename_state = f"instance/network_data/{current_user.network.id}/charts/market_t{g.engine.data['total_t']-t}.pck"
-    if Path(filename_state).is_file():
-        with open(filename_state, "rb") as file:
-            market_data = pickle.load(file)
-            market_data["capacities"] = market_data["capacities"].to_dict(orient="list")
-            market_data["demands"] = market_data["demands"].to_dict(orient="list")
-    else:
-        market_data = None
+    market_data = market_log.open_log(current_user.network.id).get(g.engine.data["total_t"] - t)
     return jsonify(market_data)
 
 
@@ -1,7 +1,6 @@
 """Code providing API access using WebSockets and HTTP Basic Auth"""
 
 import json
-import pickle
 
 from flask import Blueprint, current_app, g
 from flask_httpauth import HTTPBasicAuth
@@ -13,9 +12,10 @@ from website.database.messages import Chat, Message
 from website.database.player import Network, Player
 from website.game_engine import GameEngine
 from website.technology_effects import package_constructions_page_data
+from website.utils import binary_messages
 from website.utils.assets import decrease_project_priority, pause_project, start_project
 from website.utils.chat import add_message, create_chat, create_group_chat, hide_chat_disclaimer
-from website.utils.misc import confirm_location, package_weather_data
+from website.utils.misc import confirm_location, package_chart_data, package_weather_data
 from website.utils.network import create_network, join_network, leave_network
 
 websocket_blueprint = Blueprint("rest_api", __name__)
@@ -52,17 +52,19 @@ def add_sock_handlers(sock, engine):
         """Main WebSocket endpoint for API."""
         player = g.player
         engine.log(f"Received WebSocket connection for player {player}")
+        if ws.subprotocol == binary_messages.subprotocol:
+            ws = binary_messages.BinaryWebSocket(ws, engine.shared_payloads)
         ws.send(rest_setup_complete())
-        ws.send(rest_get_global_data(engine))
+        ws.send(rest_get_shared(engine, "global_data"))
         # TODO: Review what data is sent before a tile is selected
-        ws.send(rest_get_map())
-        ws.send(rest_get_players())
+        ws.send(rest_get_shared(engine, "map"))
+        ws.send(rest_get_shared(engine, "players"))
         ws.send(rest_get_current_player(player))
         ws.send(rest_get_chats(player))
         ws.send(rest_get_last_opened_chat(player))
         ws.send(rest_get_show_chat_disclaimer(player))
-        ws.send(rest_get_networks())
-        # ws.send(rest_get_scoreboard())
+        ws.send(rest_get_shared(engine, "networks"))
+        # ws.send(rest_get_shared(engine, "scoreboard"))
         ws.send(rest_get_constructions(player))
         ws.send(rest_get_construction_queue(player))
         ws.send(rest_get_weather(engine, player))
@@ -104,7 +106,7 @@ def rest_init_ws_post_location(player, ws):
     Called once the player has selected a location, or immediately after logging
     in if location was already selected.
     """
-    # ws.send(rest_get_charts()) # TODO
+    # ws.send(rest_get_charts(g.engine, player)) # TODO
     ws.send(rest_get_facilities_data(player))
 
 
@@ -230,84 +232,12 @@ def rest_new_chat_message(chat_id: int, message: Message):
     return json.dumps(response)
 
 
-def rest_get_charts():
-    # !!! current_t HAS BEEN REMOVED !!!
-    """Gets the player's chart data and returns it as a JSON string."""
-    current_t = g.engine.data["current_t"]
-    timescale = "day"  # request.args.get('timescale')
-    filename = f"instance/player_data/{g.player.id}/{timescale}.pck"
-    with open(filename, "rb") as file:
-        file_data = pickle.load(file)
-
-    def combine_file_data_and_engine_data(file_data, engine_data):
-        combined_data_unsliced = file_data + engine_data[1 : current_t + 1]
-        return combined_data_unsliced[-360:]
-
-    def industry_data_for(category, subcategory):
-        return combine_file_data_and_engine_data(
-            file_data[category][subcategory],
-            g.engine.data["current_data"][g.player.id][category][subcategory],
-        )
-
-    subcategories = {
-        "revenues": ["industry", "imports", "exports", "dumping"],
-        "op_costs": ["steam_engine"],
-        "generation": [
-            "watermill",
-            "small_water_dam",
-            "large_water_dam",
-            "nuclear_reactor",
-            "nuclear_reactor_gen4",
-            "steam_engine",
-            "coal_burner",
-            "gas_burner",
-            "combined_cycle",
-            "windmill",
-            "onshore_wind_turbine",
-            "offshore_wind_turbine",
-            "CSP_solar",
-            "PV_solar",
-            # storages I guess go here too
-            "small_pumped_hydro",
-            "large_pumped_hydro",
-            "lithium_ion_batteries",
-            "solid_state_batteries",
-            "molten_salt",
-            "hydrogen_storage",
-        ],
-        "demand": [
-            "coal_mine",
-            "gas_drilling_site",
-            "uranium_mine",
-            "research",
-            "construction",
-            "transport",
-            "industry",
-            "exports",
-            "dumping",
-            "small_pumped_hydro",
-            "large_pumped_hydro",
-            "lithium_ion_batteries",
-            "solid_state_batteries",
-            "molten_salt",
-            "hydrogen_storage",
-        ],
-        "storage": [
-            "small_pumped_hydro",
-            "large_pumped_hydro",
-            "lithium_ion_batteries",
-            "solid_state_batteries",
-            "molten_salt",
-            "hydrogen_storage",
-        ],
-    }
-    response = {
-        "type": "getCharts",
-        "data": {
-            category: {subcategory: industry_data_for(category, subcategory) for subcategory in subcategories[category]}
-            for category in ["revenues", "generation", "demand"]
-        },
-    }
+def rest_get_charts(engine, player: Player, since=None):
+    """
+    Gets the player's chart data and returns it as a JSON string. If `since` is the tick of the charts the client
+    already has, only the points that have changed since are sent (see `package_chart_data`).
+    """
+    response = {"type": "getCharts", "data": package_chart_data(engine, player, since)}
     return json.dumps(response)
 
 
@@ -322,6 +252,23 @@ def rest_get_scoreboard():
     return json.dumps(response)
 
 
+def rest_get_shared(engine, name):
+    """
+    Gets one of the messages that are the same for all the clients, serialised once per tick for the ones that change
+    every tick and once per change for the other ones (see `rest_notify_player_location`, `rest_notify_new_player` and
+    `rest_notify_network_change` for the invalidations).
+    """
+    build, per_tick = {
+        "global_data": (lambda: rest_get_global_data(engine), True),
+        # the reserves of the tiles change every tick
+        "map": (rest_get_map, True),
+        "players": (rest_get_players, False),
+        "networks": (rest_get_networks, False),
+        "scoreboard": (rest_get_scoreboard, True),
+    }[name]
+    return engine.shared_payloads.get(name, engine.data["total_t"] if per_tick else None, build)
+
+
 def rest_get_weather(engine, player):
     """Gets the weather and returns it as a JSON string"""
     response = {
@@ -384,6 +331,8 @@ def rest_parse_request(engine, player: Player, ws, uuid, data):
             rest_parse_request_pause_unpause_project(ws, uuid, body)
         case "decreaseProjectPriority":
             rest_parse_request_decrease_project_priority(ws, uuid, body)
+        case "getCharts":
+            rest_parse_request_get_charts(engine, ws, uuid, body)
         case "dismissChatDisclaimer":
             hide_chat_disclaimer(player)
         case "createChat":
@@ -436,6 +385,14 @@ def rest_parse_request_create_network(engine, ws, uuid, data):
     ws.send(message)
 
 
+def rest_parse_request_get_charts(engine, ws, uuid, data):
+    """Interpret message sent from a client when they request the charts, with the tick of the charts they have"""
+    since = data["since"] if data is not None and "since" in data else None
+    response = package_chart_data(engine, g.player, since)
+    message = rest_request_response(uuid, "getCharts", response)
+    ws.send(message)
+
+
 def rest_parse_request_start_project(engine, ws, uuid, data):
     """Interpret message sent from a client when they start a project"""
     facility = data["facility"]
@@ -479,7 +436,7 @@ def rest_notify_all_players(engine, message):
 
 def rest_notify_player(engine, player, message):
     """send `message` to all of `player`'s active websocket sessions"""
-    if player.id not in engine.websocket_dict:
+    if engine.catching_up or player.id not in engine.websocket_dict:
         return
     for ws in engine.websocket_dict[player.id]:
         try:
@@ -492,6 +449,7 @@ def rest_notify_player_location(engine, player):
     """This method is called when player (argument) has chosen a location. This
     information needs to be relayed to clients, and this methods returns a JSON
     string with this information."""
+    engine.shared_payloads.invalidate("players", "scoreboard")
     message = rest_add_player_location(player)
     rest_notify_all_players(engine, message)
     rest_notify_scoreboard(engine)
@@ -503,25 +461,32 @@ def rest_notify_network_change(engine):
     This includes when a network is created, when a player joins a network, and
     when a player leaves a network. These changes are relayed to all connected
     REST clients."""
-    message = rest_get_networks()
+    engine.shared_payloads.invalidate("players", "networks", "scoreboard")
+    message = rest_get_shared(engine, "networks")
     rest_notify_all_players(engine, message)
 
 
 def rest_notify_new_player(engine):
     """Notify to all active sessions the new list of players"""
-    rest_notify_all_players(engine, rest_get_players())
+    engine.shared_payloads.invalidate("players")
+    rest_notify_all_players(engine, rest_get_shared(engine, "players"))
     engine.socketio.emit("get_players", Player.package_all())
 
 
 def rest_notify_global_data(engine: GameEngine):
     """Notify to all ws sessions the new global engine data"""
-    message = rest_get_global_data(engine)
+    if not any(engine.websocket_dict.values()):
+        return
+    message = rest_get_shared(engine, "global_data")
     rest_notify_all_players(engine, message)
 
 
 def rest_notify_scoreboard(engine):
     """Notify to all ws sessions the new scoreboard"""
-    message = rest_get_scoreboard()
+    # the scoreboard is only built if there are clients to send it to
+    if not any(engine.websocket_dict.values()):
+        return
+    message = rest_get_shared(engine, "scoreboard")
     rest_notify_all_players(engine, message)
 
 
@@ -536,12 +501,13 @@ def rest_notify_construction_queue(engine, player):
     rest_notify_player(engine, player, rest_get_construction_queue(player))
 
 
-# TODO: The rest_get_weather() is now dependent on the player !
 def rest_notify_weather(engine):
-    """Notify to all ws sessions the new weather data"""
-    #     message = rest_get_weather(engine)
-    #     rest_notify_all_players(engine, message)
-    pass
+    """Notify to all ws sessions the new weather data at the location of their player"""
+    for player_id in list(engine.websocket_dict):
+        player: Player = Player.query.get(player_id)
+        if player is None or player.tile is None:
+            continue
+        rest_notify_player(engine, player, rest_get_weather(engine, player))
 
 
 def rest_notify_achievements(engine, player: Player):
@@ -0,0 +1,449 @@
+"""
+Headless benchmark of the game ticks on synthetic worlds.
+The world is generated in an in-memory database and the ticks are run without the web server, the socket servers and
+the scheduler. The files the engine writes (`instance/...`) are written to a scratch directory.
+"""
+
+import json
+import logging
+import os
+import pickle
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from website import db, technology_effects
+from website.database import market_log, sqlite_profile, time_series, write_behind
+from website.database.map import Hex, insert_map
+from website.database.messages import Chat
+from website.database.player import Player
+from website.database.player_assets import OngoingConstruction, Shipment
+from website.game_engine import GameEngine
+from website.utils import clear_sky
+from website.utils.electricity_market import ClearingPool
+from website.utils.game_engine import check_events_completion
+
+package_dir = Path(__file__).resolve().parent
+
+# number of facilities of each type per player, multiplied by the `scale` of the world
+facility_mixes = {
+    "fossil": {
+        "steam_engine": 2,
+        "coal_burner": 4,
+        "gas_burner": 3,
+        "combined_cycle": 1,
+        "coal_mine": 2,
+        "gas_drilling_site": 2,
+    },
+    "renewables": {
+        "windmill": 4,
+        "onshore_wind_turbine": 4,
+        "offshore_wind_turbine": 1,
+        "CSP_solar": 2,
+        "PV_solar": 4,
+        "watermill": 2,
+        "small_water_dam": 1,
+    },
+    "mixed": {
+        "steam_engine": 1,
+        "coal_burner": 2,
+        "gas_burner": 1,
+        "nuclear_reactor": 1,
+        "windmill": 2,
+        "onshore_wind_turbine": 2,
+        "PV_solar": 2,
+        "watermill": 1,
+        "coal_mine": 1,
+        "gas_drilling_site": 1,
+        "uranium_mine": 1,
+    },
+}
+
+storage_types = ["small_pumped_hydro", "lithium_ion_batteries", "hydrogen_storage", "molten_salt"]
+construction_types = [
+    ("steam_engine", "Power facilities"),
+    ("coal_burner", "Power facilities"),
+    ("PV_solar", "Power facilities"),
+    ("onshore_wind_turbine", "Power facilities"),
+    ("coal_mine", "Extraction facilities"),
+]
+
+# queries on the columns that the ticks and the requests filter on: {name: (query, query of the parameters to use)}
+hot_queries = {
+    "facilities of a player by type": (
+        "SELECT id FROM active_facility WHERE player_id = :player_id AND facility = :facility",
+        "SELECT DISTINCT player_id, facility FROM active_facility",
+    ),
+    "facilities at their end of life": (
+        "SELECT id FROM active_facility WHERE end_of_life = :end_of_life",
+        "SELECT DISTINCT end_of_life FROM active_facility",
+    ),
+    "constructions of a player by name": (
+        "SELECT id FROM ongoing_construction WHERE player_id = :player_id AND name = :name",
+        "SELECT DISTINCT player_id, name FROM ongoing_construction",
+    ),
+    "shipments of a player": (
+        "SELECT id FROM shipment WHERE player_id = :player_id",
+        "SELECT DISTINCT player_id FROM shipment",
+    ),
+    "tile by coordinates": ("SELECT id FROM hex WHERE q = :q AND r = :r", "SELECT q, r FROM hex"),
+    "tiles of a row": ("SELECT id FROM hex WHERE r = :r", "SELECT DISTINCT r FROM hex"),
+    "last notifications of a player": (
+        "SELECT id FROM notification WHERE player_id = :player_id ORDER BY time DESC LIMIT 20",
+        "SELECT DISTINCT player_id FROM notification",
+    ),
+    "last messages of a chat": (
+        "SELECT id FROM message WHERE chat_id = :chat_id ORDER BY time DESC LIMIT 20",
+        "SELECT DISTINCT chat_id FROM message",
+    ),
+}
+# (database profile, with the indexes) compared by the query benchmark, from the state before the indexes
+query_configurations = [("default", False), ("default", True), ("performance", True)]
+
+
+class SocketStub:
+    """Replaces the socketio server of the engine, all emitted events are dropped"""
+
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def create_benchmark_app(
+    scratch_dir, in_game_seconds_per_tick=240, random_seed=42, market_clearing="serial", market_workers=None
+):
+    """
+    Creates a minimal app with an in-memory database and a game engine, without the servers and the scheduler.
+    The working directory is changed to `scratch_dir`, in which the static data of the game is linked.
+    """
+    Path(scratch_dir, "website").mkdir(parents=True, exist_ok=True)
+    static_link = Path(scratch_dir, "website", "static")
+    if not static_link.exists():
+        static_link.symlink_to(package_dir / "static", target_is_directory=True)
+    os.chdir(scratch_dir)
+    for directory in ["instance/player_data", "instance/network_data", "instance/server_data"]:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    # the clear sky irradiance table of the server is reused instead of being rebuilt for every benchmark
+    server_table = package_dir.parent / clear_sky.table_path
+    if server_table.is_file() and not Path(clear_sky.table_path).exists():
+        Path(clear_sky.table_path).symlink_to(server_table)
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    engine = GameEngine(clock_time=30, in_game_seconds_per_tick=in_game_seconds_per_tick, random_seed=random_seed)
+    engine.socketio = SocketStub()
+    engine.clearing_pool = ClearingPool(market_clearing, market_workers)
+    app.config["engine"] = engine
+    with app.app_context():
+        db.create_all()
+    return app, engine
+
+
+def init_map():
+    """Stores the tiles of the map and the general chat in the database"""
+    insert_map(package_dir / "static/data/map.csv")
+    db.session.add(Chat(name="General Chat", participants=[]))
+    db.session.commit()
+
+
+def generate_world(
+    engine,
+    players=50,
+    networks=5,
+    network_share=0.8,
+    mix="mixed",
+    scale=1,
+    storage=2,
+    shipments=2,
+    constructions=2,
+    seed=0,
+):
+    """
+    Generates a synthetic world: `players` players with the facilities of `mix` (multiplied by `scale`), `storage`
+    storage facilities, `shipments` resource shipments and `constructions` ongoing constructions each.
+    A share `network_share` of the players is distributed over `networks` networks.
+    The shipments and constructions last longer than any benchmark so that they consume power every tick.
+    """
+    from website.init_test_players import add_asset, create_network, create_player
+
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    init_map()
+    tiles = Hex.query.order_by(Hex.id).all()
+    if players > len(tiles):
+        raise ValueError(f"The map only has {len(tiles)} tiles, can't place {players} players")
+    tile_ids = rng.permutation(len(tiles))[:players]
+    mix = facility_mixes[mix]
+
+    # the constructions are logged one by one, this would flood the terminal
+    log_level = engine.console_logger.level
+    engine.console_logger.setLevel(logging.WARNING)
+    created_players = []
+    for i in range(players):
+        player: Player = create_player(engine, f"bench{i}", "password")
+        tiles[tile_ids[i]].player_id = player.id
+        player.money = 1_000_000_000
+        player.coal = 2_000_000
+        player.gas = 2_000_000
+        player.uranium = 50_000
+        player.rest_of_priorities = ""
+        add_asset(player, "industry", 5 + int(rng.integers(10)))
+        add_asset(player, "laboratory", 2)
+        add_asset(player, "warehouse", 3)
+        add_asset(player, "mineral_extraction", 1)
+        add_asset(player, "mathematics", 1)
+        for facility, count in mix.items():
+            add_asset(player, facility, count * scale)
+        for j in range(storage):
+            add_asset(player, storage_types[j % len(storage_types)], 1)
+        created_players.append(player)
+    db.session.commit()
+
+    # the instant constructions are finished at the first tick
+    engine.data["total_t"] = 1
+    check_events_completion(engine)
+    db.session.commit()
+
+    for player in created_players:
+        for j in range(shipments):
+            db.session.add(
+                Shipment(
+                    resource=["coal", "gas", "uranium"][j % 3],
+                    quantity=float(rng.uniform(1_000, 50_000)),
+                    departure_time=1,
+                    duration=10**9,
+                    player_id=player.id,
+                )
+            )
+        new_constructions = []
+        for j in range(constructions):
+            name, family = construction_types[j % len(construction_types)]
+            new_constructions.append(
+                OngoingConstruction(
+                    name=name,
+                    family=family,
+                    start_time=1,
+                    duration=10**9,
+                    suspension_time=None,
+                    construction_power=technology_effects.construction_power(player, name),
+                    construction_pollution=technology_effects.construction_pollution_per_tick(player, name),
+                    price_multiplier=technology_effects.price_multiplier(player, name),
+                    multiplier_1=technology_effects.multiplier_1(player, name),
+                    multiplier_2=technology_effects.multiplier_2(player, name),
+                    multiplier_3=technology_effects.multiplier_3(player, name),
+                    player_id=player.id,
+                )
+            )
+        db.session.add_all(new_constructions)
+        db.session.flush()
+        for construction in new_constructions:
+            player.add_to_list("construction_priorities", construction.id)
+    db.session.commit()
+
+    in_network = created_players[: round(players * network_share)] if networks > 0 else []
+    for n in range(networks):
+        members = in_network[n::networks]
+        if members:
+            create_network(engine, f"network {n}", members)
+    db.session.commit()
+    # the shipments and constructions were added directly to the database
+    engine.event_schedule.reset()
+    engine.console_logger.setLevel(log_level)
+
+
+def save_world(engine, path, parameters):
+    """Saves the database, the engine data and the instance files of the world to the directory `path`"""
+    path = Path(path)
+    if path.exists():
+        shutil.rmtree(path)
+    shutil.copytree("instance", path / "instance", ignore=shutil.ignore_patterns("*.log", "clear_sky_ghi.npy"))
+    backup_database(path / "database.db")
+    with open(path / "engine_data.pck", "wb") as file:
+        pickle.dump(engine.data, file)
+    with open(path / "world.json", "w") as file:
+        json.dump(parameters, file, indent=4)
+
+
+def backup_database(path):
+    """Writes the in-memory database to a file"""
+    write_behind.flush()
+    db.session.commit()
+    raw_connection = db.engine.raw_connection()
+    try:
+        target = sqlite3.connect(path)
+        raw_connection.driver_connection.backup(target)
+        target.close()
+    finally:
+        raw_connection.close()
+
+
+def load_world(engine, path):
+    """Loads a world saved with `save_world` and returns its generation parameters"""
+    path = Path(path).resolve()
+    time_series.close_all()
+    market_log.close_all()
+    shutil.copytree(path / "instance", "instance", dirs_exist_ok=True)
+    db.session.remove()
+    raw_connection = db.engine.raw_connection()
+    try:
+        source = sqlite3.connect(path / "database.db")
+        source.backup(raw_connection.driver_connection)
+        source.close()
+    finally:
+        raw_connection.close()
+    with open(path / "engine_data.pck", "rb") as file:
+        engine.data = pickle.load(file)
+    engine.event_schedule.reset()
+    write_behind.reset()
+    with open(path / "world.json", "r") as file:
+        return json.load(file)
+
+
+def peak_memory_mb():
+    """Returns the peak resident memory of the process in MB (None if it can't be measured on this platform)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_ticks(engine, ticks):
+    """Runs `ticks` ticks of electricity updates and event checks and returns the benchmark results"""
+    from website import production_update
+
+    metrics = engine.tick_metrics
+    metrics.history = max(metrics.history, ticks)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        metrics.start_tick()
+        engine.data["total_t"] += 1
+        production_update.update_electricity(engine=engine)
+        with metrics.measure("check_events_completion"):
+            check_events_completion(engine)
+        if engine.data["total_t"] % engine.write_behind_interval == 0:
+            with metrics.measure("write_behind_flush"):
+                write_behind.flush()
+        with metrics.measure("db_commit"):
+            db.session.commit()
+        metrics.end_tick(engine.data["total_t"])
+    duration = time.perf_counter() - start
+    return {
+        "ticks": ticks,
+        "duration": duration,
+        "ticks_per_second": ticks / duration if duration > 0 else float("inf"),
+        "peak_memory_mb": peak_memory_mb(),
+        "phases": metrics.package()["phases"],
+    }
+
+
+def format_results(results):
+    """Formats the benchmark results as a table"""
+    lines = [
+        f"{results['ticks']} ticks in {results['duration']:.2f}s: {results['ticks_per_second']:.2f} ticks/s",
+    ]
+    if results["peak_memory_mb"] is not None:
+        lines.append(f"peak memory: {results['peak_memory_mb']:.1f} MB")
+    lines.append(f"{'phase':<40}{'p50 [ms]':>12}{'p95 [ms]':>12}{'max [ms]':>12}")
+    phases = sorted(results["phases"].items(), key=lambda x: x[1]["p50"], reverse=True)
+    for phase, values in phases:
+        lines.append(f"{phase:<40}{values['p50']:>12.2f}{values['p95']:>12.2f}{values['max']:>12.2f}")
+    return "\n".join(lines)
+
+
+def add_chat_history(connection, notifications_per_player=50, messages_per_chat=500, players_per_chat=5, seed=0):
+    """Adds notifications and chat messages to a database, the generated worlds have none"""
+    rng = np.random.default_rng(seed)
+    player_ids = [row[0] for row in connection.execute(text("SELECT id FROM player"))]
+    now = time.time()
+    connection.execute(
+        text("INSERT INTO notification (title, content, time, read, player_id) VALUES (:title, '', :time, 0, :player)"),
+        [
+            {"title": "Benchmark", "time": datetime.fromtimestamp(now - rng.uniform(0, 1e6)), "player": player_id}
+            for player_id in player_ids
+            for _ in range(notifications_per_player)
+        ],
+    )
+    chats = max(1, len(player_ids) // players_per_chat)
+    connection.execute(
+        text("INSERT INTO message (text, time, player_id, chat_id) VALUES ('hello', :time, :player, :chat)"),
+        [
+            {
+                "time": datetime.fromtimestamp(now - rng.uniform(0, 1e6)),
+                "player": player_ids[int(rng.integers(len(player_ids)))],
+                "chat": chat_id,
+            }
+            for chat_id in range(1, chats + 1)
+            for _ in range(messages_per_chat)
+        ],
+    )
+
+
+def run_query_benchmark(database_path, profile, indexes=True, repetitions=500, commits=50, facilities_per_commit=100):
+    """
+    Runs the `hot_queries` and commits of facility usages on a copy of a database file with a database profile, with
+    or without the indexes of the hot filters. Returns the mean duration of each query and of a commit [ms].
+    """
+    database_path = Path(database_path)
+    copy_path = database_path.with_name(f"query_benchmark_{profile}.db")
+    shutil.copyfile(database_path, copy_path)
+    sql_engine = create_engine(f"sqlite:///{copy_path}", **sqlite_profile.engine_options(profile))
+    sqlite_profile.set_pragmas(sql_engine, profile)
+    results = {}
+    try:
+        with sql_engine.begin() as connection:
+            if not indexes:
+                for (name,) in connection.execute(text("SELECT name FROM sqlite_master WHERE name LIKE 'ix_%'")).all():
+                    connection.execute(text(f"DROP INDEX {name}"))
+            add_chat_history(connection)
+        with sql_engine.connect() as connection:
+            for name, (query, parameter_query) in hot_queries.items():
+                parameters = connection.execute(text(parameter_query)).mappings().all()
+                if not parameters:
+                    continue
+                start = time.perf_counter()
+                for i in range(repetitions):
+                    connection.execute(text(query), parameters[i % len(parameters)]).all()
+                results[name] = (time.perf_counter() - start) / repetitions * 1e3
+            connection.rollback()
+            facility_ids = [row[0] for row in connection.execute(text("SELECT id FROM active_facility")).all()]
+            facility_ids = facility_ids[:facilities_per_commit]
+            connection.rollback()
+            start = time.perf_counter()
+            for i in range(commits):
+                with connection.begin():
+                    connection.execute(
+                        text("UPDATE active_facility SET usage = :usage WHERE id = :id"),
+                        [{"usage": (i % 10) / 10, "id": facility_id} for facility_id in facility_ids],
+                    )
+            results[f"commit of {len(facility_ids)} facility usages"] = (time.perf_counter() - start) / commits * 1e3
+    finally:
+        sql_engine.dispose()
+        for suffix in ["", "-wal", "-shm", "-journal"]:
+            Path(f"{copy_path}{suffix}").unlink(missing_ok=True)
+    return results
+
+
+def format_query_results(results):
+    """Formats the results of the query benchmark, given as {configuration: results}, as a table"""
+    configurations = list(results)
+    lines = [f"{'query [ms]':<40}" + "".join(f"{configuration:>24}" for configuration in configurations)]
+    for name in results[configurations[0]]:
+        lines.append(
+            f"{name:<40}" + "".join(f"{results[configuration][name]:>24.3f}" for configuration in configurations)
+        )
+    return "\n".join(lines)
+
+
+def make_scratch_dir():
+    """Creates a temporary directory for the files written during the benchmark"""
+    return tempfile.mkdtemp(prefix="energetica_benchmark_")
@@ -0,0 +1,231 @@
+"""
+This file contains the checkpoints of `engine.data`. The data is split into components (the engine values, the climate,
+the daily question, one component per player and one per network) that are pickled to separate files in
+`instance/checkpoint`, and a manifest lists the files of the last complete checkpoint with the version of the schema
+of each component (see `website/database/migrations.py`).
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import signal
+import sys
+import time
+import traceback
+from glob import glob
+
+from website.database.migrations import schema_version as current_schema_version
+
+checkpoint_dir = "instance/checkpoint"
+legacy_path = "instance/engine_data.pck"
+format_version = 1
+
+# keys of engine.data that are dicts with one entry per player or per network
+player_keys = ["current_data", "player_capacities", "player_cumul_emissions"]
+network_keys = ["network_data", "network_capacities"]
+# keys of engine.data that are stored in their own component
+separate_keys = {"current_climate_data": "climate", "daily_question": "daily_question"}
+
+
+def split_components(data):
+    """Returns the components of `data` as a dict {name: object}, the other keys are in the component "engine" """
+    components = {"engine": {}}
+    for key, value in data.items():
+        if key in separate_keys:
+            components[separate_keys[key]] = value
+        elif key not in player_keys and key not in network_keys:
+            components["engine"][key] = value
+    for prefix, keys in [("players", player_keys), ("networks", network_keys)]:
+        for key in keys:
+            components["engine"][key] = list(data[key])
+            for entity_id, value in data[key].items():
+                components.setdefault(f"{prefix}/{entity_id}", {})[key] = value
+    return components
+
+
+def merge_components(components):
+    """Rebuilds engine.data from its components"""
+    data = dict(components["engine"])
+    for key, name in separate_keys.items():
+        data[key] = components[name]
+    for prefix, keys in [("players", player_keys), ("networks", network_keys)]:
+        for key in keys:
+            data[key] = {entity_id: components[f"{prefix}/{entity_id}"][key] for entity_id in data[key]}
+    return data
+
+
+def read_manifest(directory=checkpoint_dir):
+    """Returns the manifest of the last checkpoint, None if there is none"""
+    try:
+        with open(os.path.join(directory, "manifest.json"), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomically(path, payload):
+    """Writes a file through a temporary file that replaces it once it is on the disk"""
+    with open(path + ".tmp", "wb") as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def write_manifest(manifest, directory=checkpoint_dir):
+    """Replaces the manifest, the files of the components it lists have to be on the disk already"""
+    _write_atomically(os.path.join(directory, "manifest.json"), json.dumps(manifest).encode())
+
+
+def remove_unreferenced(manifest, directory=checkpoint_dir):
+    """Removes the component files that are not in the manifest"""
+    referenced = {os.path.normpath(os.path.join(directory, entry["file"])) for entry in manifest["components"].values()}
+    for path in glob(os.path.join(directory, "**", "*.pck"), recursive=True):
+        if os.path.normpath(path) not in referenced:
+            os.remove(path)
+
+
+def _write_component_file(directory, filename, payload):
+    os.makedirs(os.path.dirname(os.path.join(directory, filename)), exist_ok=True)
+    _write_atomically(os.path.join(directory, filename), payload)
+
+
+def write_component(directory, filename, component, schema_version):
+    """Writes the file of a component and returns its manifest entry"""
+    payload = pickle.dumps(component, protocol=pickle.HIGHEST_PROTOCOL)
+    _write_component_file(directory, filename, payload)
+    return {"file": filename, "digest": hashlib.blake2b(payload, digest_size=16).hexdigest(), "schema": schema_version}
+
+
+def write_checkpoint(data, directory=checkpoint_dir, schema_version=current_schema_version):
+    """
+    Writes a checkpoint of `data`. Only the components whose content has changed since the last checkpoint are
+    written, in new files, and the manifest is replaced at the end, so an interrupted checkpoint leaves the last one
+    intact. The files that are not in the manifest anymore are then removed. Returns the number of files written.
+    """
+    manifest = read_manifest(directory) or {"generation": 0, "components": {}}
+    generation = manifest["generation"] + 1
+    components = {}
+    written = 0
+    for name, component in split_components(data).items():
+        payload = pickle.dumps(component, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.blake2b(payload, digest_size=16).hexdigest()
+        previous = manifest["components"].get(name)
+        if previous is not None and previous["digest"] == digest:
+            components[name] = previous | {"schema": schema_version}
+            continue
+        filename = f"{name}.{generation}.pck"
+        _write_component_file(directory, filename, payload)
+        components[name] = {"file": filename, "digest": digest, "schema": schema_version}
+        written += 1
+    new_manifest = {
+        "version": format_version,
+        "generation": generation,
+        "total_t": data["total_t"],
+        "components": components,
+    }
+    write_manifest(new_manifest, directory)
+    remove_unreferenced(new_manifest, directory)
+    return written
+
+
+def load_component(directory, entry):
+    """Returns the object stored in the file of a manifest entry"""
+    with open(os.path.join(directory, entry["file"]), "rb") as file:
+        return pickle.load(file)
+
+
+def load_checkpoint(directory=checkpoint_dir):
+    """Returns the engine data of the last checkpoint, None if there is none"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    components = {}
+    for name, entry in manifest["components"].items():
+        components[name] = load_component(directory, entry)
+    return merge_components(components)
+
+
+def load_engine_data():
+    """Returns the engine data of the last checkpoint or of the engine_data.pck of older versions, None if none exist"""
+    data = load_checkpoint()
+    if data is None and os.path.isfile(legacy_path):
+        with open(legacy_path, "rb") as file:
+            data = pickle.load(file)
+    return data
+
+
+class Checkpointer:
+    """
+    Class that writes the checkpoints of `engine.data` without blocking the ticks. The process is forked: the child
+    gets a copy-on-write snapshot of the memory, serialises and writes the checkpoint and exits, while the server
+    continues. Where fork is not available the checkpoint is written in the calling thread. A checkpoint is skipped
+    if the previous one is still being written.
+    """
+
+    def __init__(self, directory=checkpoint_dir):
+        self.directory = directory
+        self.pid = None
+
+    def poll(self):
+        """Returns True if no checkpoint is being written, raises an error if the last one has failed"""
+        if self.pid is None:
+            return True
+        pid, status = os.waitpid(self.pid, os.WNOHANG)
+        if pid == 0:
+            return False
+        self.pid = None
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise RuntimeError(
+                f"the checkpoint process exited with status {os.waitstatus_to_exitcode(status)}, see its traceback in "
+                "the standard error"
+            )
+        return True
+
+    def start(self, engine):
+        """Starts a checkpoint of engine.data, returns False if the previous checkpoint is still being written"""
+        try:
+            if not self.poll():
+                engine.warn("the previous checkpoint is still being written, this one is skipped")
+                return False
+        except RuntimeError as e:
+            engine.warn(str(e))
+        if not hasattr(os, "fork"):
+            write_checkpoint(engine.data, self.directory)
+            return True
+        pid = os.fork()
+        if pid == 0:
+            # the child must not run the exit handlers of the server
+            status = 1
+            try:
+                write_checkpoint(engine.data, self.directory)
+                status = 0
+            except Exception:  # noqa: BLE001 (any failure is reported through the exit status)
+                # the manifest stays at the previous checkpoint, the traceback is the only trace of the failure (the
+                # logging handlers are not used in the child, their locks may have been held by another thread)
+                sys.stderr.write(f"the checkpoint process failed:\n{traceback.format_exc()}")
+                sys.stderr.flush()
+            finally:
+                # nothing, not even KeyboardInterrupt or SystemExit, may continue in the child's copy of the server
+                os._exit(status)
+        self.pid = pid
+        return True
+
+    def wait(self, timeout=60):
+        """
+        Waits until the current checkpoint has been written, at most `timeout` seconds after which the checkpoint
+        process is killed (the manifest then stays at the previous checkpoint). Returns False if it has been killed.
+        """
+        if self.pid is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while os.waitpid(self.pid, os.WNOHANG)[0] == 0:
+            if time.monotonic() >= deadline:
+                os.kill(self.pid, signal.SIGKILL)
+                os.waitpid(self.pid, 0)
+                self.pid = None
+                return False
+            time.sleep(0.1)
+        self.pid = None
+        return True
@@ -6,6 +6,7 @@ from collections import defaultdict, deque
 from typing import List
 
 import noise
+import numpy as np
 from flask import current_app
 
 from website.database.player_assets import ActiveFacility
@@ -33,79 +34,182 @@ class CapacityData:
 
     def __init__(self):
         self._data = {}
+        self._counts = {}  # number of facilities per facility type
+        self._weighted_efficiency = {}  # sum of efficiency * power per storage facility type
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if "_counts" not in state:
+            # saved before the capacities were updated incrementally, they are rebuilt at the next change
+            self._counts = None
+            self._weighted_efficiency = {}
 
     def update(self, player, facility):
-        """This function updates the capacity data of the player"""
+        """This function rebuilds the capacity data of the player from its active facilities"""
         engine = current_app.config["engine"]
-        if facility is None:
+        self._rebuild(engine, player, facility)
+        if player.network is not None:
+            engine.data["network_capacities"][player.network.id].update_network(player.network)
+
+    def _rebuild(self, engine, player, facility):
+        """Rebuilds the capacity data of the player for one facility type, or all of them if `facility` is None"""
+        if facility is None or self._counts is None:
             active_facilities: List[ActiveFacility] = ActiveFacility.query.filter_by(player_id=player.id).all()
-            unique_facilities = {af.facility for af in active_facilities}
-            for uf in unique_facilities:
-                self.init_facility(engine, uf)
+            self._data = {}
+            self._counts = {}
+            self._weighted_efficiency = {}
         else:
             active_facilities: List[ActiveFacility] = ActiveFacility.query.filter_by(
                 player_id=player.id, facility=facility
             ).all()
-            if len(active_facilities) == 0 and facility in self._data:
-                del self._data[facility]
-                return
-            self.init_facility(engine, facility)
-
-        for facility in active_facilities:
-            base_data = engine.const_config["assets"][facility.facility]
-            effective_values = self._data[facility.facility]
-            op_costs = (
-                base_data["base_price"]
-                * facility.price_multiplier
-                * base_data["O&M_factor_per_day"]
+            self._remove_type(facility)
+
+        for active_facility in active_facilities:
+            self._apply(engine, active_facility.facility, self.facility_values(engine, active_facility), 1)
+
+    def add_facility(self, player, facility: ActiveFacility):
+        """Adds the values of a new facility to the capacity data of the player and of its network"""
+        self._change(player, facility.facility, facility_values=self.facility_values(None, facility), sign=1)
+
+    def remove_values(self, player, facility_type, facility_values):
+        """
+        Removes the values of a facility that has been removed from the capacity data of the player and network.
+        `facility_values` are the values of the facility before its removal (see `facility_values`).
+        """
+        self._change(player, facility_type, facility_values=facility_values, sign=-1)
+
+    def modify_facility(self, player, facility: ActiveFacility, old_values):
+        """
+        Updates the capacity data of the player and network after the attributes of a facility have been modified.
+        `old_values` are the values of the facility before the modification (see `facility_values`).
+        """
+        self._change(player, facility.facility, facility_values=old_values, sign=-1)
+        self._change(player, facility.facility, facility_values=self.facility_values(None, facility), sign=1)
+
+    def _change(self, player, facility_type, facility_values, sign):
+        """Applies the values of one facility to the capacity data of the player and its network"""
+        engine = current_app.config["engine"]
+        if self._counts is None:
+            # the database already contains the change
+            self.update(player, None)
+            return
+        self._apply(engine, facility_type, facility_values, sign)
+        if player.network is not None and "power" in facility_values:
+            network_capacities = engine.data["network_capacities"][player.network.id]
+            network_capacities.change_network_power(player.network, facility_type, facility_values["power"], sign)
+
+    @staticmethod
+    def facility_values(engine, facility: ActiveFacility):
+        """Returns the values that one active facility contributes to the capacity data of its type"""
+        if engine is None:
+            engine = current_app.config["engine"]
+        base_data = engine.const_config["assets"][facility.facility]
+        op_costs = (
+            base_data["base_price"]
+            * facility.price_multiplier
+            * base_data["O&M_factor_per_day"]
+            * engine.in_game_seconds_per_tick
+            / (24 * 3600)
+        )
+        if facility.facility in ["watermill", "small_water_dam", "large_water_dam"]:
+            op_costs *= facility.multiplier_2
+        values = {"O&M_cost": op_costs}
+        if facility.facility in engine.power_facilities:
+            power_gen = base_data["base_power_generation"] * facility.multiplier_1
+            values["power"] = power_gen
+            values["fuel_use"] = {
+                fuel: base_data["consumed_resource"][fuel]
+                / facility.multiplier_3
+                * power_gen
                 * engine.in_game_seconds_per_tick
-                / (24 * 3600)
-            )
-            if facility.facility in ["watermill", "small_water_dam", "large_water_dam"]:
-                op_costs *= facility.multiplier_2
-            effective_values["O&M_cost"] += op_costs
-            if facility.facility in engine.power_facilities:
-                power_gen = base_data["base_power_generation"] * facility.multiplier_1
-                effective_values["power"] += power_gen
+                / 3600
+                / 1_000_000
+                for fuel, amount in base_data["consumed_resource"].items()
+                if amount > 0
+            }
+        elif facility.facility in engine.storage_facilities:
+            power_gen = base_data["base_power_generation"] * facility.multiplier_1
+            values["power"] = power_gen
+            values["capacity"] = base_data["base_storage_capacity"] * facility.multiplier_2
+            values["weighted_efficiency"] = base_data["base_efficiency"] * facility.multiplier_3 * power_gen
+        elif facility.facility in engine.extraction_facilities:
+            values["extraction_rate_per_day"] = base_data["base_extraction_rate_per_day"] * facility.multiplier_2
+            values["power_use"] = base_data["base_power_consumption"] * facility.multiplier_1
+            values["pollution"] = base_data["base_pollution"] * facility.multiplier_3
+        return values
+
+    def _apply(self, engine, facility_type, facility_values, sign):
+        """Adds (`sign` = 1) or subtracts (`sign` = -1) the values of one facility"""
+        if facility_type not in self._data:
+            if sign < 0:
+                return
+            self.init_facility(engine, facility_type)
+            if facility_type not in self._data:
+                return
+        if facility_type not in self._counts:
+            self._counts[facility_type] = 0
+            self._weighted_efficiency[facility_type] = 0.0
+        self._counts[facility_type] += sign
+        if self._counts[facility_type] <= 0:
+            self._remove_type(facility_type)
+            return
+        effective_values = self._data[facility_type]
+        for key, value in facility_values.items():
+            if key == "fuel_use":
                 for fuel in effective_values["fuel_use"]:
-                    effective_values["fuel_use"][fuel] += (
-                        base_data["consumed_resource"][fuel]
-                        / facility.multiplier_3
-                        * power_gen
-                        * engine.in_game_seconds_per_tick
-                        / 3600
-                        / 1_000_000
-                    )
-            elif facility.facility in engine.storage_facilities:
-                power_gen = base_data["base_power_generation"] * facility.multiplier_1
-                # mean efficiency
-                effective_values["efficiency"] = (
-                    (effective_values["efficiency"] * effective_values["power"])
-                    + (base_data["base_efficiency"] * facility.multiplier_3 * power_gen)
-                ) / (effective_values["power"] + power_gen)
-                effective_values["power"] += power_gen
-                effective_values["capacity"] += base_data["base_storage_capacity"] * facility.multiplier_2
-            elif facility.facility in engine.extraction_facilities:
-                effective_values["extraction_rate_per_day"] += (
-                    base_data["base_extraction_rate_per_day"] * facility.multiplier_2
-                )
-                effective_values["power_use"] += base_data["base_power_consumption"] * facility.multiplier_1
-                effective_values["pollution"] += base_data["base_pollution"] * facility.multiplier_3
+                    effective_values["fuel_use"][fuel] += sign * value[fuel]
+            elif key == "weighted_efficiency":
+                self._weighted_efficiency[facility_type] += sign * value
+            else:
+                effective_values[key] += sign * value
+        if "efficiency" in effective_values:
+            # mean efficiency weighted by the power of the facilities
+            effective_values["efficiency"] = (
+                self._weighted_efficiency[facility_type] / effective_values["power"]
+                if effective_values["power"] > 0
+                else 0.0
+            )
 
-        if player.network is not None:
-            engine.data["network_capacities"][player.network.id].update_network(player.network)
+    def _remove_type(self, facility_type):
+        self._data.pop(facility_type, None)
+        if self._counts is not None:
+            self._counts.pop(facility_type, None)
+        self._weighted_efficiency.pop(facility_type, None)
 
     def update_network(self, network):
-        """This function updates the capacity data of the network"""
+        """This function rebuilds the capacity data of the network from the capacities of its members"""
         engine = current_app.config["engine"]
         self._data = {}
+        self._counts = {}
         for player in network.members:
-            player_capacities = engine.data["player_capacities"][player.id].get_all()
-            for facility in player_capacities:
-                if "power" in player_capacities[facility]:
+            player_capacities = engine.data["player_capacities"][player.id]
+            if player_capacities.counts() is None:
+                # loaded from an old save, the counts of the member are needed to update the network incrementally
+                player_capacities._rebuild(engine, player, None)
+            player_counts = player_capacities.counts()
+            for facility, values in player_capacities.get_all().items():
+                if "power" in values:
                     if facility not in self._data:
                         self._data[facility] = {"power": 0.0}
-                    self._data[facility]["power"] += player_capacities[facility]["power"]
+                        self._counts[facility] = 0
+                    self._data[facility]["power"] += values["power"]
+                    self._counts[facility] += player_counts[facility]
+
+    def change_network_power(self, network, facility_type, power, sign):
+        """Adds (`sign` = 1) or subtracts (`sign` = -1) the power of one facility of a member to the network"""
+        if self._counts is None:
+            self.update_network(network)
+            return
+        if facility_type not in self._data:
+            if sign < 0:
+                return
+            self._data[facility_type] = {"power": 0.0}
+            self._counts[facility_type] = 0
+        self._counts[facility_type] += sign
+        if self._counts[facility_type] <= 0:
+            self._remove_type(facility_type)
+            return
+        self._data[facility_type]["power"] += sign * power
 
     def init_facility(self, engine, facility):
         """This function initializes the capacity data of a facility"""
@@ -131,6 +235,10 @@ class CapacityData:
         """Returns the capacity data"""
         return self._data
 
+    def counts(self):
+        """Returns the number of facilities per facility type, None if they are not known (loaded from an old save)"""
+        return self._counts
+
     def contains(self, facility):
         """Returns whether the facility is in the capacity data"""
         return facility in self._data
@@ -275,11 +383,9 @@ class EmissionData:
     """Class that stores the emission and climate data of the server"""
 
     def __init__(self, delta_t, spt, random_seed):
-        ref_temp = []
-        temp_deviation = []
-        for t in range(delta_t - 360, delta_t):
-            ref_temp.append(calculate_reference_gta(t + 1, spt))
-            temp_deviation.append(calculate_temperature_deviation(t + 1, spt, 4e10, random_seed))
+        ticks = np.arange(delta_t - 359, delta_t + 1)
+        ref_temp = reference_gta_series(ticks, spt).tolist()
+        temp_deviation = temperature_deviation_series(ticks, spt, 4e10, random_seed).tolist()
         self._data = {
             "emissions": {
                 "CO2": deque([4e10] * 360, maxlen=360),  # base value of 5Mt of CO2 in the atmosphere
@@ -347,3 +453,28 @@ def calculate_temperature_deviation(tick, seconds_per_tick, co2_levels, random_s
     perlin2 = noise.pnoise1(tick / ticks_per_year * 6, base=random_seed)
     perlin_disturbance = 0.4 * perlin1 + 0.1 * perlin2
     return temperature_deviation + perlin_disturbance
+
+
+def reference_gta_series(ticks, seconds_per_tick):
+    """Vectorized version of `calculate_reference_gta` for an array of ticks"""
+    month = ticks * seconds_per_tick / 518_400
+    return 13.65 - np.sin((month + 2) * np.pi / 6) * 1.9
+
+
+def temperature_deviation_series(ticks, seconds_per_tick, co2_levels, random_seed):
+    """
+    Vectorized version of `calculate_temperature_deviation` for an array of ticks, the noise library only evaluates
+    one point per call so the perlin noise is computed in a loop
+    """
+    ticks_per_year = 60 * 60 * 24 * 72 / seconds_per_tick
+    temperature_deviation = (co2_levels - 4e10) / 1.33e10
+    perlin_disturbance = np.fromiter(
+        (
+            0.4 * noise.pnoise1(tick / ticks_per_year, base=random_seed)
+            + 0.1 * noise.pnoise1(tick / ticks_per_year * 6, base=random_seed)
+            for tick in ticks.tolist()
+        ),
+        dtype=np.float64,
+        count=len(ticks),
+    )
+    return temperature_deviation + perlin_disturbance
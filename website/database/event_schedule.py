@@ -0,0 +1,114 @@
+"""This file contains the class `EventSchedule` that keeps the ticks at which the timed events of the game are due"""
+
+import heapq
+
+from website import db
+from website.database.player_assets import ActiveFacility, ClimateEventRecovery, OngoingConstruction, Shipment
+
+# the kinds of events in the order in which they are completed during a tick
+event_models = {
+    "construction": OngoingConstruction,
+    "shipment": Shipment,
+    "end_of_life": ActiveFacility,
+    "climate_event_recovery": ClimateEventRecovery,
+}
+event_kinds = list(event_models)
+
+
+class EventSchedule:
+    """
+    Class that stores the due ticks of the ongoing constructions, shipments, end of life of active facilities and
+    climate event recoveries in a min-heap so that each tick only the events that are due have to be loaded.
+    The heap is built from the database the first time it is used and the events are added when they are created or
+    resumed. Paused, cancelled or destroyed events don't have to be removed: each due entry is checked against the
+    database when it is popped, it is dropped if the event doesn't exist anymore or is paused, and rescheduled if its
+    due tick has changed.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self.loaded = False
+
+    def reset(self):
+        """Discards the schedule, it is rebuilt from the database the next time it is used"""
+        self._heap = []
+        self.loaded = False
+
+    def load(self):
+        """Builds the schedule from the database"""
+        construction_due = OngoingConstruction.start_time + OngoingConstruction.duration
+        shipment_due = Shipment.departure_time + Shipment.duration
+        recovery_due = ClimateEventRecovery.start_time + ClimateEventRecovery.duration
+        queries = {
+            "construction": db.session.query(construction_due, OngoingConstruction.id).filter(
+                OngoingConstruction.suspension_time.is_(None)
+            ),
+            "shipment": db.session.query(shipment_due, Shipment.id).filter(
+                Shipment.departure_time.isnot(None), Shipment.suspension_time.is_(None)
+            ),
+            "end_of_life": db.session.query(ActiveFacility.end_of_life, ActiveFacility.id).filter(
+                ActiveFacility.end_of_life.isnot(None)
+            ),
+            "climate_event_recovery": db.session.query(recovery_due, ClimateEventRecovery.id),
+        }
+        self._heap = [
+            (due_tick, event_kinds.index(kind), event_id)
+            for kind, query in queries.items()
+            for due_tick, event_id in query.all()
+        ]
+        heapq.heapify(self._heap)
+        self.loaded = True
+
+    @staticmethod
+    def due_tick(kind, event):
+        """Returns the tick at which an event is due, None if it is paused"""
+        if kind == "construction":
+            if event.suspension_time is not None:
+                return None
+            return event.start_time + event.duration
+        if kind == "shipment":
+            if event.departure_time is None or event.suspension_time is not None:
+                return None
+            return event.departure_time + event.duration
+        if kind == "end_of_life":
+            return event.end_of_life
+        return event.start_time + event.duration
+
+    def add(self, kind, event):
+        """Schedules a new or resumed event (the event needs an id, the session has to be flushed)"""
+        if not self.loaded:
+            # the event will be read from the database when the schedule is built
+            return
+        due_tick = self.due_tick(kind, event)
+        if due_tick is not None:
+            heapq.heappush(self._heap, (due_tick, event_kinds.index(kind), event.id))
+
+    def pop_due(self, total_t) -> dict[str, list]:
+        """
+        Removes the events that are due at tick `total_t` from the schedule and returns them by kind, ordered by id.
+        """
+        if not self.loaded:
+            self.load()
+        due_ids = {kind: set() for kind in event_kinds}
+        while self._heap and self._heap[0][0] <= total_t:
+            _, kind_index, event_id = heapq.heappop(self._heap)
+            due_ids[event_kinds[kind_index]].add(event_id)
+
+        due_events = {}
+        for kind, ids in due_ids.items():
+            due_events[kind] = []
+            if not ids:
+                continue
+            model = event_models[kind]
+            for event in model.query.filter(model.id.in_(ids)).order_by(model.id).all():
+                due_tick = self.due_tick(kind, event)
+                if due_tick is None:
+                    continue
+                if due_tick > total_t:
+                    heapq.heappush(self._heap, (due_tick, event_kinds.index(kind), event.id))
+                    continue
+                due_events[kind].append(event)
+        return due_events
+
+    def __len__(self):
+        return len(self._heap)
@@ -0,0 +1,55 @@
+"""This file contains the class `FacilityUsage` that keeps the usage of the active facilities in memory"""
+
+from sqlalchemy import and_, bindparam
+
+from website import db
+from website.database.player_assets import ActiveFacility
+
+
+class FacilityUsage:
+    """
+    Class that stores the usage of active facilities in memory so that it doesn't have to be written to the database
+    every tick. Facilities whose usage depends on their position (wind and solar) are stored by facility id, the other
+    facilities of the same type of a player all have the same usage, which is stored by (player_id, facility type).
+    Only the values that have not been written to the database yet are kept, `flush()` writes them to the database at
+    checkpoints and on shutdown.
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_type = {}
+
+    def set(self, facility_id, usage):
+        """Sets the usage of a single facility"""
+        self._by_id[facility_id] = usage
+
+    def set_type(self, player_id, facility_type, usage):
+        """Sets the usage of all facilities of a type of a player"""
+        self._by_type[(player_id, facility_type)] = usage
+
+    def get(self, facility: ActiveFacility):
+        """Returns the current usage of a facility, falling back to the value stored in the database"""
+        if facility.id in self._by_id:
+            return self._by_id[facility.id]
+        return self._by_type.get((facility.player_id, facility.facility), facility.usage)
+
+    def flush(self):
+        """Writes the usage values to the database with one statement per kind of key (the caller has to commit)"""
+        table = ActiveFacility.__table__
+        if self._by_type:
+            db.session.execute(
+                table.update()
+                .where(and_(table.c.player_id == bindparam("b_player_id"), table.c.facility == bindparam("b_facility")))
+                .values(usage=bindparam("b_usage")),
+                [
+                    {"b_player_id": player_id, "b_facility": facility_type, "b_usage": usage}
+                    for (player_id, facility_type), usage in self._by_type.items()
+                ],
+            )
+        if self._by_id:
+            db.session.execute(
+                table.update().where(table.c.id == bindparam("b_id")).values(usage=bindparam("b_usage")),
+                [{"b_id": facility_id, "b_usage": usage} for facility_id, usage in self._by_id.items()],
+            )
+        self._by_id = {}
+        self._by_type = {}
@@ -3,9 +3,11 @@ which makes up the map"""
 
 from __future__ import annotations
 
+import csv
 from typing import List
 
 from website import db
+from website.database.write_behind import WriteBehindColumn, tile_reserves
 
 
 class Hex(db.Model):
@@ -13,18 +15,23 @@ class Hex(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     q = db.Column(db.Integer)
-    r = db.Column(db.Integer)
+    r = db.Column(db.Integer, index=True)
     solar = db.Column(db.Float)
     wind = db.Column(db.Float)
     hydro = db.Column(db.Float)
-    coal = db.Column(db.Float)
-    gas = db.Column(db.Float)
-    uranium = db.Column(db.Float)
+    _coal = db.Column("coal", db.Float)
+    coal = WriteBehindColumn(tile_reserves)
+    _gas = db.Column("gas", db.Float)
+    gas = WriteBehindColumn(tile_reserves)
+    _uranium = db.Column("uranium", db.Float)
+    uranium = WriteBehindColumn(tile_reserves)
     climate_risk = db.Column(db.Integer)
     player_id = db.Column(
         db.Integer, db.ForeignKey("player.id"), unique=True, nullable=True
     )  # ID of the owner of the tile
 
+    __table_args__ = (db.Index("ix_hex_q_r", "q", "r"),)
+
     def __repr__(self):
         return f"<Tile {self.id} wind {self.wind}>"
 
@@ -61,3 +68,14 @@ class Hex(db.Model):
 
         find_downstream(self, n)
         return downstream_tiles
+
+
+def insert_map(path="website/static/data/map.csv"):
+    """Inserts the tiles of a map csv file in the database with a single executemany (the caller has to commit)"""
+    float_columns = ["solar", "wind", "hydro", "coal", "gas", "uranium", "climate_risk"]
+    with open(path, "r") as file:
+        rows = [
+            {"q": int(row["q"]), "r": int(row["r"]), **{key: float(row[key]) for key in float_columns}}
+            for row in csv.DictReader(file)
+        ]
+    db.session.execute(Hex.__table__.insert(), rows)
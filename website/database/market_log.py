@@ -0,0 +1,255 @@
+"""
+This file contains the class `MarketLog` that keeps the snapshots of the electricity market of a network for the last
+ticks, with the functions to open the logs and to convert the pickle files of older versions.
+"""
+
+import json
+import os
+import pickle
+import shutil
+from glob import glob
+
+import numpy as np
+
+from website.utils.electricity_market import OrderBook
+
+format_version = 1
+default_capacity = 1440  # number of ticks kept
+default_data_size = 1 << 20  # [bytes], doubled when the records of `capacity` ticks don't fit anymore
+
+order_dtype = np.dtype([("player_id", "<i4"), ("facility", "<i2"), ("capacity", "<f8"), ("price", "<f8")])
+index_dtype = np.dtype(
+    [
+        ("tick", "<i8"),
+        ("position", "<i8"),  # position of the record in the stream of all the bytes written to the log
+        ("offers", "<i4"),
+        ("demands", "<i4"),
+        ("market_price", "<f8"),
+        ("market_quantity", "<f8"),
+    ]
+)
+
+
+def market_log_path(network_id):
+    """Returns the directory of the market log of a network"""
+    return f"instance/network_data/{network_id}/market_log"
+
+
+class MarketLog:
+    """
+    Class that stores the sorted offers and demands and the price and quantity of the market of a network for the last
+    `capacity` ticks. The directory of a log contains three files:
+        `index.npy`:    memory-mapped array with one entry per tick at position `tick % capacity`, the entry of a tick
+                        is valid if its `tick` field matches, so old ticks expire when their entry is overwritten
+        `data.bin`:     memory-mapped ring buffer of bytes that contains the orders of the records in columnar form
+                        (player ids, facility codes, capacities and prices, see `order_dtype`)
+        `header.json`:  format version, sizes and the names of the facilities encoded in the orders
+    A record is valid as long as its bytes haven't been overwritten, which is checked with its position in the stream of
+    bytes written to the log. The data buffer is doubled when it can't hold the records of `capacity` ticks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "header.json"), "r") as file:
+            self.header = json.load(file)
+        self.facility_codes = {name: code for code, name in enumerate(self.header["facilities"])}
+        self._index_map = np.load(os.path.join(path, "index.npy"), mmap_mode="r+")
+        # plain array views of the memory maps, they are faster to index
+        self.index = np.asarray(self._index_map)
+        self._open_data()
+        # the positions only grow, so the last record written has the largest position
+        last = int(np.argmax(self.index["position"]))
+        self.write_position = int(self.index["position"][last] + self._record_size(self.index[last]))
+
+    @classmethod
+    def create(cls, path, capacity=default_capacity, data_size=default_data_size):
+        """Creates an empty log at `path` and returns it"""
+        os.makedirs(path, exist_ok=True)
+        index = np.lib.format.open_memmap(
+            os.path.join(path, "index.npy"), mode="w+", dtype=index_dtype, shape=(capacity,)
+        )
+        index[:] = 0
+        index["tick"] = -1
+        index.flush()
+        del index
+        with open(os.path.join(path, "data.bin"), "wb") as file:
+            file.truncate(data_size)
+        header = {"version": format_version, "capacity": capacity, "data_size": data_size, "facilities": []}
+        cls._write_header(path, header)
+        return cls(path)
+
+    def _open_data(self):
+        self._data_map = np.memmap(os.path.join(self.path, "data.bin"), dtype=np.uint8, mode="r+")
+        self.data = np.asarray(self._data_map)
+
+    @staticmethod
+    def _write_header(path, header):
+        header_path = os.path.join(path, "header.json")
+        with open(header_path + ".tmp", "w") as file:
+            json.dump(header, file)
+        os.replace(header_path + ".tmp", header_path)
+
+    @staticmethod
+    def _record_size(entry):
+        return (int(entry["offers"]) + int(entry["demands"])) * order_dtype.itemsize
+
+    def _facility_code(self, facility):
+        code = self.facility_codes.get(facility)
+        if code is None:
+            code = len(self.header["facilities"])
+            self.facility_codes[facility] = code
+            self.header["facilities"].append(facility)
+            self._write_header(self.path, self.header)
+        return code
+
+    def _encode(self, book: OrderBook):
+        """Returns the orders of an order book as an array of `order_dtype`"""
+        orders = np.empty(len(book), dtype=order_dtype)
+        orders["player_id"] = book.player_id
+        orders["capacity"] = book.capacity
+        orders["price"] = book.price
+        # the codes of the order book are translated to the codes of the log
+        codes = np.array([self._facility_code(facility) for facility in book.facility_names], dtype=np.int16)
+        orders["facility"] = codes[book.facility_code]
+        return orders
+
+    def _decode(self, orders):
+        """Returns the orders in the format of `OrderBook.to_dict(orient="list")` with the cumulated capacities"""
+        facilities = self.header["facilities"]
+        return {
+            "player_id": orders["player_id"].tolist(),
+            "capacity": orders["capacity"].tolist(),
+            "price": orders["price"].tolist(),
+            "facility": [facilities[code] for code in orders["facility"].tolist()],
+            "cumul_capacities": np.cumsum(orders["capacity"]).tolist(),
+        }
+
+    def _write(self, position, record):
+        """Writes bytes at a position of the stream, wrapping around the end of the buffer"""
+        start = position % len(self.data)
+        first = min(len(record), len(self.data) - start)
+        self.data[start : start + first] = record[:first]
+        self.data[: len(record) - first] = record[first:]
+
+    def _read(self, position, size):
+        start = position % len(self.data)
+        first = min(size, len(self.data) - start)
+        return np.concatenate([self.data[start : start + first], self.data[: size - first]])
+
+    def append(self, tick, offers, demands, market_price, market_quantity):
+        """Adds the snapshot of the market of a tick, the order books have to be sorted"""
+        record = np.concatenate([self._encode(offers), self._encode(demands)]).view(np.uint8)
+        self._ensure_room(tick, len(record))
+        self._write(self.write_position, record)
+        self.index[tick % len(self.index)] = (
+            tick,
+            self.write_position,
+            len(offers),
+            len(demands),
+            market_price,
+            market_quantity,
+        )
+        self.write_position += len(record)
+
+    def _ensure_room(self, tick, size):
+        """Doubles the data buffer if writing `size` bytes would overwrite one of the records that have to be kept"""
+        oldest_position = self.write_position + size - len(self.data)
+        if oldest_position <= 0:
+            return
+        kept = (self.index["tick"] > tick - len(self.index)) & (self.index["tick"] >= 0)
+        if not np.any(kept & (self.index["position"] < oldest_position)):
+            return
+        data_size = len(self.data)
+        while data_size < 2 * (self.write_position - int(self.index["position"][kept].min()) + size):
+            data_size *= 2
+        # the bytes keep their position in the stream, they are moved to their slot in the larger buffer
+        positions = np.arange(max(0, self.write_position - len(self.data)), self.write_position)
+        data = self.data[positions % len(self.data)]
+        self._data_map.flush()
+        del self.data, self._data_map
+        with open(os.path.join(self.path, "data.bin"), "r+b") as file:
+            file.truncate(data_size)
+        self._open_data()
+        self.data[positions % data_size] = data
+        self.header["data_size"] = data_size
+        self._write_header(self.path, self.header)
+
+    def get(self, tick):
+        """Returns the snapshot of the market at a tick as a dict, None if the tick is not in the log"""
+        if tick < 0:
+            return None
+        entry = self.index[tick % len(self.index)]
+        if int(entry["tick"]) != tick:
+            return None
+        position = int(entry["position"])
+        size = self._record_size(entry)
+        if position + size > self.write_position or position < self.write_position - len(self.data):
+            return None
+        orders = self._read(position, size).view(order_dtype)
+        offer_count = int(entry["offers"])
+        return {
+            "capacities": self._decode(orders[:offer_count]),
+            "demands": self._decode(orders[offer_count:]),
+            "market_price": float(entry["market_price"]),
+            "market_quantity": float(entry["market_quantity"]),
+        }
+
+    def flush(self):
+        """Writes the log to the disk"""
+        self._index_map.flush()
+        self._data_map.flush()
+
+
+_open_logs = {}
+
+
+def open_log(network_id):
+    """Returns the market log of a network, it is created if it doesn't exist"""
+    log = _open_logs.get(network_id)
+    if log is None:
+        path = market_log_path(network_id)
+        if os.path.isfile(os.path.join(path, "header.json")):
+            log = MarketLog(path)
+        else:
+            log = MarketLog.create(path)
+        _open_logs[network_id] = log
+    return log
+
+
+def close_log(network_id):
+    """Forgets an open log, for example before its directory is deleted"""
+    _open_logs.pop(network_id, None)
+
+
+def close_all():
+    """Forgets all the open logs, for example before the instance folder is replaced"""
+    _open_logs.clear()
+
+
+def convert_pickles(log=None):
+    """Imports the market snapshot pickle files of older versions into the logs and removes them"""
+    chart_dirs = glob("instance/network_data/*/charts")
+    for chart_dir in chart_dirs:
+        network_id = int(os.path.basename(os.path.dirname(chart_dir)))
+        market_log = open_log(network_id)
+        snapshots = sorted(
+            (int(filename[len("market_t") : -len(".pck")]), filename) for filename in os.listdir(chart_dir)
+        )
+        for tick, filename in snapshots:
+            with open(os.path.join(chart_dir, filename), "rb") as file:
+                market = pickle.load(file)
+            # the order books of the oldest versions are DataFrames
+            books = []
+            for book in [market["capacities"], market["demands"]]:
+                if not isinstance(book, OrderBook):
+                    columns = book.to_dict(orient="list")
+                    book = OrderBook()
+                    names = ["player_id", "capacity", "price", "facility"]
+                    for row in zip(*(columns[name] for name in names), strict=True):
+                        book.append(*row)
+                books.append(book)
+            market_log.append(tick, *books, market["market_price"], market["market_quantity"])
+        market_log.flush()
+        shutil.rmtree(chart_dir)
+    if chart_dirs and log is not None:
+        log(f"converted the market snapshots of {len(chart_dirs)} networks")
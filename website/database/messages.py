@@ -22,6 +22,8 @@ class Message(db.Model):
     player_id = db.Column(db.Integer, db.ForeignKey("player.id"))
     chat_id = db.Column(db.Integer, db.ForeignKey("chat.id"))
 
+    __table_args__ = (db.Index("ix_message_chat_id_time", "chat_id", "time"),)
+
     def package(self):
         """Serializes this message's data into a dictionary"""
         return {
@@ -42,6 +44,8 @@ class Notification(db.Model):
     read = db.Column(db.Boolean, default=False)
     player_id = db.Column(db.Integer, db.ForeignKey("player.id"))
 
+    __table_args__ = (db.Index("ix_notification_player_id_time", "player_id", "time"),)
+
 
 # table that links chats to players
 player_chats = db.Table(
@@ -0,0 +1,316 @@
+"""
+This file contains the migrations of the data of the instance folder and the runner that applies them. The schema of
+the data has a version: it is stored for each component in the manifest of the checkpoint, in the index of each
+time series store and in the `user_version` of the database. A migration brings the data from the previous version to
+its version, it is applied to one component or store at a time, so that the data of all the players never has to be
+loaded at once and the components can be migrated in parallel. The progress is written to the disk as the components
+are migrated, an interrupted run continues where it has stopped.
+To change the schema, add a `Migration` at the end of `all_migrations` with the next version.
+"""
+
+import json
+import math
+import multiprocessing
+import multiprocessing.connection
+import os
+import pickle
+import shutil
+import traceback
+from datetime import datetime
+from glob import glob
+
+
+class Migration:
+    """
+    A change of the schema of the data. The functions modify the data in place, each one is optional:
+        engine(data):                           values of engine.data that are not in a player or network component
+        player(component, player_id):           {"current_data", "player_capacities", "player_cumul_emissions"}
+        network(component, network_id):         {"network_data", "network_capacities"}
+        time_series(store, kind, entity_id):    `TimeSeriesStore` of a player, a network or the climate (kind is
+                                                "player", "network" or "climate", entity_id is None for the climate)
+        database(connection):                   SQLAlchemy connection to the database, in a transaction
+    They must also work on data that already has the new schema, for the data written before versions were stored.
+    """
+
+    def __init__(
+        self, version, description, engine=None, player=None, network=None, time_series=None, database=None
+    ):
+        self.version = version
+        self.description = description
+        self.functions = {
+            "engine": engine,
+            "player": player,
+            "network": network,
+            "time_series": time_series,
+            "database": database,
+        }
+
+
+def _start_date_to_timestamp(data):
+    if isinstance(data["start_date"], datetime):
+        # the servers had a clock time of 30 seconds when the start date was changed to the time of the first tick
+        data["start_date"] = math.floor(data["start_date"].timestamp() / 30) * 30
+
+
+def _remove_maintenance_costs_player(component, player_id):
+    component["current_data"]._data["revenues"].pop("O&M_costs", None)
+
+
+def _remove_maintenance_costs_time_series(store, kind, entity_id):
+    if kind == "player":
+        store.remove_series("revenues", "O&M_costs")
+
+
+def _add_hot_filter_indexes(connection):
+    # the same indexes are declared in the models, so that `db.create_all` creates them in new databases
+    indexes = {
+        "ix_active_facility_player_id_facility": "active_facility (player_id, facility)",
+        "ix_active_facility_end_of_life": "active_facility (end_of_life)",
+        "ix_ongoing_construction_player_id_name": "ongoing_construction (player_id, name)",
+        "ix_shipment_player_id": "shipment (player_id)",
+        "ix_hex_q_r": "hex (q, r)",
+        "ix_hex_r": "hex (r)",
+        "ix_notification_player_id_time": "notification (player_id, time)",
+        "ix_message_chat_id_time": "message (chat_id, time)",
+    }
+    for name, columns in indexes.items():
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+
+all_migrations = [
+    Migration(1, "start date as the timestamp of the first tick", engine=_start_date_to_timestamp),
+    Migration(
+        2,
+        "removal of the O&M costs from the revenues",
+        player=_remove_maintenance_costs_player,
+        time_series=_remove_maintenance_costs_time_series,
+    ),
+    Migration(3, "indexes on the columns filtered by the ticks and the requests", database=_add_hot_filter_indexes),
+]
+schema_version = all_migrations[-1].version
+
+
+def pending_migrations(version, target):
+    """Returns the functions of the migrations after `version` that modify a target (ex: "player")"""
+    return [
+        migration.functions[target]
+        for migration in all_migrations
+        if migration.version > version and migration.functions.get(target) is not None
+    ]
+
+
+def component_target(name):
+    """Returns the migration target of a checkpoint component and the id of its entity"""
+    if name.startswith("players/"):
+        return "player", int(name[len("players/") :])
+    if name.startswith("networks/"):
+        return "network", int(name[len("networks/") :])
+    if name == "engine":
+        return "engine", None
+    return None, None  # the climate and the daily question have no migrations
+
+
+def migrate_component(directory, name, entry):
+    """Applies the pending migrations to a component of the checkpoint, writes it in a new file and returns its entry"""
+    # checkpoint and time_series import the schema version from this module
+    from website.database import checkpoint
+
+    target, entity_id = component_target(name)
+    component = checkpoint.load_component(directory, entry)
+    for function in pending_migrations(entry.get("schema", 0), target):
+        if target == "engine":
+            function(component)
+        else:
+            function(component, entity_id)
+    filename = f"{entry['file'][: -len('.pck')]}.s{schema_version}.pck"
+    return checkpoint.write_component(directory, filename, component, schema_version)
+
+
+def store_paths():
+    """Returns the list of (path, kind, entity_id) of the time series stores"""
+    from website.database import time_series
+
+    paths = []
+    for index_path in glob(os.path.join(time_series.player_store_path("*"), "index.json")):
+        path = os.path.dirname(index_path)
+        paths.append((path, "player", int(os.path.basename(path)[len("player_") :])))
+    for index_path in glob(os.path.join(time_series.network_store_path("*"), "index.json")):
+        path = os.path.dirname(index_path)
+        paths.append((path, "network", int(os.path.basename(os.path.dirname(path)))))
+    if os.path.isfile(os.path.join(time_series.climate_store_path, "index.json")):
+        paths.append((time_series.climate_store_path, "climate", None))
+    return paths
+
+
+def _recover_stores():
+    """Finishes or cleans up the replacements of stores that have been interrupted"""
+    from website.database import time_series
+
+    store_patterns = [time_series.player_store_path("*"), time_series.network_store_path("*")]
+    for pattern in store_patterns + [time_series.climate_store_path]:
+        for temporary_path in glob(pattern + ".migrating"):
+            shutil.rmtree(temporary_path)
+        for old_path in glob(pattern + ".old"):
+            path = old_path[: -len(".old")]
+            if os.path.isdir(path):
+                shutil.rmtree(old_path)
+            else:
+                os.replace(old_path, path)
+
+
+def migrate_store(path, kind, entity_id):
+    """
+    Applies the pending migrations to a time series store. The store is migrated in a copy that replaces it, so that
+    an interrupted migration leaves it unchanged.
+    """
+    from website.database.time_series import TimeSeriesStore
+
+    store = TimeSeriesStore(path)
+    functions = pending_migrations(store.index.get("schema_version", 0), "time_series")
+    if not functions:
+        store.index["schema_version"] = schema_version
+        store.flush()
+        return
+    del store
+    temporary_path = path + ".migrating"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    shutil.copytree(path, temporary_path)
+    store = TimeSeriesStore(temporary_path)
+    for function in functions:
+        function(store, kind, entity_id)
+    store.index["schema_version"] = schema_version
+    store.flush()
+    del store
+    os.replace(path, path + ".old")
+    os.replace(temporary_path, path)
+    shutil.rmtree(path + ".old")
+
+
+def migrate_database(connection, log=print):
+    """Applies the pending migrations to the database, the version is stored in its `user_version`"""
+    version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+    if version >= schema_version:
+        return
+    functions = pending_migrations(version, "database")
+    for function in functions:
+        function(connection)
+    connection.exec_driver_sql(f"PRAGMA user_version = {schema_version}")
+    if functions:
+        log(f"the database has been migrated to the schema version {schema_version}")
+
+
+def _migration_worker(conn):
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        function, args = task
+        try:
+            conn.send((True, function(*args)))
+        except Exception:  # noqa: BLE001 (the traceback is sent to the parent, which raises it)
+            conn.send((False, traceback.format_exc()))
+
+
+def run_tasks(tasks, workers):
+    """
+    Runs the tasks given as a list of (function, args) and yields (task, result) as they finish. The tasks are run in
+    `workers` forked processes, or in the calling process if there is one worker or fork is not available.
+    """
+    if workers <= 1 or len(tasks) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for function, args in tasks:
+            yield (function, args), function(*args)
+        return
+    # the pipes are used directly, as in `ClearingPool`: the queues of `multiprocessing` don't work with eventlet
+    context = multiprocessing.get_context("fork")
+    processes = []
+    connections = []
+    for _ in range(min(workers, len(tasks))):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_migration_worker, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        processes.append(process)
+        connections.append(parent_conn)
+    try:
+        pending = {}  # connection -> task
+        next_task = 0
+        while next_task < len(tasks) or pending:
+            for conn in connections:
+                if conn not in pending and next_task < len(tasks):
+                    conn.send(tasks[next_task])
+                    pending[conn] = tasks[next_task]
+                    next_task += 1
+            for conn in multiprocessing.connection.wait(list(pending)):
+                success, result = conn.recv()
+                task = pending.pop(conn)
+                if not success:
+                    raise RuntimeError(f"the migration {task[0].__name__}{task[1]} has failed:\n{result}")
+                yield task, result
+    finally:
+        for conn in connections:
+            conn.send(None)
+            conn.close()
+        for process in processes:
+            process.join()
+
+
+def convert_legacy_engine_data(log=print):
+    """Writes the engine_data.pck of older versions as a checkpoint with the schema of before the migrations"""
+    from website.database import checkpoint
+
+    if checkpoint.read_manifest() is not None or not os.path.isfile(checkpoint.legacy_path):
+        return
+    with open(checkpoint.legacy_path, "rb") as file:
+        data = pickle.load(file)
+    checkpoint.write_checkpoint(data, schema_version=0)
+    os.remove(checkpoint.legacy_path)
+    log("converted engine_data.pck to a checkpoint")
+
+
+def migrate_instance(workers=None, log=print, manifest_interval=100):
+    """
+    Brings the checkpoint and the time series stores of the instance folder to the current schema version. The
+    manifest of the checkpoint is written every `manifest_interval` migrated components, so that an interrupted run
+    only repeats the components migrated since. Returns the number of migrated components and stores.
+    """
+    from website.database import checkpoint, time_series
+
+    workers = workers or os.cpu_count() or 1
+    convert_legacy_engine_data(log)
+    _recover_stores()
+    manifest = checkpoint.read_manifest()
+    tasks = []
+    if manifest is not None:
+        for name, entry in manifest["components"].items():
+            if entry.get("schema", 0) >= schema_version:
+                continue
+            if pending_migrations(entry.get("schema", 0), component_target(name)[0]):
+                tasks.append((migrate_component, (checkpoint.checkpoint_dir, name, entry)))
+            else:
+                entry["schema"] = schema_version
+    component_count = len(tasks)
+    for path, kind, entity_id in store_paths():
+        with open(os.path.join(path, "index.json"), "r") as file:
+            if json.load(file).get("schema_version", 0) < schema_version:
+                tasks.append((migrate_store, (path, kind, entity_id)))
+    if not tasks:
+        if manifest is not None:
+            checkpoint.write_manifest(manifest)
+        return 0
+    log(f"migrating {component_count} checkpoint components and {len(tasks) - component_count} time series stores")
+    # the open stores map the files that are replaced by the migrations
+    time_series.close_all()
+    migrated = 0
+    for (function, args), result in run_tasks(tasks, workers):
+        migrated += 1
+        if function is migrate_component:
+            manifest["components"][args[1]] = result
+            if migrated % manifest_interval == 0:
+                checkpoint.write_manifest(manifest)
+        if migrated % 1000 == 0:
+            log(f"migrated {migrated}/{len(tasks)}")
+    if manifest is not None:
+        checkpoint.write_manifest(manifest)
+        checkpoint.remove_unreferenced(manifest)
+    log(f"the instance data has been migrated to the schema version {schema_version}")
+    return migrated
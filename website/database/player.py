@@ -13,6 +13,7 @@ from website import db
 from website.config.achievements import achievements
 from website.database.messages import Chat, Message, Notification, player_chats
 from website.database.player_assets import ActiveFacility, OngoingConstruction
+from website.database.write_behind import WriteBehindColumn, player_state
 
 
 class Player(db.Model, UserMixin):
@@ -40,10 +41,14 @@ class Player(db.Model, UserMixin):
     network_id = db.Column(db.Integer, db.ForeignKey("network.id"), default=None)
 
     # resources :
-    money = db.Column(db.Float, default=25000)  # default is 25000
-    coal = db.Column(db.Float, default=0)
-    gas = db.Column(db.Float, default=0)
-    uranium = db.Column(db.Float, default=0)
+    _money = db.Column("money", db.Float, default=25000)  # default is 25000
+    money = WriteBehindColumn(player_state)
+    _coal = db.Column("coal", db.Float, default=0)
+    coal = WriteBehindColumn(player_state)
+    _gas = db.Column("gas", db.Float, default=0)
+    gas = WriteBehindColumn(player_state)
+    _uranium = db.Column("uranium", db.Float, default=0)
+    uranium = WriteBehindColumn(player_state)
     coal_on_sale = db.Column(db.Float, default=0)
     gas_on_sale = db.Column(db.Float, default=0)
     uranium_on_sale = db.Column(db.Float, default=0)
@@ -113,16 +118,23 @@ class Player(db.Model, UserMixin):
 
     # player progression data :
     xp = db.Column(db.Integer, default=0)
-    average_revenues = db.Column(db.Float, default=0)
-    max_power_consumption = db.Column(db.Float, default=0)
-    max_energy_stored = db.Column(db.Float, default=0)
-    extracted_resources = db.Column(db.Float, default=0)
+    _average_revenues = db.Column("average_revenues", db.Float, default=0)
+    average_revenues = WriteBehindColumn(player_state)
+    _max_power_consumption = db.Column("max_power_consumption", db.Float, default=0)
+    max_power_consumption = WriteBehindColumn(player_state)
+    _max_energy_stored = db.Column("max_energy_stored", db.Float, default=0)
+    max_energy_stored = WriteBehindColumn(player_state)
+    _extracted_resources = db.Column("extracted_resources", db.Float, default=0)
+    extracted_resources = WriteBehindColumn(player_state)
     bought_resources = db.Column(db.Float, default=0)
     sold_resources = db.Column(db.Float, default=0)
     total_technologies = db.Column(db.Integer, default=0)
-    imported_energy = db.Column(db.Float, default=0)
-    exported_energy = db.Column(db.Float, default=0)
-    captured_CO2 = db.Column(db.Float, default=0)
+    _imported_energy = db.Column("imported_energy", db.Float, default=0)
+    imported_energy = WriteBehindColumn(player_state)
+    _exported_energy = db.Column("exported_energy", db.Float, default=0)
+    exported_energy = WriteBehindColumn(player_state)
+    _captured_CO2 = db.Column("captured_CO2", db.Float, default=0)
+    captured_CO2 = WriteBehindColumn(player_state)
 
     achievements = db.Column(db.Text, default="")
 
@@ -313,6 +325,8 @@ class Player(db.Model, UserMixin):
     def emit(self, event, *args):
         """This method emits a socketio event to the player's clients"""
         engine = current_app.config["engine"]
+        if engine.catching_up:
+            return
         for sid in engine.clients[self.id]:
             engine.socketio.emit(event, *args, room=sid)
 
@@ -558,6 +572,7 @@ class Player(db.Model, UserMixin):
 
     def package_active_facilities(self):
         """Packages the player's active facilities"""
+        engine = current_app.config["engine"]
 
         def get_facility_data(facilities):
             sub_facilities: List[ActiveFacility] = self.active_facilities.filter(
@@ -573,13 +588,13 @@ class Player(db.Model, UserMixin):
                         "multiplier_1",
                         "multiplier_2",
                         "multiplier_3",
-                        "usage",
                     ]
                 }
+                # the usage is kept in memory by the engine and only written to the database at checkpoints
+                | {"usage": engine.facility_usage.get(facility)}
                 for facility in sub_facilities
             }
 
-        engine = current_app.config["engine"]
         return {
             "power_facilities": get_facility_data(engine.power_facilities),
             "storage_facilities": get_facility_data(engine.storage_facilities),
@@ -27,6 +27,8 @@ class OngoingConstruction(db.Model):
     # can access player directly with .player
     player_id = db.Column(db.Integer, db.ForeignKey("player.id"))
 
+    __table_args__ = (db.Index("ix_ongoing_construction_player_id_name", "player_id", "name"),)
+
     _prerequisites = None
     _level = None
 
@@ -114,7 +116,7 @@ class ActiveFacility(db.Model):
     pos_x = db.Column(db.Float)
     pos_y = db.Column(db.Float)
     # time at witch the facility will be decommissioned
-    end_of_life = db.Column(db.Integer)
+    end_of_life = db.Column(db.Integer, index=True)
     # multiply the base values by the following values
     price_multiplier = db.Column(db.Float)
     multiplier_1 = db.Column(db.Float)
@@ -125,6 +127,8 @@ class ActiveFacility(db.Model):
 
     player_id = db.Column(db.Integer, db.ForeignKey("player.id"))
 
+    __table_args__ = (db.Index("ix_active_facility_player_id_facility", "player_id", "facility"),)
+
 
 class Shipment(db.Model):
     """Class that stores the resources shipment on their way"""
@@ -135,7 +139,7 @@ class Shipment(db.Model):
     departure_time = db.Column(db.Integer)
     duration = db.Column(db.Integer)
     suspension_time = db.Column(db.Integer, default=None)  # time at witch the shipment has been paused if it has
-    player_id = db.Column(db.Integer, db.ForeignKey("player.id"))  # can access player directly with .player
+    player_id = db.Column(db.Integer, db.ForeignKey("player.id"), index=True)  # can access player directly with .player
 
 
 class ResourceOnSale(db.Model):
@@ -0,0 +1,47 @@
+"""
+This file contains the profiles of the SQLite database: the pragmas that are set on each new connection and the
+options of the connection pool of SQLAlchemy.
+"""
+
+from sqlalchemy import event
+
+profiles = {
+    # the defaults of SQLite and SQLAlchemy: rollback journal and a full fsync at every commit
+    "default": {"pragmas": {}, "engine_options": {}},
+    # write-ahead log: the HTTP handlers read while the tick writes and a commit only appends to the log. With
+    # synchronous=NORMAL the log is synced at checkpoints only, the last commits can be lost on a power failure but
+    # the database stays consistent.
+    "performance": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -16384,  # [KiB] (negative values are in KiB, positive values in pages)
+            "mmap_size": 256 * 1024 * 1024,  # [bytes]
+            "temp_store": "MEMORY",
+            "busy_timeout": 5000,  # [ms]
+        },
+        # each green thread that handles a request holds a connection
+        "engine_options": {"pool_size": 20, "max_overflow": 20, "pool_timeout": 10},
+    },
+}
+
+
+def engine_options(profile):
+    """Returns the options of the SQLAlchemy engine of a profile (`SQLALCHEMY_ENGINE_OPTIONS`)"""
+    if profile not in profiles:
+        raise ValueError(f"Unknown database profile {profile}, expected one of {list(profiles)}")
+    return dict(profiles[profile]["engine_options"])
+
+
+def set_pragmas(sqlalchemy_engine, profile):
+    """Sets the pragmas of a profile on every new connection of an engine"""
+    pragmas = profiles[profile]["pragmas"]
+    if not pragmas:
+        return
+
+    @event.listens_for(sqlalchemy_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
@@ -0,0 +1,274 @@
+"""
+This file contains the class `TimeSeriesStore` that stores the past values of the charts of the players, the networks
+and the climate on the disk, with the functions to open the stores and to convert the old pickle files.
+"""
+
+import json
+import os
+import pickle
+import shutil
+from glob import glob
+
+import numpy as np
+
+from website.database.migrations import schema_version as current_schema_version
+
+resolution_count = 5  # the resolutions are 1, 6, 36, 216 and 1296 ticks per value
+buffer_length = 360  # number of values kept per resolution
+format_version = 1
+
+climate_store_path = "instance/server_data/climate_data"
+
+
+def player_store_path(player_id):
+    """Returns the directory of the time series of a player"""
+    return f"instance/player_data/player_{player_id}"
+
+
+def network_store_path(network_id):
+    """Returns the directory of the time series of a network"""
+    return f"instance/network_data/{network_id}/time_series"
+
+
+class TimeSeriesStore:
+    """
+    Class that stores the time series of an entity (player, network or climate) in a directory with two files:
+    `values.npy`, a memory-mapped array of shape (series, resolutions, 360) in which each resolution of each series is
+    a ring buffer, and `index.json`, a small header with the row of each (category, series), the position of the oldest
+    value of each resolution (`heads`, shared by all series), the dtype, the tick of the last append and the version of
+    the schema of the data (see `website/database/migrations.py`).
+    Appends only write the new slots and reads slice the rows that are needed. The header is written atomically by
+    `flush()`, the rows of the array are allocated in blocks so that adding a series rarely rewrites the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "index.json"), "r") as file:
+            self.index = json.load(file)
+        self.values = np.load(os.path.join(path, "values.npy"), mmap_mode="r+")
+
+    @classmethod
+    def create(cls, path, data, dtype="float64", last_tick=None, schema_version=current_schema_version):
+        """
+        Creates a store from a dict {category: {series: [5 lists of 360 values from the oldest to the newest]}} and
+        returns it. An existing store at `path` is replaced.
+        """
+        series = {category: {} for category in data}
+        rows = []
+        for category, category_data in data.items():
+            for name, values in category_data.items():
+                series[category][name] = len(rows)
+                rows.append(np.asarray(values, dtype=np.float64))
+        temporary_path = path + ".tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        array = np.lib.format.open_memmap(
+            os.path.join(temporary_path, "values.npy"),
+            mode="w+",
+            dtype=dtype,
+            shape=(cls._capacity(len(rows)), resolution_count, buffer_length),
+        )
+        array[:] = 0
+        if rows:
+            array[: len(rows)] = np.stack(rows)
+        array.flush()
+        del array
+        index = {
+            "version": format_version,
+            "dtype": np.dtype(dtype).name,
+            "heads": [0] * resolution_count,
+            "last_tick": last_tick,
+            "schema_version": schema_version,
+            "series": series,
+        }
+        with open(os.path.join(temporary_path, "index.json"), "w") as file:
+            json.dump(index, file)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temporary_path, path)
+        return cls(path)
+
+    @staticmethod
+    def _capacity(row_count):
+        """Number of rows allocated for `row_count` series"""
+        return max(16, 1 << max(row_count - 1, 0).bit_length())
+
+    @property
+    def row_count(self):
+        return sum(len(category) for category in self.index["series"].values())
+
+    def series_rows(self):
+        """Returns the list of ((category, series), row) of all the series"""
+        return [
+            ((category, name), row) for category, rows in self.index["series"].items() for name, row in rows.items()
+        ]
+
+    def has_series(self, category, name):
+        return name in self.index["series"].get(category, {})
+
+    def add_series(self, category, name):
+        """Adds a series filled with zeros"""
+        category_rows = self.index["series"].setdefault(category, {})
+        if name in category_rows:
+            return
+        row = self.row_count
+        if row >= self.values.shape[0]:
+            self._grow(self._capacity(row + 1))
+        self.values[row] = 0
+        category_rows[name] = row
+
+    def remove_series(self, category, name):
+        """Removes a series, the series in the last row is moved to its row"""
+        category_rows = self.index["series"].get(category, {})
+        if name not in category_rows:
+            return
+        row = category_rows.pop(name)
+        last_row = self.row_count
+        if row != last_row:
+            self.values[row] = self.values[last_row]
+            for rows in self.index["series"].values():
+                for other_name, other_row in rows.items():
+                    if other_row == last_row:
+                        rows[other_name] = row
+        self.values[last_row] = 0
+
+    def _grow(self, capacity):
+        """Rewrites the array of values with more rows"""
+        values_path = os.path.join(self.path, "values.npy")
+        temporary_path = values_path + ".tmp.npy"
+        array = np.lib.format.open_memmap(
+            temporary_path, mode="w+", dtype=self.values.dtype, shape=(capacity,) + self.values.shape[1:]
+        )
+        array[: self.values.shape[0]] = self.values
+        array[self.values.shape[0] :] = 0
+        array.flush()
+        del array
+        self.values.flush()
+        os.replace(temporary_path, values_path)
+        self.values = np.load(values_path, mmap_mode="r+")
+
+    def append_ticks(self, new_data, daily=False):
+        """
+        Appends the values of the last ticks to all the series. `new_data` is a dict {category: {series: values}}, the
+        longest series gives the number of ticks, which has to be a multiple of 216. All the series of the entity are
+        stacked in one array and the resolutions x6, x36 and x216 are averaged from it at once. Series that are not in
+        the store yet are added, shorter series (ex: a facility built during the period) are padded with zeros at the
+        start and the series that are not in `new_data` are extended with zeros. If `daily`, one value of the x1296
+        resolution is averaged from the last 6 values of the x216 resolution.
+        """
+        series = []
+        for category, category_data in new_data.items():
+            for name, values in category_data.items():
+                self.add_series(category, name)
+                series.append((self.index["series"][category][name], values))
+        if not series:
+            return
+        count = max(len(values) for _, values in series)
+        block = np.zeros((self.row_count, count), dtype=np.float64)
+        rows, series_values = zip(*series, strict=True)
+        if all(len(values) == count for values in series_values):
+            block[list(rows)] = series_values
+        else:
+            for row, values in series:
+                block[row, count - len(values) :] = values
+        for resolution in range(resolution_count - 1):
+            if resolution > 0:
+                block = block.reshape(len(block), -1, 6).mean(axis=2)
+            self._append_block(resolution, block)
+        if daily:
+            self._append_block(resolution_count - 1, self.last(resolution_count - 2, 6).mean(axis=1, keepdims=True))
+
+    def _append_block(self, resolution, block):
+        """Writes an array (series, values) after the last values of a resolution"""
+        count = block.shape[1]
+        head = self.index["heads"][resolution]
+        if head + count <= buffer_length:
+            self.values[: len(block), resolution, head : head + count] = block
+        else:
+            slots = (head + np.arange(count)) % buffer_length
+            self.values[: len(block), resolution, slots] = block
+        self.index["heads"][resolution] = (head + count) % buffer_length
+
+    def last(self, resolution, count):
+        """Returns the last `count` values of a resolution of all the series as an array (series, count)"""
+        head = self.index["heads"][resolution]
+        slots = (head + np.arange(buffer_length - count, buffer_length)) % buffer_length
+        return self.values[: self.row_count, resolution, slots]
+
+    def read(self, counts=None):
+        """
+        Returns all the series as a dict {category: {series: [5 lists from the oldest to the newest value]}}. If
+        `counts` is given, only the last `counts[resolution]` values of each resolution are read.
+        """
+        row_count = self.row_count
+        resolutions = []
+        for resolution, head in enumerate(self.index["heads"]):
+            count = buffer_length if counts is None else counts[resolution]
+            slots = (head + np.arange(buffer_length - count, buffer_length)) % buffer_length
+            resolutions.append(self.values[:row_count, resolution, slots].tolist())
+        return {
+            category: {name: [resolutions[r][row] for r in range(resolution_count)] for name, row in rows.items()}
+            for category, rows in self.index["series"].items()
+        }
+
+    def flush(self, last_tick=None):
+        """Writes the values to the disk and then replaces the header"""
+        self.values.flush()
+        if last_tick is not None:
+            self.index["last_tick"] = last_tick
+        index_path = os.path.join(self.path, "index.json")
+        with open(index_path + ".tmp", "w") as file:
+            json.dump(self.index, file)
+        os.replace(index_path + ".tmp", index_path)
+
+
+_open_stores = {}
+
+
+def open_store(path):
+    """Returns the store at `path`, the stores are kept open once they have been used"""
+    store = _open_stores.get(path)
+    if store is None:
+        store = TimeSeriesStore(path)
+        _open_stores[path] = store
+    return store
+
+
+def create_store(path, data, dtype="float64", last_tick=None, schema_version=current_schema_version):
+    """Creates a store and keeps it open"""
+    close_store(path)
+    store = TimeSeriesStore.create(path, data, dtype, last_tick, schema_version)
+    _open_stores[path] = store
+    return store
+
+
+def close_store(path):
+    """Forgets an open store, for example before its directory is deleted"""
+    _open_stores.pop(path, None)
+
+
+def close_all():
+    """Forgets all the open stores, for example before the instance folder is replaced"""
+    _open_stores.clear()
+
+
+def convert_pickles(dtype="float64", log=None):
+    """
+    Converts the time series pickle files of older versions into stores and removes them. The data of the pickle files
+    has the schema of before the migrations, they are applied by `migrations.migrate_instance`.
+    """
+    pickle_files = []
+    for path in glob("instance/player_data/player_*.pck"):
+        player_id = os.path.basename(path)[len("player_") : -len(".pck")]
+        pickle_files.append((path, player_store_path(player_id)))
+    for path in glob("instance/network_data/*/time_series.pck"):
+        network_id = os.path.basename(os.path.dirname(path))
+        pickle_files.append((path, network_store_path(network_id)))
+    if os.path.isfile("instance/server_data/climate_data.pck"):
+        pickle_files.append(("instance/server_data/climate_data.pck", climate_store_path))
+    for pickle_path, store_path in pickle_files:
+        with open(pickle_path, "rb") as file:
+            data = pickle.load(file)
+        create_store(store_path, data, dtype, schema_version=0)
+        os.remove(pickle_path)
+    if pickle_files and log is not None:
+        log(f"converted {len(pickle_files)} time series pickle files")
@@ -0,0 +1,97 @@
+"""This file contains the class `WorldSnapshot` that holds the state of the game world needed during a tick"""
+
+from collections import defaultdict
+
+from sqlalchemy.orm import selectinload
+
+from website.database.player import Network, Player
+from website.database.player_assets import (
+    ActiveFacility,
+    ClimateEventRecovery,
+    OngoingConstruction,
+    Shipment,
+)
+
+# facilities for which the generation is calculated for each instance depending on its position
+position_dependent_facilities = [
+    "windmill",
+    "onshore_wind_turbine",
+    "offshore_wind_turbine",
+    "CSP_solar",
+    "PV_solar",
+]
+
+
+class WorldSnapshot:
+    """
+    Class that loads the players, networks and player assets needed during a tick with a fixed number of bulk queries
+    and indexes them by player (and by facility type for active facilities).
+    The stored objects are the ORM instances of the current session, so changes made to them during the tick are
+    committed with the rest of the tick. The snapshot should not be kept longer than one tick.
+    """
+
+    def __init__(self):
+        self.players: list[Player] = Player.query.options(selectinload(Player.tile)).order_by(Player.id).all()
+        self.players_by_id: dict[int, Player] = {player.id: player for player in self.players}
+        self.networks: list[Network] = Network.query.order_by(Network.id).all()
+        self.network_members: dict[int, list[Player]] = defaultdict(list)
+        for player in self.players:
+            if player.network_id is not None:
+                self.network_members[player.network_id].append(player)
+
+        self.active_facilities: dict[tuple, list[ActiveFacility]] = defaultdict(list)
+        for facility in (
+            ActiveFacility.query.filter(ActiveFacility.facility.in_(position_dependent_facilities))
+            .order_by(ActiveFacility.id)
+            .all()
+        ):
+            self.active_facilities[(facility.player_id, facility.facility)].append(facility)
+
+        self.constructions_by_id: dict[int, OngoingConstruction] = {}
+        self.constructions: dict[int, list[OngoingConstruction]] = defaultdict(list)
+        for construction in OngoingConstruction.query.order_by(OngoingConstruction.id).all():
+            self.constructions_by_id[construction.id] = construction
+            self.constructions[construction.player_id].append(construction)
+
+        self.shipments: dict[int, list[Shipment]] = defaultdict(list)
+        for shipment in Shipment.query.order_by(Shipment.id).all():
+            self.shipments[shipment.player_id].append(shipment)
+
+        self.climate_events: dict[int, list[ClimateEventRecovery]] = defaultdict(list)
+        for recovery in ClimateEventRecovery.query.order_by(ClimateEventRecovery.id).all():
+            self.climate_events[recovery.player_id].append(recovery)
+
+        # usage of the wind facilities by id, calculated for all players at once by `production_update.wind_usage`
+        self.wind_usage: dict[int, float] | None = None
+
+    def facilities_of(self, player_id, facility_type) -> list[ActiveFacility]:
+        """Returns the active facilities of type `facility_type` of a player (only for position dependent types)"""
+        return self.active_facilities.get((player_id, facility_type), [])
+
+    def members_of(self, network_id) -> list[Player]:
+        """Returns the players that are members of a network"""
+        return self.network_members.get(network_id, [])
+
+    def constructions_of(self, player_id) -> list[OngoingConstruction]:
+        """Returns the ongoing constructions and researches of a player"""
+        return self.constructions.get(player_id, [])
+
+    def construction(self, construction_id) -> OngoingConstruction | None:
+        """
+        Returns an ongoing construction by id, None if it doesn't exist anymore. The constructions started while the
+        tick yields (during the clearing of the markets) are not in the snapshot, they are loaded from the database.
+        """
+        construction = self.constructions_by_id.get(construction_id)
+        if construction is None:
+            construction = OngoingConstruction.query.get(construction_id)
+            if construction is not None:
+                self.constructions_by_id[construction_id] = construction
+        return construction
+
+    def shipments_of(self, player_id) -> list[Shipment]:
+        """Returns the shipments of a player"""
+        return self.shipments.get(player_id, [])
+
+    def climate_events_of(self, player_id) -> list[ClimateEventRecovery]:
+        """Returns the ongoing climate event recoveries of a player"""
+        return self.climate_events.get(player_id, [])
@@ -0,0 +1,133 @@
+"""
+This file contains the write-behind cache for the numeric columns of the players and tiles that change every tick.
+The columns are declared with `WriteBehindColumn` in the models, their values are kept in memory once they have been
+modified and are written to the database in bulk by `flush()`.
+"""
+
+from array import array
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm.attributes import instance_state
+
+from website import db
+
+
+class WriteBehindCache:
+    """
+    Class that stores the values of some float columns of a table in memory, one array per column and one row per
+    database row. A database row enters the cache the first time one of its cached columns is modified, from then on
+    the cache holds the current values of the row for all sessions and the database is only updated by `flush()`.
+    The changes made to cached values are not undone by a rollback of the session.
+    """
+
+    def __init__(self, table_name, columns):
+        self.table_name = table_name
+        self.columns = columns
+        self.reset()
+
+    def reset(self):
+        """Discards the cached values (without writing them)"""
+        self._rows = {}  # database id -> row in the arrays
+        self._values = {column: array("d") for column in self.columns}
+        self._dirty = set()
+
+    def get(self, row_id, column):
+        """Returns the cached value of a column, None if the row is not cached"""
+        row = self._rows.get(row_id)
+        if row is None:
+            return None
+        return self._values[column][row]
+
+    def set(self, instance, row_id, column, value):
+        """Sets the value of a column, the row is read from `instance` if it is not cached yet"""
+        row = self._rows.get(row_id)
+        if row is None:
+            row = len(self._rows)
+            self._rows[row_id] = row
+            for name in self.columns:
+                stored_value = getattr(instance, "_" + name)
+                self._values[name].append(0.0 if stored_value is None else stored_value)
+        self._values[column][row] = value
+        self._dirty.add(row_id)
+
+    def flush(self):
+        """Writes the modified rows to the database with one statement (the caller has to commit)"""
+        if not self._dirty:
+            return
+        table = db.metadata.tables[self.table_name]
+        db.session.execute(
+            table.update()
+            .where(table.c.id == bindparam("b_id"))
+            .values({column: bindparam("b_" + column) for column in self.columns}),
+            [
+                {"b_id": row_id} | {"b_" + column: self._values[column][self._rows[row_id]] for column in self.columns}
+                for row_id in sorted(self._dirty)
+            ],
+        )
+        self._dirty = set()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class WriteBehindColumn:
+    """
+    Descriptor for a column of a model that goes through a `WriteBehindCache`. The mapped column has to be declared as
+    `_<name> = db.Column("<name>", ...)`. Objects that are not in the database yet read and write the mapped column.
+    """
+
+    def __init__(self, cache: WriteBehindCache):
+        self.cache = cache
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return getattr(owner, "_" + self.name)
+        key = instance_state(instance).key
+        if key is not None:
+            value = self.cache.get(key[1][0], self.name)
+            if value is not None:
+                return value
+        return getattr(instance, "_" + self.name)
+
+    def __set__(self, instance, value):
+        key = instance_state(instance).key
+        if key is None:
+            setattr(instance, "_" + self.name, value)
+        else:
+            self.cache.set(instance, key[1][0], self.name, value)
+
+
+player_state = WriteBehindCache(
+    "player",
+    [
+        "money",
+        "coal",
+        "gas",
+        "uranium",
+        "average_revenues",
+        "max_power_consumption",
+        "max_energy_stored",
+        "imported_energy",
+        "exported_energy",
+        "extracted_resources",
+        "captured_CO2",
+    ],
+)
+tile_reserves = WriteBehindCache("hex", ["coal", "gas", "uranium"])
+write_behind_caches = [player_state, tile_reserves]
+
+
+def flush():
+    """Writes all the write-behind caches to the database (the caller has to commit)"""
+    for cache in write_behind_caches:
+        cache.flush()
+
+
+def reset():
+    """Discards the values of all the write-behind caches, for example after the database has been replaced"""
+    for cache in write_behind_caches:
+        cache.reset()
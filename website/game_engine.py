@@ -8,7 +8,16 @@ from collections import defaultdict
 from datetime import datetime
 
 from .config.assets import config, const_config
+from .database.checkpoint import Checkpointer
 from .database.engine_data import EmissionData
+from .database.event_schedule import EventSchedule
+from .database.facility_usage import FacilityUsage
+from .utils.chart_cache import ChartCache
+from .utils.electricity_market import ClearingPool
+from .utils.shared_payloads import SharedPayloads
+from .utils.tick_metrics import TickMetrics
+from .utils.weather import WeatherCache
+from .utils.weather_forecast import WeatherForecast
 
 
 # This is the engine object
@@ -24,6 +33,35 @@ class GameEngine(object):
         self.notification_subscriptions = defaultdict(list)
         self.clients = defaultdict(list)
         self.websocket_dict = {}
+        self.tick_metrics = TickMetrics()
+        # duration of each phase of the startup of the server [s], measured in `create_app`
+        self.startup_timings = {}
+        # usage of the active facilities, written to the database at checkpoints
+        self.facility_usage = FacilityUsage()
+        # due ticks of the constructions, shipments, end of life of facilities and climate event recoveries
+        self.event_schedule = EventSchedule()
+        # weather values of the current tick, shared by the production update and the weather requests
+        self.weather_cache = WeatherCache()
+        # serialised chart payloads of the players for the current tick, the size is set in `create_app`
+        self.chart_cache = ChartCache()
+        # serialised websocket messages that are the same for all the clients
+        self.shared_payloads = SharedPayloads()
+        # weather precomputed for the next ticks in the background, enabled in `create_app`
+        self.weather_forecast = WeatherForecast()
+        # writes the checkpoints of `self.data` in the background (see `website/database/checkpoint.py`)
+        self.checkpointer = Checkpointer()
+        # dtype of the new time series stores of the charts (see `website/database/time_series.py`)
+        self.time_series_dtype = "float64"
+        # the numeric values of the players and tiles that change every tick are written to the database every
+        # `write_behind_interval` ticks (see `website/database/write_behind.py`)
+        self.write_behind_interval = 10
+        # pool in which the markets of the networks are cleared, see `create_app` for the available modes
+        self.clearing_pool = ClearingPool()
+        # when the server falls behind by more than `catch_up_threshold` ticks, the missed ticks are simulated in
+        # catch-up mode: nothing is sent to the clients and the database is only committed every few ticks
+        self.catching_up = False
+        self.catch_up_threshold = 10
+        self.catch_up_commit_interval = 100
         self.console_logger = logging.getLogger("console")  # logs events in the terminal
         self.action_logger = logging.getLogger("action_history")  # logs all called functions to a file
         self.init_loggers()
@@ -1,8 +1,5 @@
 """This module is used to initialize the database with test players and networks."""
 
-import pickle
-from pathlib import Path
-
 from werkzeug.security import generate_password_hash
 
 from website import technology_effects
@@ -14,7 +11,7 @@ from .database.messages import Chat
 from .database.player import Network, Player
 from .database.player_assets import OngoingConstruction
 from .utils.misc import add_player_to_data, init_table
-from .utils.network import data_init_network
+from .utils.network import init_network_table
 
 
 def init_test_players(engine):
@@ -177,7 +174,7 @@ def create_player(engine, username, password):
         engine.data["player_capacities"][new_player.id] = CapacityData()
         engine.data["player_cumul_emissions"][new_player.id] = CumulativeEmissionsData()
         add_player_to_data(engine, new_player)
-        init_table(new_player.id)
+        init_table(engine, new_player.id)
         db.session.commit()
         return new_player
     engine.log(f"create_player: player {username} already exists")
@@ -191,17 +188,10 @@ def create_network(engine, name, members):
         new_network = Network(name=name, members=members)
         db.session.add(new_network)
         db.session.commit()
-        Path(f"instance/network_data/{new_network.id}/charts").mkdir(parents=True, exist_ok=True)
         engine.data["network_data"][new_network.id] = CircularBufferNetwork()
         engine.data["network_capacities"][new_network.id] = CapacityData()
         engine.data["network_capacities"][new_network.id].update_network(new_network)
-        past_data = data_init_network()
-        Path(f"instance/network_data/{new_network.id}").mkdir(parents=True, exist_ok=True)
-        with open(
-            f"instance/network_data/{new_network.id}/time_series.pck",
-            "wb",
-        ) as file:
-            pickle.dump(past_data, file)
+        init_network_table(engine, new_network.id)
 
 
 def climate_events_scenario(engine):
@@ -1,17 +1,12 @@
 """The game states update functions are defined here"""
 
-import math
-import pickle
-from typing import List
-
 import numpy as np
-import pandas as pd
 
-from . import db
 from .config.assets import wind_power_curve
-from .database.player import Network, Player
-from .database.player_assets import ActiveFacility, OngoingConstruction, Shipment
-from .utils.misc import calculate_river_discharge, calculate_solar_irradiance, calculate_wind_speed
+from .database import market_log
+from .database.world_snapshot import WorldSnapshot
+from .utils.electricity_market import OrderBook, settle_market
+from .utils.weather import calculate_river_discharge, tile_position
 
 resource_to_extraction = {
     "coal": "coal_mine",
@@ -19,6 +14,9 @@ resource_to_extraction = {
     "uranium": "uranium_mine",
 }
 
+wind_facilities = ["windmill", "onshore_wind_turbine", "offshore_wind_turbine"]
+solar_facilities = ["CSP_solar", "PV_solar"]
+
 extraction_to_resource = {
     "coal_mine": "coal",
     "gas_drilling_site": "gas",
@@ -28,10 +26,16 @@ extraction_to_resource = {
 
 def update_electricity(engine):
     """Update the electricity generation and storage status for all players"""
+    metrics = engine.tick_metrics
     # calculate new co2 and temperature values
     engine.data["current_climate_data"].init_new_value()
-    players = Player.query.all()
-    networks = Network.query.all()
+    # all the players and assets needed during the tick are loaded at once
+    with metrics.measure("world_snapshot"):
+        world = WorldSnapshot()
+    with metrics.measure("weather"):
+        fill_weather_cache(engine, world)
+    players = world.players
+    networks = world.networks
 
     new_values = {}
     for player in players:
@@ -39,12 +43,21 @@ def update_electricity(engine):
             continue
         new_values[player.id] = engine.data["current_data"][player.id].init_new_data()
 
+    markets = []
     for network in networks:
         market = init_market()
-        for player in network.members:
-            calculate_demand(engine, new_values[player.id], player)
-            market = calculate_generation_with_market(engine, new_values, market, player)
-        market_logic(engine, new_values, market)
+        for player in world.members_of(network.id):
+            with metrics.measure("demand"):
+                calculate_demand(engine, world, new_values[player.id], player)
+            market = calculate_generation_with_market(engine, world, new_values, market, player)
+        markets.append(market)
+    # the networks are independent, their markets can be cleared in parallel
+    with metrics.measure("market_clearing"):
+        settlements = settle_markets(engine, markets)
+    # the results are applied in the order of the networks so that the outcome doesn't depend on the clearing mode
+    for network, market, settlement in zip(networks, markets, settlements, strict=True):
+        with metrics.measure("market_clearing"), metrics.measure(f"market_clearing.network_{network.id}"):
+            market_logic(engine, world, new_values, market, settlement)
         # Save market data
         new_network_values = {
             "network_data": {
@@ -57,68 +70,64 @@ def update_electricity(engine):
             "consumption": market["consumption"],
         }
         engine.data["network_data"][network.id].append_value(new_network_values)
-        for player in network.members:
-            player.emit(
-                "new_network_values",
-                {
-                    "total_t": engine.data["total_t"],
-                    "network_values": new_network_values,
-                },
+        with metrics.measure("socket_emits"):
+            for player in world.members_of(network.id):
+                player.emit(
+                    "new_network_values",
+                    {
+                        "total_t": engine.data["total_t"],
+                        "network_values": new_network_values,
+                    },
+                )
+        if engine.catching_up:
+            continue
+        with metrics.measure("market_snapshots"):
+            market_log.open_log(network.id).append(
+                engine.data["total_t"],
+                market["capacities"],
+                market["demands"],
+                market["market_price"],
+                market["market_quantity"],
             )
-        with open(
-            f"instance/network_data/{network.id}/charts/market_t{engine.data['total_t']}.pck",
-            "wb",
-        ) as file:
-            pickle.dump(market, file)
 
     for player in players:
         if player.tile is None:
             continue
         # Power generation calculation for players that are not in a network
         if player.network is None:
-            calculate_demand(engine, new_values[player.id], player)
-            calculate_generation_without_market(engine, new_values, player)
-        set_facilities_usage(engine, new_values[player.id], player)
+            with metrics.measure("demand"):
+                calculate_demand(engine, world, new_values[player.id], player)
+            calculate_generation_without_market(engine, world, new_values, player)
+        with metrics.measure("facilities_usage"):
+            set_facilities_usage(engine, new_values[player.id], player)
         calculate_net_import(new_values[player.id])
-        update_storage_lvls(engine, new_values[player.id], player)
-        resources_and_pollution(engine, new_values[player.id], player)
+        with metrics.measure("storage"):
+            update_storage_lvls(engine, new_values[player.id], player)
+        with metrics.measure("resources_and_pollution"):
+            resources_and_pollution(engine, world, new_values[player.id], player)
         engine.data["current_data"][player.id].append_value(new_values[player.id])
         # add industry revenues to player money
         player.money += new_values[player.id]["revenues"]["industry"]
-        update_player_progress_values(engine, player, new_values)
+        with metrics.measure("progress_values"):
+            update_player_progress_values(engine, player, new_values)
         # send new data to clients
-        player.send_new_data(new_values[player.id])
+        with metrics.measure("socket_emits"):
+            player.send_new_data(new_values[player.id])
 
 
 def set_facilities_usage(engine, new_values, player):
-    """Set the usage of the facilities to the database"""
+    """Set the usage of the facilities in the facility usage store"""
+    player_cap = engine.data["player_capacities"][player.id]
+    usage = engine.facility_usage
     for facility in engine.controllable_facilities:
-        if engine.data["player_capacities"][player.id].contains(facility):
-            ActiveFacility.query.filter_by(player_id=player.id, facility=facility).update(
-                {
-                    ActiveFacility.usage: new_values["generation"][facility]
-                    / engine.data["player_capacities"][player.id][facility]["power"]
-                },
-                synchronize_session=False,
-            )
+        if player_cap.contains(facility):
+            usage.set_type(player.id, facility, new_values["generation"][facility] / player_cap[facility]["power"])
     for facility in engine.storage_facilities:
-        if engine.data["player_capacities"][player.id].contains(facility):
-            ActiveFacility.query.filter_by(player_id=player.id, facility=facility).update(
-                {
-                    ActiveFacility.usage: new_values["storage"][facility]
-                    / engine.data["player_capacities"][player.id][facility]["capacity"]
-                },
-                synchronize_session=False,
-            )
+        if player_cap.contains(facility):
+            usage.set_type(player.id, facility, new_values["storage"][facility] / player_cap[facility]["capacity"])
     for facility in engine.extraction_facilities:
-        if engine.data["player_capacities"][player.id].contains(facility):
-            ActiveFacility.query.filter_by(player_id=player.id, facility=facility).update(
-                {
-                    ActiveFacility.usage: new_values["demand"][facility]
-                    / engine.data["player_capacities"][player.id][facility]["power_use"]
-                },
-                synchronize_session=False,
-            )
+        if player_cap.contains(facility):
+            usage.set_type(player.id, facility, new_values["demand"][facility] / player_cap[facility]["power_use"])
 
 
 def update_player_progress_values(engine, player, new_values):
@@ -152,8 +161,8 @@ def update_player_progress_values(engine, player, new_values):
 def init_market():
     """Initialize an empty market"""
     return {
-        "capacities": pd.DataFrame({"player_id": [], "capacity": [], "price": [], "facility": []}),
-        "demands": pd.DataFrame({"player_id": [], "capacity": [], "price": [], "facility": []}),
+        "capacities": OrderBook(),
+        "demands": OrderBook(),
     }
 
 
@@ -213,7 +222,7 @@ def extraction_facility_demand(engine, new_values, player, player_cap, demand):
             demand[facility] = player_cap[facility]["power_use"] * power_factor
 
 
-def industry_demand_and_revenues(engine, player, demand, revenues):
+def industry_demand_and_revenues(engine, world, player, demand, revenues):
     """calculate power consumption and revenues from industry"""
     # interpolating seasonal factor on the day
     assets = engine.config[player.id]
@@ -228,7 +237,7 @@ def industry_demand_and_revenues(engine, player, demand, revenues):
     demand["industry"] = intra_day_factor * seasonal_factor * assets["industry"]["power_consumption"]
     # calculate income of industry per tick
     revenues["industry"] = assets["industry"]["income_per_day"] / ticks_per_day
-    for ud in player.under_construction:
+    for ud in world.constructions_of(player.id):
         # industry demand ramps up during construction
         if ud.name == "industry":
             if ud.suspension_time is None:
@@ -251,9 +260,9 @@ def industry_demand_and_revenues(engine, player, demand, revenues):
             break
 
 
-def construction_demand(player, demand):
+def construction_demand(world, player, demand):
     """calculate power consumption for facilities under construction"""
-    for ud in player.under_construction:
+    for ud in world.constructions_of(player.id):
         if ud.suspension_time is None:
             if ud.family == "Technologies":
                 demand["research"] += ud.construction_power
@@ -261,10 +270,10 @@ def construction_demand(player, demand):
                 demand["construction"] += ud.construction_power
 
 
-def shipment_demand(engine, player, demand):
+def shipment_demand(engine, world, player, demand):
     """calculate the power consumption for shipments"""
     transport = engine.config[player.id]["transport"]
-    for shipment in player.shipments:
+    for shipment in world.shipments_of(player.id):
         if shipment.suspension_time is None:
             demand["transport"] += transport["power_per_kg"] * shipment.quantity
 
@@ -286,13 +295,13 @@ def storage_demand(engine, player, demand):
             )
 
 
-def climate_event_recovery_cost(player, revenues):
+def climate_event_recovery_cost(world, player, revenues):
     """Calculate the cost of climate events"""
-    for cer in player.climate_events:
+    for cer in world.climate_events_of(player.id):
         revenues["climate_events"] -= cer.recovery_cost
 
 
-def calculate_demand(engine, new_values, player):
+def calculate_demand(engine, world, new_values, player):
     """Calculates the electricity demand of one player"""
 
     player_cap = engine.data["player_capacities"][player.id]
@@ -300,13 +309,13 @@ def calculate_demand(engine, new_values, player):
     revenues = new_values["revenues"]
 
     extraction_facility_demand(engine, new_values, player, player_cap, demand)
-    industry_demand_and_revenues(engine, player, demand, revenues)
-    construction_demand(player, demand)
-    shipment_demand(engine, player, demand)
+    industry_demand_and_revenues(engine, world, player, demand, revenues)
+    construction_demand(world, player, demand)
+    shipment_demand(engine, world, player, demand)
     storage_demand(engine, player, demand)
 
     # consider cost of climate events if any
-    climate_event_recovery_cost(player, revenues)
+    climate_event_recovery_cost(world, player, revenues)
 
     if player.carbon_capture > 0:
         demand["carbon_capture"] = engine.config[player.id]["carbon_capture"]["power_consumption"]
@@ -321,7 +330,7 @@ def reset_resource_reservations():
     }
 
 
-def calculate_generation_without_market(engine, new_values, player):
+def calculate_generation_without_market(engine, world, new_values, player):
     """Calculate the generation of a player that is not part of a network"""
     internal_market = init_market()
     player_cap = engine.data["player_capacities"][player.id]
@@ -330,7 +339,8 @@ def calculate_generation_without_market(engine, new_values, player):
     resource_reservations = reset_resource_reservations()
 
     # generation of non controllable facilities is calculated from weather data
-    renewables_generation(engine, player, player_cap, generation)
+    with engine.tick_metrics.measure("renewables"):
+        renewables_generation(engine, world, player, player_cap, generation)
     minimal_generation(engine, player, player_cap, generation, resource_reservations)
     facilities = engine.storage_facilities + engine.power_facilities
     # Obligatory generation is put on the internal market at a price of -5
@@ -373,17 +383,19 @@ def calculate_generation_without_market(engine, new_values, player):
             capacity = max_prod - generation[facility]
             internal_market = offer(internal_market, player.id, capacity, price, facility)
 
-    market_logic(engine, new_values, internal_market)
+    with engine.tick_metrics.measure("market_clearing"):
+        market_logic(engine, world, new_values, internal_market)
 
 
-def calculate_generation_with_market(engine, new_values, market, player):
+def calculate_generation_with_market(engine, world, new_values, market, player):
     """Calculate the generation of a player that is part of a network (before market logic)"""
     player_cap = engine.data["player_capacities"][player.id]
     generation = new_values[player.id]["generation"]
     demand = new_values[player.id]["demand"]
     resource_reservations = reset_resource_reservations()
 
-    renewables_generation(engine, player, player_cap, generation)
+    with engine.tick_metrics.measure("renewables"):
+        renewables_generation(engine, world, player, player_cap, generation)
     minimal_generation(engine, player, player_cap, generation, resource_reservations)
     facilities = engine.storage_facilities + engine.power_facilities
     for facility in facilities:
@@ -405,7 +417,9 @@ def calculate_generation_with_market(engine, new_values, market, player):
             price = getattr(player, "price_buy_" + demand_type)
             market = bid(market, player.id, bid_q, price, demand_type)
         else:
-            reduce_demand(engine, new_values, engine.data["current_data"][player.id], demand_type, player.id, 0.0)
+            reduce_demand(
+                engine, world, new_values, engine.data["current_data"][player.id], demand_type, player.id, 0.0
+            )
 
     resource_reservations = reset_resource_reservations()
     # Sell capacities of remaining facilities on the market
@@ -428,234 +442,221 @@ def calculate_generation_with_market(engine, new_values, market, player):
     return market
 
 
-def market_logic(engine, new_values, market):
+def settle_markets(engine, markets):
+    """
+    Clears the markets of the networks with the clearing pool of the engine and returns their settlements.
+    If the workers of the pool fail, the pool falls back to clearing the markets serially.
+    """
+    books = [(market["capacities"], market["demands"]) for market in markets]
+    try:
+        return engine.clearing_pool.settle(books)
+    except (EOFError, OSError) as e:
+        engine.warn(f"{engine.clearing_pool.mode} market clearing failed ({e!r}), falling back to serial clearing")
+        engine.clearing_pool.shutdown()
+        return engine.clearing_pool.settle(books)
+
+
+def market_logic(engine, world, new_values, market, settlement=None):
     """Calculate overall network demand,
     class all capacity offers in ascending order of price
     and find the market price of electricity.
-    Sell all capacities that are below market price at market price."""
+    Sell all capacities that are below market price at market price.
+    The settlement of the market can be computed beforehand with `settle_market`."""
 
-    def sell(row, market_price, quantity=None):
+    def sell(player_id, facility, price, market_price, quantity):
         """Sell and produce offered power capacity"""
-        player = Player.query.get(row.player_id)
+        player = world.players_by_id[player_id]
         generation = new_values[player.id]["generation"]
         demand = new_values[player.id]["demand"]
         revenue = new_values[player.id]["revenues"]
-        if quantity is None:
-            quantity = row.capacity
-        if row.price > -5:
-            generation[row.facility] += quantity
+        if price > -5:
+            generation[facility] += quantity
         demand["exports"] += quantity
         player.money += quantity * market_price / 3600 * engine.in_game_seconds_per_tick / 1_000_000
         revenue["exports"] += quantity * market_price / 3600 * engine.in_game_seconds_per_tick / 1_000_000
 
-        if row.player_id in market["player_exports"]:
-            market["player_exports"][row.player_id] += quantity
+        if player_id in market["player_exports"]:
+            market["player_exports"][player_id] += quantity
         else:
-            market["player_exports"][row.player_id] = quantity
-        if row.facility in market["generation"]:
-            market["generation"][row.facility] += quantity
+            market["player_exports"][player_id] = quantity
+        if facility in market["generation"]:
+            market["generation"][facility] += quantity
         else:
-            market["generation"][row.facility] = quantity
-
-    def buy(row, market_price, quantity=None):
+            market["generation"][facility] = quantity
+
+    def dump(player_id, quantity):
+        """Dump electricity that is offered for negative price and not sold"""
+        player = world.players_by_id[player_id]
+        demand = new_values[player_id]["demand"]
+        demand["dumping"] += quantity
+        player.money -= quantity * 5 / 3600 * engine.in_game_seconds_per_tick / 1_000_000
+        revenue = new_values[player_id]["revenues"]
+        revenue["dumping"] -= quantity * 5 / 3600 * engine.in_game_seconds_per_tick / 1_000_000
+
+    def buy(player_id, facility, market_price, quantity):
         """Buy demanded power capacity"""
-        player = Player.query.get(row.player_id)
+        player = world.players_by_id[player_id]
         generation = new_values[player.id]["generation"]
         revenue = new_values[player.id]["revenues"]
-        if quantity is None:
-            quantity = row.capacity
         generation["imports"] += quantity
         player.money -= quantity * market_price / 3600 * engine.in_game_seconds_per_tick / 1_000_000
         revenue["imports"] -= quantity * market_price / 3600 * engine.in_game_seconds_per_tick / 1_000_000
 
-        if row.player_id in market["player_imports"]:
-            market["player_imports"][row.player_id] += quantity
+        if player_id in market["player_imports"]:
+            market["player_imports"][player_id] += quantity
         else:
-            market["player_imports"][row.player_id] = quantity
-        if row.facility in market["consumption"]:
-            market["consumption"][row.facility] += quantity
+            market["player_imports"][player_id] = quantity
+        if facility in market["consumption"]:
+            market["consumption"][facility] += quantity
         else:
-            market["consumption"][row.facility] = quantity
+            market["consumption"][facility] = quantity
 
     market["player_exports"] = {}
     market["player_imports"] = {}
     market["generation"] = {}
     market["consumption"] = {}
 
-    offers = market["capacities"]
-    offers = offers.sort_values("price").reset_index(drop=True)
-    offers["cumul_capacities"] = offers["capacity"].cumsum()
-
-    demands = market["demands"]
-    demands = demands.sort_values(by="price", ascending=False).reset_index(drop=True)
-    demands["cumul_capacities"] = demands["capacity"].cumsum()
-
+    if settlement is None:
+        settlement = settle_market(market["capacities"], market["demands"])
+    # the settlement may have been computed in another process, the order books are replaced by the sorted ones
+    offers: OrderBook = settlement["offers"]
+    demands: OrderBook = settlement["demands"]
     market["capacities"] = offers
     market["demands"] = demands
-
-    if len(offers) == 0:
-        total_market_capacity = 0
-        max_supply_price = 0
-    else:
-        total_market_capacity = offers["cumul_capacities"].iloc[-1]
-        max_supply_price = offers["price"].iloc[-1]
-    demand_price = demands.loc[demands["cumul_capacities"] >= total_market_capacity, "price"]
-    if len(demand_price) == 0:
-        demand_price = 0
-    else:
-        demand_price = demand_price.iloc[0]
-    if demand_price > max_supply_price:
-        market_quantity = total_market_capacity
-        market_price = demand_price if demand_price != np.inf else max_supply_price
-    else:
-        market_price, market_quantity = market_optimum(offers, demands)
-    # sell all capacities under market price
-    for row in offers.itertuples(index=False):
-        if row.cumul_capacities > market_quantity:
-            sold_cap = row.capacity - row.cumul_capacities + market_quantity
-            if sold_cap > 0.1:
-                sell(row, market_price, quantity=sold_cap)
-            # dumping electricity that is offered for negative price and not sold
-            if row.price < 0:
-                dump_cap = max(0.0, min(row.capacity, row.capacity - sold_cap))
-                player = Player.query.get(row.player_id)
-                demand = new_values[row.player_id]["demand"]
-                demand["dumping"] += dump_cap
-                player.money -= dump_cap * 5 / 3600 * engine.in_game_seconds_per_tick / 1_000_000
-                revenue = new_values[row.player_id]["revenues"]
-                revenue["dumping"] -= dump_cap * 5 / 3600 * engine.in_game_seconds_per_tick / 1_000_000
-                continue
-            break
-        sell(row, market_price)
+    market_price = settlement["market_price"]
+    market_quantity = settlement["market_quantity"]
+
+    # sell all capacities under market price and dump the unsold capacities offered for a negative price
+    sold, dumped = settlement["sold"], settlement["dumped"]
+    offer_player_ids = offers.player_id.tolist()
+    offer_facilities = offers.facility
+    offer_prices = offers.price.tolist()
+    for i in np.flatnonzero((sold > 0) | (dumped > 0)).tolist():
+        if sold[i] > 0:
+            sell(offer_player_ids[i], offer_facilities[i], offer_prices[i], market_price, float(sold[i]))
+        if dumped[i] > 0:
+            dump(offer_player_ids[i], float(dumped[i]))
     # buy all demands over market price
-    for row in demands.itertuples(index=False):
-        if row.cumul_capacities > market_quantity:
-            bought_cap = row.capacity - row.cumul_capacities + market_quantity
+    demand_player_ids = demands.player_id.tolist()
+    demand_facilities = demands.facility
+    demand_capacities = demands.capacity.tolist()
+    demand_cumul = demands.cumul_capacities.tolist()
+    for i, cumul_capacity in enumerate(demand_cumul):
+        if cumul_capacity > market_quantity:
+            bought_cap = demand_capacities[i] - cumul_capacity + market_quantity
             if bought_cap > 0.1:
-                buy(row, market_price, quantity=bought_cap)
+                buy(demand_player_ids[i], demand_facilities[i], market_price, bought_cap)
             # measures a taken to reduce demand
             reduce_demand(
                 engine,
+                world,
                 new_values,
-                engine.data["current_data"][row.player_id],
-                row.facility,
-                row.player_id,
+                engine.data["current_data"][demand_player_ids[i]],
+                demand_facilities[i],
+                demand_player_ids[i],
                 max(0.0, bought_cap),
             )
         else:
-            buy(row, market_price)
+            buy(demand_player_ids[i], demand_facilities[i], market_price, demand_capacities[i])
     market["market_price"] = market_price
     market["market_quantity"] = market_quantity
 
 
-def market_optimum(offers_og, demands_og):
-    """Finding market price and quantity by finding the intersection of demand and supply"""
-    offers = offers_og.copy()
-    demands = demands_og.copy()
-
-    if len(demands) == 0 or len(offers) == 0:
-        return 0, 0
-
-    price_d = demands.loc[0, "price"]
-    price_o = offers.loc[0, "price"]
-
-    if price_o > price_d:
-        return price_d, 0
-
-    offers["index_offer"] = range(len(offers))
-    offers["price"] = offers["price"].shift(-1)
-    offers.loc[len(offers) - 1, "price"] = np.inf
-    demands["price"] = demands["price"].shift(-1)
-    demands.loc[len(demands) - 1, "price"] = -6
-
-    merged_table = pd.concat([offers, demands], ignore_index=True)
-    merged_table = merged_table.sort_values(by="cumul_capacities")
-
-    for row in merged_table.itertuples():
-        if np.isnan(row.index_offer):
-            price_d = row.price
-        else:
-            price_o = row.price
-        if price_d < price_o:
-            price = price_d
-            if np.isnan(row.index_offer):
-                price = price_o
-            return price, row.cumul_capacities
-
-
-def renewables_generation(engine, player, player_cap, generation):
+def fill_weather_cache(engine, world):
+    """
+    Calculates the weather of the tick at the positions of the wind and solar facilities and, unless the server is
+    catching up, at the tiles of the players for the weather broadcasts and requests
+    """
+    wind_positions = []
+    solar_positions = []
+    for (_, facility_type), facilities in world.active_facilities.items():
+        if facility_type in wind_facilities:
+            wind_positions.extend((facility.pos_x, facility.pos_y) for facility in facilities)
+        elif facility_type in solar_facilities:
+            solar_positions.extend((facility.pos_x, facility.pos_y) for facility in facilities)
+    if not engine.catching_up:
+        tile_positions = [tile_position(player.tile) for player in world.players if player.tile is not None]
+        wind_positions.extend(tile_positions)
+        solar_positions.extend(tile_positions)
+    engine.weather_cache.fill(engine, wind_positions, solar_positions)
+
+
+def renewables_generation(engine, world, player, player_cap, generation):
     """Generation of non controllable facilities is calculated from weather data"""
     in_game_seconds_passed = (engine.data["total_t"] + engine.data["delta_t"]) * engine.in_game_seconds_per_tick
     # WIND
-    wind_generation(engine, player, player_cap, generation, in_game_seconds_passed)
+    wind_generation(engine, world, player, player_cap, generation)
     # SOLAR
-    solar_generation(engine, player, player_cap, generation, in_game_seconds_passed)
+    solar_generation(engine, world, player, player_cap, generation)
     # HYDRO
     power_factor = calculate_river_discharge(in_game_seconds_passed) / 150
     for facility in ["watermill", "small_water_dam", "large_water_dam"]:
         if player_cap[facility] is not None:
             generation[facility] = power_factor * player_cap[facility]["power"]
-        ActiveFacility.query.filter_by(player_id=player.id, facility=facility).update(
-            {ActiveFacility.usage: power_factor}, synchronize_session=False
-        )
+            engine.facility_usage.set_type(player.id, facility, power_factor)
 
 
-def solar_generation(engine, player, player_cap, generation, in_game_seconds_passed):
+def solar_generation(engine, world, player, player_cap, generation):
     """
     Each instance of facility generates a different amount of power depending on the position of the facility.
     The clear sky index is calculated using a 3D perlin noise that moves over time, simulating the movement of clouds.
     The csi is then multiplied by the clear sky value from pvlib to get the actual irradiance at the location.
     The effective power of the solar facility is then calculated as irradiance / 1000 * max_power.
     """
-    for facility_type in ["CSP_solar", "PV_solar"]:
+    for facility_type in solar_facilities:
         if player_cap[facility_type] is not None:
-            solar_facilities: List[ActiveFacility] = ActiveFacility.query.filter_by(
-                player_id=player.id, facility=facility_type
-            ).all()
-            for facility in solar_facilities:
-                irradiance = calculate_solar_irradiance(
-                    facility.pos_x, facility.pos_y, in_game_seconds_passed, engine.data["random_seed"]
-                )
+            for facility in world.facilities_of(player.id, facility_type):
+                irradiance = engine.weather_cache.solar_irradiance(engine, facility.pos_x, facility.pos_y)
                 max_power = (
                     engine.const_config["assets"][facility_type]["base_power_generation"] * facility.multiplier_1
                 )
-                facility.usage = irradiance / 1000
-                generation[facility_type] += facility.usage * max_power
+                usage = irradiance / 1000
+                engine.facility_usage.set(facility.id, usage)
+                generation[facility_type] += usage * max_power
 
 
-def wind_generation(engine, player, player_cap, generation, in_game_seconds_passed):
+def wind_generation(engine, world, player, player_cap, generation):
     """
     Each instance of facility generates a different amount of power depending on the position of the facility.
-    The wind speed is calculated using a 3D perlin noise with a superposition of specific frequencies.
-    Two sinusoidal functions are multiplied to the wind speed to simulate the day-night cycle and the seasonal cycle.
-    A multiplier is applied to the wind speed depending on the 'performance' of the facility linked to its position.
-    The characteristic power curve of wind facilities is interpolated to get the power generated by the facility.
+    The usage of the wind facilities of all players is calculated once per tick by `wind_usage`.
     """
-
-    def interpolate_wind(wind_speed):
-        """Interpolates the wind power curve to get the exact power generated by a wind facility"""
-        if wind_speed > 80:
-            return 0
-        i = math.floor(wind_speed)
-        f = wind_speed - i
-        pc = wind_power_curve
-        return pc[i] + (pc[(i + 1) % 80] - pc[i]) * f
-
-    for facility_type in ["windmill", "onshore_wind_turbine", "offshore_wind_turbine"]:
+    if world.wind_usage is None:
+        world.wind_usage = wind_usage(engine, world)
+    for facility_type in wind_facilities:
         if player_cap[facility_type] is not None:
-            wind_facilities: List[ActiveFacility] = ActiveFacility.query.filter_by(
-                player_id=player.id, facility=facility_type
-            ).all()
-            for facility in wind_facilities:
-                wind_speed = calculate_wind_speed(
-                    facility.pos_x, facility.pos_y, in_game_seconds_passed, engine.data["random_seed"]
-                )
+            for facility in world.facilities_of(player.id, facility_type):
                 max_power = (
                     engine.const_config["assets"][facility_type]["base_power_generation"] * facility.multiplier_1
                 )
-                # multiplier_2 is the wind speed factor linked to the position of the facility:
-                facility.usage = interpolate_wind(wind_speed * facility.multiplier_2)
-                generation[facility_type] += facility.usage * max_power
+                usage = world.wind_usage[facility.id]
+                engine.facility_usage.set(facility.id, usage)
+                generation[facility_type] += usage * max_power
+
+
+def wind_usage(engine, world):
+    """
+    Calculates the usage of all wind facilities of the server in one vectorized pass and returns it by facility id.
+    The wind speed is calculated using a 3D perlin noise with a superposition of specific frequencies.
+    Two sinusoidal functions are multiplied to the wind speed to simulate the day-night cycle and the seasonal cycle.
+    A multiplier is applied to the wind speed depending on the 'performance' of the facility linked to its position.
+    The characteristic power curve of wind facilities is interpolated to get the power generated by the facility.
+    """
+    facilities = [
+        facility
+        for (_, facility_type), facilities in world.active_facilities.items()
+        if facility_type in wind_facilities
+        for facility in facilities
+    ]
+    if not facilities:
+        return {}
+    wind_speeds = engine.weather_cache.wind_speeds(
+        engine, [facility.pos_x for facility in facilities], [facility.pos_y for facility in facilities]
+    )
+    # multiplier_2 is the wind speed factor linked to the position of the facility
+    wind_speeds *= np.fromiter((facility.multiplier_2 for facility in facilities), dtype=np.float64)
+    # the power curve is 0 above 80 km/h
+    usages = np.interp(wind_speeds, np.arange(len(wind_power_curve)), wind_power_curve, right=0)
+    return {facility.id: usage for facility, usage in zip(facilities, usages.tolist(), strict=True)}
 
 
 def calculate_prod(
@@ -750,34 +751,18 @@ def minimal_generation(engine, player, player_cap, generation, resource_reservat
 def offer(market, player_id, capacity, price, facility):
     """Make an offer on the market"""
     if capacity > 0:
-        new_row = pd.DataFrame(
-            {
-                "player_id": [player_id],
-                "capacity": [capacity],
-                "price": [price],
-                "facility": [facility],
-            }
-        )
-        market["capacities"] = pd.concat([market["capacities"], new_row], ignore_index=True)
+        market["capacities"].append(player_id, capacity, price, facility)
     return market
 
 
 def bid(market, player_id, demand, price, facility):
     """Make a bid on the market"""
     if demand > 0:
-        new_row = pd.DataFrame(
-            {
-                "player_id": [player_id],
-                "capacity": [demand],
-                "price": [price],
-                "facility": [facility],
-            }
-        )
-        market["demands"] = pd.concat([market["demands"], new_row], ignore_index=True)
+        market["demands"].append(player_id, demand, price, facility)
     return market
 
 
-def resources_and_pollution(engine, new_values, player):
+def resources_and_pollution(engine, world, new_values, player):
     """Calculate resource use and production, O&M costs and emissions"""
     player_cap = engine.data["player_capacities"][player.id]
     generation = new_values["generation"]
@@ -822,7 +807,6 @@ def resources_and_pollution(engine, new_values, player):
                     getattr(player, resource) + extracted_quantity,
                 )
                 player.extracted_resources += extracted_quantity
-                db.session.commit()
                 emissions = extracted_quantity * player_cap[extraction_facility]["pollution"]
                 add_emissions(
                     engine,
@@ -845,10 +829,9 @@ def resources_and_pollution(engine, new_values, player):
             * satisfaction
         )
         player.captured_CO2 += captured_co2
-        db.session.commit()
         add_emissions(engine, new_values, player, "carbon_capture", -captured_co2)
 
-    construction_emissions(engine, new_values, player)
+    construction_emissions(engine, world, new_values, player)
 
     # O&M costs
     for facility in engine.power_facilities + engine.storage_facilities + engine.extraction_facilities:
@@ -869,19 +852,19 @@ def resources_and_pollution(engine, new_values, player):
             op_costs[facility] -= operational_cost
 
 
-def construction_emissions(engine, new_values, player):
+def construction_emissions(engine, world, new_values, player):
     """calculate emissions of facilities under construction"""
     emissions_construction = 0.0
-    for ud in player.under_construction:
+    for ud in world.constructions_of(player.id):
         if ud.start_time is not None:
             if ud.suspension_time is None and ud.family != "Technologies":
                 emissions_construction += ud.construction_pollution
     add_emissions(engine, new_values, player, "construction", emissions_construction)
 
 
-def reduce_demand(engine, new_values, past_data, demand_type, player_id, satisfaction):
+def reduce_demand(engine, world, new_values, past_data, demand_type, player_id, satisfaction):
     """Measures taken to reduce demand"""
-    player = Player.query.get(player_id)
+    player = world.players_by_id[player_id]
     demand = new_values[player.id]["demand"]
     if demand_type == "industry":
         # revenues of industry are reduced
@@ -898,8 +881,8 @@ def reduce_demand(engine, new_values, past_data, demand_type, player_id, satisfa
         cumul_demand = 0.0
         for i in range(min(len(construction_priorities), player.construction_workers)):
             construction_id = construction_priorities[i]
-            construction: OngoingConstruction = OngoingConstruction.query.get(construction_id)
-            if construction.suspension_time is not None:
+            construction = world.construction(construction_id)
+            if construction is None or construction.suspension_time is not None:
                 continue
             cumul_demand += construction.construction_power
             if cumul_demand > satisfaction:
@@ -916,15 +899,14 @@ def reduce_demand(engine, new_values, past_data, demand_type, player_id, satisfa
                     f"The construction of the facility {engine.const_config['assets'][construction.name]['name']} "
                     "has been suspended because of a lack of electricity.",
                 )
-        db.session.commit()
         return
     if demand_type == "research":
         research_priorities = player.read_list("research_priorities")
         cumul_demand = 0.0
         for i in range(min(len(research_priorities), player.lab_workers)):
             construction_id = research_priorities[i]
-            construction: OngoingConstruction = OngoingConstruction.query.get(construction_id)
-            if construction.suspension_time is not None:
+            construction = world.construction(construction_id)
+            if construction is None or construction.suspension_time is not None:
                 continue
             cumul_demand += construction.construction_power
             if cumul_demand > satisfaction:
@@ -941,17 +923,10 @@ def reduce_demand(engine, new_values, past_data, demand_type, player_id, satisfa
                     f"The research of the technology {engine.const_config['assets'][construction.name]['name']} "
                     "has been suspended because of a lack of electricity.",
                 )
-        db.session.commit()
         return
     if demand_type == "transport":
-        last_shipment = (
-            Shipment.query.filter(
-                Shipment.suspension_time.is_(None),
-                Shipment.player_id == player.id,
-            )
-            .order_by(Shipment.departure_time.desc())
-            .first()
-        )
+        running_shipments = [s for s in world.shipments_of(player.id) if s.suspension_time is None]
+        last_shipment = max(running_shipments, key=lambda s: s.departure_time, default=None)
         if last_shipment:
             last_shipment.suspension_time = engine.data["total_t"]
             player.emit(
@@ -14,12 +14,14 @@ from website.game_engine import GameEngine
 from website.utils.network import reorder_facility_priorities
 
 
-def add_asset(player_id, construction_id):
+def add_asset(player_id, construction_id, emit_update=True):
     """
     This function is executed when a construction or research project has finished. The effects include:
     * For facilities which create demands, e.g. carbon capture, adds demands to the demand priorities
     * For technologies and functional facilities, checks for achievements
     * Removes from the relevant construction / research list and priority list
+    When several projects finish in the same tick, `emit_update` can be set to False so that the caller sends one
+    `retrieve_player_data` event per player.
     """
     engine = current_app.config["engine"]
     player: Player = Player.query.get(player_id)
@@ -130,6 +132,7 @@ def add_asset(player_id, construction_id):
                 else:
                     first_lvl.start_time += engine.data["total_t"] - first_lvl.suspension_time
                     first_lvl.suspension_time = None
+                    engine.event_schedule.add("construction", first_lvl)
                     index_first_lvl = project_priorities.index(first_lvl.id)
                     (
                         project_priorities[index_first_lvl],
@@ -141,6 +144,7 @@ def add_asset(player_id, construction_id):
                     break
             next_construction.start_time += engine.data["total_t"] - next_construction.suspension_time
             next_construction.suspension_time = None
+            engine.event_schedule.add("construction", next_construction)
             project_priorities[priority_index], project_priorities[project_index] = (
                 project_priorities[project_index],
                 project_priorities[priority_index],
@@ -179,12 +183,14 @@ def add_asset(player_id, construction_id):
             multiplier_3=construction.multiplier_3,
         )
         db.session.add(new_facility)
-    if construction.family == "Technologies":
-        engine.data["player_capacities"][player.id].update(player, None)
+        db.session.flush()
+        engine.data["player_capacities"][player.id].add_facility(player, new_facility)
+        engine.event_schedule.add("end_of_life", new_facility)
     else:
-        engine.data["player_capacities"][player.id].update(player, construction.name)
-    engine.config.update_config_for_user(player.id)
-    player.emit("retrieve_player_data")
+        # the config only depends on the levels of the technologies and functional facilities
+        engine.config.update_config_for_user(player.id)
+    if emit_update:
+        player.emit("retrieve_player_data")
 
 
 # Utilities relating to managing facilities and assets
@@ -251,8 +257,10 @@ def upgrade_facility(player, facility_id):
         if player.money < upgrade_cost:
             return {"response": "notEnoughMoney"}
         player.money -= upgrade_cost
+        player_capacities = engine.data["player_capacities"][player.id]
+        old_values = player_capacities.facility_values(engine, facility)
         apply_upgrade(facility)
-        engine.data["player_capacities"][player.id].update(player, facility.facility)
+        player_capacities.modify_facility(player, facility, old_values)
         return {"response": "success", "money": player.money}
     else:
         return {"response": "notUpgradable"}
@@ -273,6 +281,7 @@ def remove_asset(player_id, facility, decommissioning=True):
     if facility.facility in engine.technologies + engine.functional_facilities:
         return {"response": "notRemovable"}
     player = Player.query.get(player_id)
+    facility_values = engine.data["player_capacities"][player.id].facility_values(engine, facility)
     db.session.delete(facility)
     # The cost of decommissioning is 20% of the building cost.
     cost = 0.2 * engine.const_config["assets"][facility.facility]["base_price"] * facility.price_multiplier
@@ -291,8 +300,7 @@ def remove_asset(player_id, facility, decommissioning=True):
         )
         engine.log(f"The facility {facility_name} from {player.username} has been decommissioned.")
     db.session.flush()
-    engine.data["player_capacities"][player.id].update(player, facility.facility)
-    engine.config.update_config_for_user(player.id)
+    engine.data["player_capacities"][player.id].remove_values(player, facility.facility, facility_values)
     db.session.commit()
     return {
         "response": "success",
@@ -422,6 +430,7 @@ def start_project(engine: GameEngine, player: Player, asset, family, force=False
     )
     db.session.add(new_construction)
     db.session.commit()
+    engine.event_schedule.add("construction", new_construction)
     if suspension_time is None:
         # Add this project to the priority list, before all paused projects, but after all existing ongoing projects
         priority_list = player.read_list(priority_list_name)
@@ -610,6 +619,7 @@ def pause_project(player: Player, construction_id: int):
         # Unpause the construction
         construction.start_time += engine.data["total_t"] - construction.suspension_time
         construction.suspension_time = None
+        engine.event_schedule.add("construction", construction)
 
         # Reorder the priority list
         priority_list: List[int] = player.read_list(priority_list_name)
@@ -0,0 +1,88 @@
+"""
+This file contains the compact binary encoding of the websocket messages that the clients can opt into at the
+handshake, with the subprotocol `energetica.float32`. A binary message is made of:
+    - the length of the header as a little-endian uint32
+    - the header: the JSON message in which each list of floats is replaced by {"$f32": <index of the array>}
+    - the arrays one after the other, each as its length as a little-endian uint32 followed by its values as
+      little-endian float32
+The messages that don't contain lists of floats are sent as JSON text.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+subprotocol = "energetica.float32"
+
+# shorter lists of floats are left in the header
+min_array_length = 8
+
+
+def encode_message(message):
+    """Encodes a JSON string as a binary message, returns it unchanged if it doesn't contain lists of floats"""
+    arrays = []
+
+    def extract_arrays(value):
+        if isinstance(value, dict):
+            return {key: extract_arrays(item) for key, item in value.items()}
+        if isinstance(value, list):
+            if len(value) >= min_array_length and all(isinstance(item, float) for item in value):
+                arrays.append(value)
+                return {"$f32": len(arrays) - 1}
+            return [extract_arrays(item) for item in value]
+        return value
+
+    header = extract_arrays(json.loads(message))
+    if not arrays:
+        return message
+    header = json.dumps(header, separators=(",", ":")).encode()
+    parts = [struct.pack("<I", len(header)), header]
+    for array in arrays:
+        parts.append(struct.pack("<I", len(array)))
+        parts.append(np.asarray(array, dtype="<f4").tobytes())
+    return b"".join(parts)
+
+
+def decode_message(data):
+    """Decodes a binary message to the message it encodes, the arrays as lists of floats"""
+    (header_length,) = struct.unpack_from("<I", data)
+    header = json.loads(data[4 : 4 + header_length])
+    arrays = []
+    offset = 4 + header_length
+    while offset < len(data):
+        (length,) = struct.unpack_from("<I", data, offset)
+        arrays.append(np.frombuffer(data, dtype="<f4", count=length, offset=offset + 4).tolist())
+        offset += 4 + 4 * length
+
+    def insert_arrays(value):
+        if isinstance(value, dict):
+            if value.keys() == {"$f32"}:
+                return arrays[value["$f32"]]
+            return {key: insert_arrays(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [insert_arrays(item) for item in value]
+        return value
+
+    return insert_arrays(header)
+
+
+class BinaryWebSocket:
+    """
+    Wraps the websocket connection of a client that has opted into the binary encoding. The messages shared by all the
+    clients are encoded once and the encoding is stored with them in `shared_payloads`.
+    """
+
+    def __init__(self, ws, shared_payloads):
+        self.ws = ws
+        self.shared_payloads = shared_payloads
+
+    def send(self, data):
+        """Sends a message, encoded as binary if it contains lists of floats"""
+        if isinstance(data, str):
+            encoded = self.shared_payloads.encoded(data, encode_message)
+            data = encode_message(data) if encoded is None else encoded
+        self.ws.send(data)
+
+    def __getattr__(self, name):
+        return getattr(self.ws, name)
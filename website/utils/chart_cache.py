@@ -0,0 +1,69 @@
+"""This file contains the cache of the chart payloads of the players"""
+
+import hashlib
+from collections import OrderedDict
+
+
+class ChartCache:
+    """
+    Class that stores the chart payloads of the players serialised to JSON, keyed by (player_id, tick). The payload of
+    a player only changes when the tick changes, so it is built at most once per tick and the entry of the previous
+    tick of a player is dropped when the new one is stored. The least recently used entries are evicted when the
+    payloads take more than `max_bytes`. Each entry has an ETag, the hash of its payload, so that the clients can
+    revalidate their copy. The hit and miss counters are cumulative.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (player_id, tick) -> (network_id, payload, etag)
+        self._player_ticks = {}  # player_id -> tick of its entry
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, player_id, tick, network_id, build):
+        """
+        Returns the payload of a player for a tick and its ETag. `build` is called to serialise the payload if it is
+        not in the cache, or if the player has changed network since it has been built.
+        """
+        key = (player_id, tick)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == network_id:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+        self.misses += 1
+        payload = build()
+        etag = hashlib.blake2b(payload, digest_size=16).hexdigest()
+        self.discard(player_id)
+        if len(payload) <= self.max_bytes:
+            self._entries[key] = (network_id, payload, etag)
+            self._player_ticks[player_id] = tick
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                (evicted_player_id, _), (_, evicted_payload, _) = self._entries.popitem(last=False)
+                del self._player_ticks[evicted_player_id]
+                self.size -= len(evicted_payload)
+                self.evictions += 1
+        return payload, etag
+
+    def discard(self, player_id):
+        """Removes the entry of a player"""
+        tick = self._player_ticks.pop(player_id, None)
+        if tick is not None:
+            _, payload, _ = self._entries.pop((player_id, tick))
+            self.size -= len(payload)
+
+    def package(self):
+        """Packages the size and the counters of the cache"""
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_mb": self.size / 1024 / 1024,
+            "max_size_mb": self.max_bytes / 1024 / 1024,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / requests if requests else None,
+        }
@@ -0,0 +1,80 @@
+"""
+Lookup table of the clear sky global horizontal irradiance (GHI), which only depends on the latitude, the day of the
+year and the time of day. The table is calculated with pvlib once and cached in `instance/server_data`, at runtime the
+irradiance is bilinearly interpolated in latitude and time of day. The latitudes of the table are the ones of the rows
+of the map, the irradiance of the facilities placed between two rows is interpolated.
+"""
+
+import math
+import os
+from datetime import datetime
+
+import numpy as np
+
+table_path = "instance/server_data/clear_sky_ghi.npy"
+
+# the latitude at the position y is (y - 10) * 85 / 21, the table has one latitude per unit of y from y = -11 (-85°) to
+# y = 10 (0°)
+latitude_min = -85.0
+latitude_step = 85 / 21  # [°]
+latitude_count = 22
+time_step = 600  # [s]
+time_count = 24 * 3600 // time_step + 1  # the last sample of a day is midnight of the next day
+day_count = 365
+
+_table = None
+
+
+def build_table():
+    """Calculates the clear sky GHI with pvlib for all latitudes, days of the year and times of day of the table"""
+    # pvlib and pandas are only needed to build the table
+    import pandas as pd
+    from pvlib.location import Location
+
+    times = pd.date_range(datetime(2023, 1, 1), periods=day_count * (time_count - 1) + 1, freq=f"{time_step}s")
+    table = np.empty((latitude_count, day_count, time_count), dtype=np.float32)
+    for i in range(latitude_count):
+        ghi = Location(latitude_min + i * latitude_step, 0).get_clearsky(times)["ghi"].to_numpy()
+        table[i, :, :-1] = ghi[:-1].reshape(day_count, time_count - 1)
+        table[i, :, -1] = ghi[time_count - 1 :: time_count - 1]
+    return table
+
+
+def load_table(log=None):
+    """Loads the table from the cache in `instance/server_data`, it is built and cached if it doesn't exist yet"""
+    global _table
+    if _table is not None:
+        return _table
+    expected_shape = (latitude_count, day_count, time_count)
+    if os.path.isfile(table_path):
+        table = np.load(table_path, mmap_mode="r")
+        if table.shape == expected_shape:
+            _table = table
+            return _table
+    if log is not None:
+        log("Calculating the clear sky irradiance table, this takes a few seconds")
+    table = build_table()
+    os.makedirs(os.path.dirname(table_path), exist_ok=True)
+    temporary_path = table_path + ".tmp.npy"
+    np.save(temporary_path, table)
+    os.replace(temporary_path, table_path)
+    _table = table
+    return _table
+
+
+def clear_sky_ghi(latitude, day_of_year, time_of_day):
+    """
+    Returns the clear sky GHI [W/m^2] at a latitude [°], day of the year (integer from 0 to 364) and time of day [s].
+    `latitude` can be an array, in which case an array is returned.
+    """
+    table = load_table()
+    lat_index = np.clip((np.asarray(latitude, dtype=np.float64) - latitude_min) / latitude_step, 0, latitude_count - 1)
+    i = np.minimum(np.floor(lat_index).astype(np.int64), latitude_count - 2)
+    lat_fraction = lat_index - i
+    time_index = time_of_day / time_step
+    j = min(math.floor(time_index), time_count - 2)
+    time_fraction = time_index - j
+    day = table[:, day_of_year, j : j + 2]
+    before = day[i, 0] + (day[i + 1, 0] - day[i, 0]) * lat_fraction
+    after = day[i, 1] + (day[i + 1, 1] - day[i, 1]) * lat_fraction
+    return before + (after - before) * time_fraction
@@ -0,0 +1,50 @@
+"""This file contains the negotiated compression of the HTTP responses"""
+
+import gzip
+import zlib
+
+from flask import request
+
+compressible_mimetypes = {
+    "application/json",
+    "application/javascript",
+    "text/css",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+    "image/svg+xml",
+}
+
+compression_level = 6
+
+
+def compress_response(response, min_size):
+    """
+    Compresses the body of a response with gzip or deflate, the one preferred in the `Accept-Encoding` header of the
+    request, if it is larger than `min_size` bytes. The ETag of a compressed response is made weak, so that the
+    clients can still revalidate it with the ETag of the uncompressed payload.
+    """
+    if (
+        response.direct_passthrough
+        or response.status_code != 200
+        or response.mimetype not in compressible_mimetypes
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    if response.content_length is None or response.content_length < min_size:
+        return response
+    encoding = request.accept_encodings.best_match(["gzip", "deflate"])
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if encoding == "gzip":
+        data = gzip.compress(data, compresslevel=compression_level, mtime=0)
+    else:
+        data = zlib.compress(data, compression_level)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, _ = response.get_etag()
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    return response
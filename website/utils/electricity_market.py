@@ -0,0 +1,332 @@
+"""Order book and clearing logic for the electricity markets"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+
+import eventlet
+import numpy as np
+from eventlet import tpool
+
+
+class OrderBook:
+    """
+    Class that stores the orders (offers or bids) of one market in preallocated arrays that grow when needed.
+    Facility names are stored as integer codes, the mapping is kept by the order book itself.
+    The columns are:
+        "player_id":        id of the player that made the order
+        "capacity":         [W]
+        "price":            [¤/MWh]
+        "facility":         facility or demand type of the order (ex: "steam_engine", "industry")
+    After `sort()` has been called, the cumulated capacities are available as `cumul_capacities`.
+    """
+
+    def __init__(self, initial_size=32):
+        self._player_id = np.empty(initial_size, dtype=np.int64)
+        self._facility_code = np.empty(initial_size, dtype=np.int32)
+        self._capacity = np.empty(initial_size, dtype=np.float64)
+        self._price = np.empty(initial_size, dtype=np.float64)
+        self._size = 0
+        self._facility_codes = {}
+        self._facility_names = []
+        self.cumul_capacities = None
+
+    def __len__(self):
+        return self._size
+
+    def append(self, player_id, capacity, price, facility):
+        """Adds an order at the end of the book"""
+        if self._size == len(self._capacity):
+            self._grow()
+        code = self._facility_codes.get(facility)
+        if code is None:
+            code = len(self._facility_names)
+            self._facility_codes[facility] = code
+            self._facility_names.append(facility)
+        i = self._size
+        self._player_id[i] = player_id
+        self._facility_code[i] = code
+        self._capacity[i] = capacity
+        self._price[i] = price
+        self._size += 1
+        self.cumul_capacities = None
+
+    def _grow(self):
+        """Doubles the size of the underlying arrays"""
+        new_size = max(1, 2 * len(self._capacity))
+        for attr in ["_player_id", "_facility_code", "_capacity", "_price"]:
+            old = getattr(self, attr)
+            new = np.empty(new_size, dtype=old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, attr, new)
+
+    @property
+    def player_id(self):
+        """Array of the player ids of the orders"""
+        return self._player_id[: self._size]
+
+    @property
+    def capacity(self):
+        """Array of the capacities of the orders"""
+        return self._capacity[: self._size]
+
+    @property
+    def price(self):
+        """Array of the prices of the orders"""
+        return self._price[: self._size]
+
+    @property
+    def facility(self):
+        """List of the facility names of the orders"""
+        names = self._facility_names
+        return [names[code] for code in self._facility_code[: self._size]]
+
+    @property
+    def facility_code(self):
+        """Array of the facility codes of the orders, the name of code i is `facility_names[i]`"""
+        return self._facility_code[: self._size]
+
+    @property
+    def facility_names(self):
+        """List of the facility names of the codes"""
+        return self._facility_names
+
+    def sort(self, descending=False):
+        """
+        Sorts the orders by price and computes the cumulated capacities.
+        Orders with the same price keep the order in which they have been added.
+        """
+        n = self._size
+        if descending:
+            # reversing before and after a stable sort keeps ties in insertion order
+            order = n - 1 - np.argsort(self._price[:n][::-1], kind="stable")[::-1]
+        else:
+            order = np.argsort(self._price[:n], kind="stable")
+        for attr in ["_player_id", "_facility_code", "_capacity", "_price"]:
+            array = getattr(self, attr)
+            array[:n] = array[:n][order]
+        self.cumul_capacities = np.cumsum(self._capacity[:n])
+
+    def to_dict(self, orient="list"):
+        """
+        Returns the orders as a dict of lists, in the same format as `pandas.DataFrame.to_dict(orient="list")`
+        so that market snapshots can be sent to the frontend.
+        """
+        if orient != "list":
+            raise ValueError(f"OrderBook.to_dict only supports orient='list', got {orient}")
+        result = {
+            "player_id": self.player_id.tolist(),
+            "capacity": self.capacity.tolist(),
+            "price": self.price.tolist(),
+            "facility": self.facility,
+        }
+        if self.cumul_capacities is not None:
+            result["cumul_capacities"] = self.cumul_capacities.tolist()
+        return result
+
+    def __getstate__(self):
+        # Only the filled part of the arrays is pickled
+        state = self.__dict__.copy()
+        for attr in ["_player_id", "_facility_code", "_capacity", "_price"]:
+            state[attr] = state[attr][: self._size].copy()
+        return state
+
+
+def clear_market(offers, demands):
+    """
+    Finds the market price and quantity of a market. `offers` has to be sorted in ascending order of price and
+    `demands` in descending order of price.
+    If the demand at the total offered capacity is willing to pay more than the most expensive offer, all the
+    offered capacity is sold. Otherwise the price and quantity are found at the intersection of supply and demand.
+    """
+    if len(offers) == 0:
+        total_market_capacity = 0
+        max_supply_price = 0
+    else:
+        total_market_capacity = float(offers.cumul_capacities[-1])
+        max_supply_price = float(offers.price[-1])
+    index = np.searchsorted(demands.cumul_capacities, total_market_capacity, side="left")
+    demand_price = float(demands.price[index]) if index < len(demands) else 0
+    if demand_price > max_supply_price:
+        market_price = demand_price if demand_price != np.inf else max_supply_price
+        return market_price, total_market_capacity
+    return market_optimum(offers, demands)
+
+
+def market_optimum(offers, demands):
+    """
+    Finding market price and quantity by finding the intersection of demand and supply.
+    Supply and demand are step functions of the cumulated capacity. Going through the steps of both curves in order of
+    cumulated capacity, the intersection is at the first step where the price of the demand drops below the price of
+    the supply.
+    """
+    if len(demands) == 0 or len(offers) == 0:
+        return 0, 0
+
+    offer_price = offers.price
+    demand_price = demands.price
+    if offer_price[0] > demand_price[0]:
+        return float(demand_price[0]), 0
+
+    offer_cumul = offers.cumul_capacities
+    demand_cumul = demands.cumul_capacities
+    # price of each curve right after each of its steps
+    next_offer_price = np.append(offer_price[1:], np.inf)
+    next_demand_price = np.append(demand_price[1:], -6.0)
+
+    # At an offer step, the current demand price is the one after the last demand step that came before.
+    # When steps of both curves are at the same cumulated capacity, offer steps come first.
+    demand_steps_before = np.searchsorted(demand_cumul, offer_cumul, side="left")
+    demand_price_at_offer = np.where(
+        demand_steps_before > 0, next_demand_price[np.maximum(demand_steps_before - 1, 0)], demand_price[0]
+    )
+    offer_steps_before = np.searchsorted(offer_cumul, demand_cumul, side="right")
+    offer_price_at_demand = np.where(
+        offer_steps_before > 0, next_offer_price[np.maximum(offer_steps_before - 1, 0)], offer_price[0]
+    )
+
+    offer_crossing = np.flatnonzero(demand_price_at_offer < next_offer_price)
+    demand_crossing = np.flatnonzero(next_demand_price < offer_price_at_demand)
+    # the first crossing is found by comparing the positions of the steps in the merged sequence of steps
+    best_position = np.inf
+    result = None
+    if len(offer_crossing) > 0:
+        i = offer_crossing[0]
+        best_position = i + demand_steps_before[i]
+        result = (float(demand_price_at_offer[i]), float(offer_cumul[i]))
+    if len(demand_crossing) > 0:
+        j = demand_crossing[0]
+        if j + offer_steps_before[j] < best_position:
+            result = (float(offer_price_at_demand[j]), float(demand_cumul[j]))
+    return result
+
+
+def sold_capacities(offers, market_quantity):
+    """
+    Returns the capacities sold and the capacities dumped for each offer of a sorted order book.
+    All offers below the market quantity are sold entirely, the offer at the market quantity is sold partially and
+    the capacities offered for a negative price that are not sold have to be dumped.
+    """
+    capacity = offers.capacity
+    cumul = offers.cumul_capacities
+    sold = np.where(cumul <= market_quantity, capacity, 0.0)
+    dumped = np.zeros(len(offers))
+    above = np.flatnonzero(cumul > market_quantity)
+    if len(above) > 0:
+        first = above[0]
+        partial = capacity[first] - cumul[first] + market_quantity
+        if partial > 0.1:
+            sold[first] = partial
+        negative = above[offers.price[above] < 0]
+        dumped[negative] = np.maximum(0.0, np.minimum(capacity[negative], cumul[negative] - market_quantity))
+    return sold, dumped
+
+
+def settle_market(offers, demands):
+    """
+    Sorts the order books of a market, clears it and returns the settlement of the market as a dict.
+    The settlement contains the sorted order books, the market price and quantity and the capacities sold and dumped
+    for each offer. It only depends on the order books so it can be computed in a worker.
+    """
+    offers.sort()
+    demands.sort(descending=True)
+    market_price, market_quantity = clear_market(offers, demands)
+    sold, dumped = sold_capacities(offers, market_quantity)
+    return {
+        "offers": offers,
+        "demands": demands,
+        "market_price": market_price,
+        "market_quantity": market_quantity,
+        "sold": sold,
+        "dumped": dumped,
+    }
+
+
+def _settlement_worker(conn):
+    """Loop of the worker processes: settles the markets received through `conn` until `None` is received"""
+    while True:
+        book = conn.recv()
+        if book is None:
+            break
+        conn.send(settle_market(*book))
+
+
+class ClearingPool:
+    """
+    Class that settles several independent markets, either one after the other or in a pool of workers.
+    The modes are:
+        "serial":       the markets are settled one after the other in the calling thread
+        "threads":      the markets are settled in OS threads (eventlet's tpool, since `threading` is monkey patched)
+        "processes":    the markets are settled in forked worker processes
+    Only "processes" scales with the number of cores: the settlement is mostly Python code on small arrays that holds
+    the GIL, so the threads settle the markets one at a time and only add the overhead of tpool. They are meant for
+    debugging and are the fallback of "processes" on the platforms that can't fork.
+    The settlements are always returned in the order of the markets.
+    """
+
+    modes = ("serial", "threads", "processes")
+
+    def __init__(self, mode="serial", workers=None):
+        if mode not in self.modes:
+            raise ValueError(f"Unknown market clearing mode {mode}, expected one of {self.modes}")
+        self.workers = workers or os.cpu_count() or 1
+        if mode == "processes" and "fork" not in multiprocessing.get_all_start_methods():
+            # spawned workers would re-import the main script and start a second server
+            mode = "threads"
+        self.mode = mode
+        self._processes = []
+        self._connections = []
+        if mode == "threads":
+            tpool.set_num_threads(self.workers)
+
+    def settle(self, books):
+        """Settles the markets given as a list of (offers, demands) and returns the list of settlements"""
+        if self.mode == "serial" or len(books) <= 1:
+            return [settle_market(offers, demands) for offers, demands in books]
+        if self.mode == "threads":
+            pool = eventlet.GreenPool(self.workers)
+            return list(pool.imap(lambda book: tpool.execute(settle_market, *book), books))
+        return self._settle_in_processes(books)
+
+    def _start_processes(self):
+        # the pipes are used directly: the queues and helper threads of `multiprocessing.Pool` and
+        # `ProcessPoolExecutor` don't work with eventlet's monkey patched threads
+        context = multiprocessing.get_context("fork")
+        for _ in range(self.workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_settlement_worker, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(parent_conn)
+
+    def _settle_in_processes(self, books):
+        if not self._processes:
+            self._start_processes()
+        settlements = [None] * len(books)
+        pending = {}  # connection -> index of the book being settled
+        next_book = 0
+        while next_book < len(books) or pending:
+            # each worker gets one market at a time so that neither side blocks on a full pipe
+            for conn in self._connections:
+                if conn not in pending and next_book < len(books):
+                    conn.send(books[next_book])
+                    pending[conn] = next_book
+                    next_book += 1
+            for conn in multiprocessing.connection.wait(list(pending)):
+                settlements[pending.pop(conn)] = conn.recv()
+        return settlements
+
+    def shutdown(self):
+        """Stops the workers of the pool and falls back to serial settlement"""
+        for conn in self._connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+        for process in self._processes:
+            process.join(timeout=1)
+        self._processes = []
+        self._connections = []
+        self.mode = "serial"
@@ -2,11 +2,9 @@
 
 import json
 import math
-import pickle
 import random
 import time
 from datetime import datetime
-from typing import List
 
 import numpy as np
 
@@ -15,10 +13,11 @@ import website.production_update as production_update
 import website.utils.assets as assets
 from website import db
 from website.config.climate_events import climate_events
-from website.database.engine_data import calculate_reference_gta, calculate_temperature_deviation
+from website.database import write_behind
+from website.database.engine_data import reference_gta_series, temperature_deviation_series
 from website.database.map import Hex
 from website.database.player import Player
-from website.database.player_assets import ActiveFacility, ClimateEventRecovery, OngoingConstruction, Shipment
+from website.database.player_assets import ActiveFacility, ClimateEventRecovery
 from website.utils.assets import facility_destroyed, remove_asset
 from website.utils.formatting import display_money
 from website.utils.misc import save_past_data_threaded
@@ -27,70 +26,148 @@ from website.utils.resource_market import store_import
 
 def state_update(engine, app):
     """This function is called every tick to update the state of the game"""
+    update_start = time.perf_counter()
+    metrics = engine.tick_metrics
     total_t = (time.time() - engine.data["start_date"]) / engine.clock_time
     with app.app_context():
+        # the last tick is always simulated normally so that the final state is sent to the clients
+        missed_ticks = math.ceil(total_t - 1) - engine.data["total_t"] - 1
+        if missed_ticks > engine.catch_up_threshold:
+            catch_up(engine, app, engine.data["total_t"] + missed_ticks)
         while engine.data["total_t"] < total_t - 1:
-            engine.data["total_t"] += 1
-            engine.log(f"t = {engine.data['total_t']}")
-            if engine.data["total_t"] % 216 == 0:
-                save_past_data_threaded(app, engine)
-            if (engine.data["total_t"] + engine.data["delta_t"]) % (24 * 60 * 60 / engine.clock_time) == 0:
-                engine.new_daily_question()
-            log_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "endpoint": "update_electricity",
-                "total_t": engine.data["total_t"],
-            }
-            engine.action_logger.info(json.dumps(log_entry))
-            production_update.update_electricity(engine=engine)
-            check_events_completion(engine)
-            check_climate_events(engine)
-            db.session.commit()
+            simulate_tick(engine, app)
+            with metrics.measure("db_commit"):
+                db.session.commit()
+            metrics.end_tick(engine.data["total_t"])
 
-    # save engine every minute in case of server crash
+    # save engine every minute in case of server crash, the checkpoint is written in the background
     if engine.data["total_t"] % (60 / engine.clock_time) == 0:
-        with open("instance/engine_data.pck", "wb") as file:
-            pickle.dump(engine.data, file)
+        with metrics.measure("engine_checkpoint"):
+            engine.checkpointer.start(engine)
+            flush_facility_usage(engine, app)
     with app.app_context():
+        with metrics.measure("weather_forecast"):
+            engine.weather_forecast.update(engine)
         # TODO: perhaps only run the below code conditionally on there being active ws connections
-        websocket.rest_notify_scoreboard(engine)
-        websocket.rest_notify_weather(engine)
-        websocket.rest_notify_global_data(engine)
+        with metrics.measure("rest_notify_scoreboard"):
+            websocket.rest_notify_scoreboard(engine)
+        with metrics.measure("rest_notify_weather"):
+            websocket.rest_notify_weather(engine)
+        with metrics.measure("rest_notify_global_data"):
+            websocket.rest_notify_global_data(engine)
+
+    update_duration = time.perf_counter() - update_start
+    if update_duration > engine.clock_time and not metrics.catch_up.get("active"):
+        metrics.overruns += 1
+        slowest = ", ".join(f"{phase} {duration:.2f}s" for phase, duration in metrics.slowest_phases())
+        engine.warn(f"state_update took {update_duration:.2f}s (clock time {engine.clock_time}s), slowest: {slowest}")
+    metrics.catch_up["active"] = False
+
+
+def flush_facility_usage(engine, app):
+    """Writes the facility usages kept in memory to the database"""
+    with app.app_context():
+        engine.facility_usage.flush()
+        db.session.commit()
+
+
+def flush_write_behind(app):
+    """Writes the player and tile values kept in the write-behind caches to the database"""
+    with app.app_context():
+        write_behind.flush()
+        db.session.commit()
+
+
+def simulate_tick(engine, app):
+    """Simulates one tick of the game. The database is not committed at the end of the tick."""
+    engine.tick_metrics.start_tick()
+    engine.data["total_t"] += 1
+    if not engine.catching_up:
+        engine.log(f"t = {engine.data['total_t']}")
+    if engine.data["total_t"] % 216 == 0:
+        save_past_data_threaded(app, engine)
+    if (engine.data["total_t"] + engine.data["delta_t"]) % (24 * 60 * 60 / engine.clock_time) == 0:
+        engine.new_daily_question()
+    log_entry = {
+        "timestamp": datetime.now().isoformat(),
+        "endpoint": "update_electricity",
+        "total_t": engine.data["total_t"],
+    }
+    engine.action_logger.info(json.dumps(log_entry))
+    production_update.update_electricity(engine=engine)
+    with engine.tick_metrics.measure("check_events_completion"):
+        check_events_completion(engine)
+    with engine.tick_metrics.measure("check_climate_events"):
+        check_climate_events(engine)
+    if engine.data["total_t"] % engine.write_behind_interval == 0:
+        with engine.tick_metrics.measure("write_behind_flush"):
+            write_behind.flush()
+
+
+def catch_up(engine, app, target_t):
+    """
+    Simulates the missed ticks up to `target_t` after the server has fallen behind. In catch-up mode, no data is sent
+    to the clients, no market snapshots are saved and the database is only committed every
+    `engine.catch_up_commit_interval` ticks. The progress and replay speed are logged and reported in the tick metrics.
+    """
+    metrics = engine.tick_metrics
+    first_t = engine.data["total_t"]
+    start = time.perf_counter()
+    last_report = start
+    metrics.catch_up = {"active": True, "start_t": first_t, "target_t": target_t, "replayed": 0, "ticks_per_second": 0}
+    engine.log(f"Server is {target_t - first_t} ticks behind, catching up")
+    engine.catching_up = True
+    try:
+        while engine.data["total_t"] < target_t:
+            simulate_tick(engine, app)
+            replayed = engine.data["total_t"] - first_t
+            if replayed % engine.catch_up_commit_interval == 0:
+                with metrics.measure("db_commit"):
+                    db.session.commit()
+            metrics.end_tick(engine.data["total_t"])
+            now = time.perf_counter()
+            metrics.catch_up["replayed"] = replayed
+            metrics.catch_up["ticks_per_second"] = replayed / (now - start)
+            if now - last_report > 5:
+                last_report = now
+                engine.log(
+                    f"Catching up: {replayed}/{target_t - first_t} ticks replayed "
+                    f"({metrics.catch_up['ticks_per_second']:.1f} ticks/s)"
+                )
+    finally:
+        engine.catching_up = False
+    db.session.commit()
+    engine.log(
+        f"Caught up {target_t - first_t} ticks in {time.perf_counter() - start:.1f}s "
+        f"({metrics.catch_up['ticks_per_second']:.1f} ticks/s)"
+    )
 
 
 def check_events_completion(engine):
     """function that checks if projects have finished, shipments have arrived or facilities arrived at end of life"""
+    due_events = engine.event_schedule.pop_due(engine.data["total_t"])
+
     # check if constructions finished
-    finished_constructions: List[OngoingConstruction] = OngoingConstruction.query.filter(
-        OngoingConstruction.suspension_time.is_(None),
-        OngoingConstruction.start_time + OngoingConstruction.duration <= engine.data["total_t"],
-    ).all()
-    for fc in finished_constructions:
-        assets.add_asset(fc.player_id, fc.id)
+    completed_players = set()
+    for fc in due_events["construction"]:
+        assets.add_asset(fc.player_id, fc.id, emit_update=False)
+        completed_players.add(fc.player_id)
         db.session.delete(fc)
+    # players with several finished projects in this tick are only updated once
+    for player_id in sorted(completed_players):
+        Player.query.get(player_id).emit("retrieve_player_data")
 
     # check if shipment arrived
-    arrived_shipments = Shipment.query.filter(
-        Shipment.departure_time.isnot(None),
-        Shipment.suspension_time.is_(None),
-        Shipment.departure_time + Shipment.duration <= engine.data["total_t"],
-    ).all()
-    for a_s in arrived_shipments:
+    for a_s in due_events["shipment"]:
         store_import(a_s.player, a_s.resource, a_s.quantity)
         db.session.delete(a_s)
 
     # check end of lifespan of facilities
-    eolt_facilities: List[ActiveFacility] = ActiveFacility.query.filter(
-        ActiveFacility.end_of_life <= engine.data["total_t"]
-    ).all()
-    for facility in eolt_facilities:
+    for facility in due_events["end_of_life"]:
         remove_asset(facility.player_id, facility)
 
     # check end of climate events
-    finished_climate_events: List[ClimateEventRecovery] = ClimateEventRecovery.query.filter(
-        ClimateEventRecovery.start_time + ClimateEventRecovery.duration <= engine.data["total_t"]
-    ).all()
-    for fce in finished_climate_events:
+    for fce in due_events["climate_event_recovery"]:
         db.session.delete(fce)
 
 
@@ -216,6 +293,7 @@ def climate_event_impact(engine, tile, event):
     )
     db.session.add(new_climate_event)
     db.session.commit()
+    engine.event_schedule.add("climate_event_recovery", new_climate_event)
     player.notify(
         climate_events[event]["name"],
         climate_events[event]["description"].format(
@@ -254,16 +332,11 @@ def climate_event_impact(engine, tile, event):
 
 def data_init_climate(seconds_per_tick, random_seed, delta_t):
     """Initializes the data for the climate."""
-    ref_temp = []
-    temp_deviation = []
-    for i in range(5):
-        ref_temp.append([])
-        temp_deviation.append([])
-        for j in range(360):
-            ref_temp[i].append(calculate_reference_gta(delta_t - (359 - j) * pow(6, i), seconds_per_tick))
-            temp_deviation[i].append(
-                calculate_temperature_deviation(delta_t - (359 - j) * pow(6, i), seconds_per_tick, 4e10, random_seed)
-            )
+    # ticks of the values of the 5 resolutions, shape (5, 360)
+    ticks = delta_t - (359 - np.arange(360)) * 6 ** np.arange(5)[:, np.newaxis]
+    ref_temp = reference_gta_series(ticks, seconds_per_tick).tolist()
+    temp_deviation = temperature_deviation_series(ticks.ravel(), seconds_per_tick, 4e10, random_seed)
+    temp_deviation = temp_deviation.reshape(ticks.shape).tolist()
 
     return {
         "emissions": {
@@ -1,25 +1,20 @@
 """Miscellaneous util functions"""
 
 import math
-import os
-import pickle
 import threading
 from datetime import datetime, timedelta
 
 import numpy as np
-import pandas as pd
 from flask import flash
-from noise import pnoise3
-from pvlib.location import Location
-from scipy.stats import norm
 
 import website.api.websocket as websocket
 from website import db
-from website.config.assets import river_discharge_seasonal
+from website.database import time_series
 from website.database.engine_data import CapacityData, CircularBufferPlayer, CumulativeEmissionsData
 from website.database.messages import Chat, Notification
 from website.database.player import Network, Player
 from website.database.player_assets import ActiveFacility
+from website.utils.weather import calculate_river_discharge, tile_position
 
 # Helper functions and data initialization utilities
 
@@ -67,11 +62,9 @@ def data_init():
     }
 
 
-def init_table(user_id):
-    """initialize data table for new user and stores it as a .pck in the 'player_data' repo"""
-    past_data = data_init()
-    with open(f"instance/player_data/player_{user_id}.pck", "wb") as file:
-        pickle.dump(past_data, file)
+def init_table(engine, user_id):
+    """initialize data table for new user and stores it as a time series store in the 'player_data' repo"""
+    time_series.create_store(time_series.player_store_path(user_id), data_init(), engine.time_series_dtype)
 
 
 def add_player_to_data(engine, user):
@@ -90,74 +83,22 @@ def save_past_data_threaded(app, engine):
     def save_data():
         with app.app_context():
             # save climate data
-            with open("instance/server_data/climate_data.pck", "rb") as file:
-                past_climate_data = pickle.load(file)
-            new_climate_data = engine.data["current_climate_data"].get_data()
-            for category in new_climate_data:
-                for element in new_climate_data[category]:
-                    new_el_data = new_climate_data[category][element]
-                    past_el_data = past_climate_data[category][element]
-                    reduce_resolution(past_el_data, np.array(new_el_data))
-            with open("instance/server_data/climate_data.pck", "wb") as file:
-                pickle.dump(past_climate_data, file)
+            climate_store = time_series.open_store(time_series.climate_store_path)
+            save_to_store(climate_store, engine.data["current_climate_data"].get_data())
 
             # save player data
             players = Player.query.all()
             for player in players:
                 if player.tile is None:
                     continue
-                past_data = {}
-                with open(
-                    f"instance/player_data/player_{player.id}.pck",
-                    "rb",
-                ) as file:
-                    past_data = pickle.load(file)
-                new_data = engine.data["current_data"][player.id].get_data()
-                for category in new_data:
-                    for element in new_data[category]:
-                        new_el_data = new_data[category][element]
-                        if element not in past_data[category]:
-                            # if facility didn't exist in past data, initialize it
-                            past_data[category][element] = [[0.0] * 360] * 5
-                        past_el_data = past_data[category][element]
-                        reduce_resolution(past_el_data, np.array(new_el_data))
-
-                with open(
-                    f"instance/player_data/player_{player.id}.pck",
-                    "wb",
-                ) as file:
-                    pickle.dump(past_data, file)
-
-            # remove old network files AND save past prices
+                store = time_series.open_store(time_series.player_store_path(player.id))
+                save_to_store(store, engine.data["current_data"][player.id].get_data())
+
+            # save network data
             networks = Network.query.all()
             for network in networks:
-                network_dir = f"instance/network_data/{network.id}/charts/"
-                files = os.listdir(network_dir)
-                for filename in files:
-                    t_value = int(filename.split("market_t")[1].split(".pck")[0])
-                    if t_value < engine.data["total_t"] - 1440:
-                        os.remove(os.path.join(network_dir, filename))
-
-                past_data = {}
-                with open(
-                    f"instance/network_data/{network.id}/time_series.pck",
-                    "rb",
-                ) as file:
-                    past_data = pickle.load(file)
-
-                new_data = engine.data["network_data"][network.id].get_data()
-                for category in new_data:
-                    for group, buffer in new_data[category].items():
-                        if group not in past_data[category]:
-                            past_data[category][group] = [[0.0] * 360] * 5
-                        past_el_data = past_data[category][group]
-                        reduce_resolution(past_el_data, np.array(buffer))
-
-                with open(
-                    f"instance/network_data/{network.id}/time_series.pck",
-                    "wb",
-                ) as file:
-                    pickle.dump(past_data, file)
+                store = time_series.open_store(time_series.network_store_path(network.id))
+                save_to_store(store, engine.data["network_data"][network.id].get_data())
 
             # remove old notifications
             Notification.query.filter(
@@ -168,23 +109,153 @@ def save_past_data_threaded(app, engine):
 
             engine.log("last 216 data points have been saved to files")
 
-    def reduce_resolution(array, new_values):
-        """reduces resolution of current array x6, x36, x216 and x1296"""
-        array[0] = array[0][len(new_values) :]
-        array[0].extend(new_values)
-        new_values_reduced = new_values
-        for r in range(1, 4):
-            new_values_reduced = np.mean(new_values_reduced.reshape(-1, 6), axis=1)
-            array[r] = array[r][len(new_values_reduced) :]
-            array[r].extend(new_values_reduced)
-        if engine.data["total_t"] % 1296 == 0:
-            array[4] = array[4][1:]
-            array[4].append(np.mean(array[3][-6:]))
+    def save_to_store(store, new_data):
+        """appends the new values of all series to the store and flushes it"""
+        store.append_ticks(new_data, daily=engine.data["total_t"] % 1296 == 0)
+        store.flush(last_tick=engine.data["total_t"])
 
     thread = threading.Thread(target=save_data)
     thread.start()
 
 
+def chart_delta(since, total_t):
+    """
+    Returns the number of points that have been appended to each resolution of the charts between the payload of the
+    tick `since` and the one of the tick `total_t` (shifts) and the number of points at the end of each resolution
+    that have changed (counts), or None if the client has to get the full payload. The charts are the last 360 points
+    of the saved data followed by the data of the current day averaged over 5, 30 and 180 ticks: the last point of
+    each resolution changes until its group is complete and the first point of the 4th resolution of the day is
+    blended with the saved points. A resolution that can't be updated is sent entirely.
+    """
+    # the data of the day of the tick `since` may not have been saved yet when its payload has been built
+    if since < 0 or since > total_t or since % 216 == 0:
+        return None
+    saved_s, saved_t = since - since % 216, total_t - total_t % 216
+    ticks_s, ticks_t = since % 216 + 1, total_t % 216 + 1
+    groups_s, groups_t = [ticks_s], [ticks_t]
+    for size in [5, 6, 6]:
+        groups_s.append(-(-groups_s[-1] // size))
+        groups_t.append(-(-groups_t[-1] // size))
+    if saved_s == saved_t:
+        shifts = [groups_t[r] - groups_s[r] for r in range(4)] + [0]
+        complete_5days = ticks_s // 5
+        counts = [total_t - since, groups_t[1] - complete_5days, groups_t[2] - complete_5days // 6, groups_t[3], 0]
+    else:
+        saves = (saved_t - saved_s) // 216
+        points_per_save = [216, 36, 6, 1]
+        shifts = [saves * points_per_save[r] + groups_t[r] - groups_s[r] for r in range(4)]
+        shifts.append(saved_t // 1296 - saved_s // 1296)
+        counts = [saves * points_per_save[r] + groups_t[r] for r in range(4)] + [shifts[4]]
+    if counts[0] > 360:
+        return None
+    for resolution in range(1, 5):
+        # the day is averaged over 5 ticks but saved averaged over 6 ticks, the resolution can get shorter at a save
+        if shifts[resolution] < 0 or counts[resolution] > 360:
+            shifts[resolution], counts[resolution] = 0, 360
+    return shifts, counts
+
+
+def package_chart_data(engine, player, since=None, fallback=True):
+    """
+    Packages the past data of the charts of a player, its network and the climate with the data of the current day.
+    If `since` is the tick of a payload the client already has, only the points that have changed since are packaged
+    (see `chart_delta`). If that is not possible, the full payload is returned, or None if `fallback` is False.
+    """
+
+    def calculate_mean_subarrays(array, x):
+        return [np.mean(array[i : i + x]) for i in range(0, len(array), x)]
+
+    def concat_slices(dict1, dict2):
+        for key, value in dict2.items():
+            for sub_key, array2 in value.items():
+                if sub_key not in dict1[key]:
+                    dict1[key][sub_key] = [[0.0] * 360] * 5
+                array = dict1[key][sub_key]
+                concatenated_array = list(array[0]) + array2
+                dict1[key][sub_key][0] = concatenated_array[-360:]
+                new_5days = calculate_mean_subarrays(array2, 5)
+                dict1[key][sub_key][1] = dict1[key][sub_key][1][len(new_5days) :]
+                dict1[key][sub_key][1].extend(new_5days)
+                new_month = calculate_mean_subarrays(new_5days, 6)
+                l2v = dict1[key][sub_key][2][-2:]
+                dict1[key][sub_key][2] = dict1[key][sub_key][2][len(new_month) :]
+                dict1[key][sub_key][2].extend(new_month)
+                new_6month = calculate_mean_subarrays(new_month, 6)
+                if total_t % 180 >= 120:
+                    new_6month[0] = new_6month[0] / 3 + l2v[0] / 3 + l2v[1] / 3
+                elif total_t % 180 >= 60:
+                    new_6month[0] = new_6month[0] / 2 + l2v[1] / 2
+                dict1[key][sub_key][3] = dict1[key][sub_key][3][len(new_6month) :]
+                dict1[key][sub_key][3].extend(new_6month)
+
+    def tails(data):
+        return {
+            key: {
+                sub_key: [array[len(array) - count :] for array, count in zip(arrays, counts, strict=True)]
+                for sub_key, arrays in value.items()
+            }
+            for key, value in data.items()
+        }
+
+    total_t = engine.data["total_t"]
+    network = player.network
+    stores = [time_series.open_store(time_series.player_store_path(player.id))]
+    if network is not None:
+        stores.append(time_series.open_store(time_series.network_store_path(network.id)))
+    stores.append(time_series.open_store(time_series.climate_store_path))
+
+    delta = None if since is None else chart_delta(since, total_t)
+    # the stores have to contain the data of the days between the two payloads
+    saved_t = total_t - total_t % 216
+    if delta is not None and since < saved_t and any(store.index["last_tick"] != saved_t for store in stores):
+        delta = None
+    if since is not None and delta is None and not fallback:
+        return None
+    widths = None
+    if delta is not None:
+        shifts, counts = delta
+        # concat_slices needs the last 2 points of the 3rd resolution
+        widths = [max(count, 2) for count in counts]
+
+    current_data = engine.data["current_data"][player.id].get_data(t=total_t % 216 + 1)
+    data = stores[0].read(widths)
+    concat_slices(data, current_data)
+
+    network_data = None
+    if network is not None:
+        current_network_data = engine.data["network_data"][network.id].get_data(t=total_t % 216 + 1)
+        network_data = stores[1].read(widths)
+        concat_slices(network_data, current_network_data)
+
+    current_climate_data = engine.data["current_climate_data"].get_data(t=total_t % 216 + 1)
+    climate_data = stores[-1].read(widths)
+    concat_slices(climate_data, current_climate_data)
+
+    cumulative_emissions = engine.data["player_cumul_emissions"][player.id].get_all()
+
+    if delta is None:
+        return {
+            "total_t": total_t,
+            "network_id": None if network is None else network.id,
+            "data": data,
+            "network_data": network_data,
+            "climate_data": climate_data,
+            "cumulative_emissions": cumulative_emissions,
+        }
+    # the client drops the first `shifts[r]` points of each resolution and appends the last `counts[r]` points, the
+    # series it doesn't have yet start with zeros
+    return {
+        "total_t": total_t,
+        "since": since,
+        "shifts": shifts,
+        "network_id": None if network is None else network.id,
+        "data": tails(data),
+        "network_data": None if network_data is None else tails(network_data),
+        "climate_data": tails(climate_data),
+        "cumulative_emissions": cumulative_emissions,
+    }
+
+
 def display_new_message(engine, message, chat):
     """Sends chat message to all relevant sources through socketio and websocket"""
     websocket_message = websocket.rest_new_chat_message(chat.id, message)
@@ -237,8 +308,9 @@ def confirm_location(engine, player, location):
     general_chat = Chat.query.get(1)
     player.chats.append(general_chat)
     db.session.commit()
+    engine.event_schedule.add("end_of_life", steam_engine)
     add_player_to_data(engine, player)
-    init_table(player.id)
+    init_table(engine, player.id)
     engine.data["current_data"][player.id].new_subcategory("op_costs", "steam_engine")
     engine.data["current_data"][player.id].new_subcategory("generation", "steam_engine")
     engine.data["current_data"][player.id].new_subcategory("emissions", "steam_engine")
@@ -283,82 +355,12 @@ def get_quiz_question(engine, player):
 # Weather
 
 
-def calculate_solar_irradiance(x, y, total_seconds, random_seed):
-    """
-    The clear sky index is derived from a 3d perlin noise function that moves in time to simulate the cloud cover.
-    The clear sky index is then multiplied by the clear sky irradiance from pvlib to get the solar irradiance.
-    The irradiance is capped at 1000 W/m^2.
-    """
-
-    def transformation(x, threshold=0, smoothness=2):
-        """Sigmoid transformation"""
-        return 1 / (1 + np.exp(-(x - threshold) * 10 / smoothness))
-
-    # Calculate the real day and time in a year for a given tick
-    start_date = datetime(2023, 1, 1)
-    day_of_year = int((total_seconds / 3600 / 24 / 72) % 1 * 365)
-    time_of_day = total_seconds % (3600 * 24)
-    weather_datetime = pd.DatetimeIndex([start_date + timedelta(days=day_of_year, seconds=time_of_day)])
-
-    x_noise = x + total_seconds / 2400
-    y_noise = y + total_seconds / 4000
-    t = total_seconds / 3600 / 24
-    regional_noise = pnoise3(
-        x_noise / 50, y_noise / 50, t, octaves=2, persistence=0.5, lacunarity=2.0, base=random_seed
-    )
-    regional_noise = transformation(regional_noise, smoothness=1) * 2 - 1
-    cloud_cover_noise = pnoise3(x_noise, y_noise, t, octaves=6, persistence=0.5, lacunarity=2.0, base=random_seed)
-    cloud_cover_noise = transformation(
-        cloud_cover_noise, threshold=0.5 * regional_noise, smoothness=max(0.3, 1 - regional_noise)
-    )
-    csi = 1 - min(0.9, 5 - regional_noise * 5) * cloud_cover_noise
-    loc = Location((y - 10) * 85 / 21, 0)
-    clear_sky = loc.get_clearsky(weather_datetime)["ghi"][weather_datetime[0]]
-    return min(1000, csi * clear_sky)
-
-
-def calculate_wind_speed(x, y, total_seconds, random_seed):
-    """
-    The wind speed is derived from a 3d perlin noise function with a superposition of specific frequencies.
-    Two sinusoidal functions are multiplied to the noise to simulate the diurnal and seasonal wind patterns.
-    """
-    t = total_seconds / 60
-    wind_speed_noise = (
-        0.9 * pnoise3(x / 20, y / 20, t / 5760, base=random_seed)
-        + 0.06 * pnoise3(x, y, t / 360, base=random_seed)
-        + 0.03 * pnoise3(x * 3, y * 3, t / 90, base=random_seed)
-        + 0.007 * pnoise3(x * 18, y * 18, t / 15, base=random_seed)
-        + 0.003 * pnoise3(x * 108, y * 108, t / 2.5, base=random_seed)
-    )
-    wind_speed_noise = norm.cdf(wind_speed_noise, loc=0, scale=0.15)
-    wind_speed_noise = (1 - (1 - wind_speed_noise) ** 0.1282) ** 0.4673
-    wind_speed = (
-        wind_speed_noise
-        * (1 + 0.4 * math.sin(t / 60 / 24 / 72 * math.pi * 2 + 0.5 * math.pi))
-        * (1 + 0.1 * math.sin(t / 60 / 24 * math.pi * 2 + 0.4 * math.pi))
-        * 75
-    )
-    return wind_speed
-
-
-def calculate_river_discharge(total_seconds):
-    """Calculate the river discharge by interpolating the values from the seasonal variation"""
-    days_since_start = math.floor(total_seconds / 3600 / 24)
-    current_day_fraction = (total_seconds % (3600 * 24)) / (3600 * 24)
-    discharge_factor = river_discharge_seasonal[days_since_start % 72] + current_day_fraction * (
-        river_discharge_seasonal[(days_since_start + 1) % 72] - river_discharge_seasonal[days_since_start % 72]
-    )
-    return discharge_factor * 150  # in m^3/s
-
-
 def package_weather_data(engine, player):
     """Package date and weather data for a player"""
-    x = player.tile.q + 0.5 * player.tile.r
-    y = player.tile.r * 0.5 * 3**0.5
+    x, y = tile_position(player.tile)
     total_seconds = (engine.data["total_t"] + engine.data["delta_t"]) * engine.in_game_seconds_per_tick
-    random_seed = engine.data["random_seed"]
-    solar_irradiance = calculate_solar_irradiance(x, y, total_seconds, random_seed)
-    wind_speed = calculate_wind_speed(x, y, total_seconds, random_seed)
+    solar_irradiance = engine.weather_cache.solar_irradiance(engine, x, y)
+    wind_speed = engine.weather_cache.wind_speed(engine, x, y)
     river_discharge = calculate_river_discharge(total_seconds)
     months = [
         "January",
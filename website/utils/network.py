@@ -1,12 +1,11 @@
 """Util functions relating to networks"""
 
-import pickle
 import shutil
-from pathlib import Path
 
 import website.api.websocket as websocket
 import website.game_engine as game_engine
 from website import db
+from website.database import market_log, time_series
 from website.database.engine_data import CapacityData, CircularBufferNetwork
 from website.database.player import Network, Player
 
@@ -19,6 +18,7 @@ def join_network(engine, player, network):
         return {"response": "playerAlreadyInNetwork"}
     player.network = network
     db.session.commit()
+    engine.data["network_capacities"][network.id].update_network(network)
     engine.log(f"{player.username} joined the network {network.name}")
     websocket.rest_notify_network_change(engine)
     return {"response": "success"}
@@ -38,6 +38,11 @@ def data_init_network():
     }
 
 
+def init_network_table(engine, network_id):
+    """Initializes the time series store of a new network"""
+    time_series.create_store(time_series.network_store_path(network_id), data_init_network(), engine.time_series_dtype)
+
+
 def create_network(engine, player, name):
     """shared API method to create a network. Network name must pass validation,
     namely it must not be too long, nor too short, and must not already be in
@@ -49,15 +54,10 @@ def create_network(engine, player, name):
     new_network = Network(name=name, members=[player])
     db.session.add(new_network)
     db.session.commit()
-    network_path = f"instance/network_data/{new_network.id}"
-    Path(f"{network_path}/charts").mkdir(parents=True, exist_ok=True)
     engine.data["network_data"][new_network.id] = CircularBufferNetwork()
     engine.data["network_capacities"][new_network.id] = CapacityData()
     engine.data["network_capacities"][new_network.id].update_network(new_network)
-    past_data = data_init_network()
-    Path(f"{network_path}").mkdir(parents=True, exist_ok=True)
-    with open(f"{network_path}/time_series.pck", "wb") as file:
-        pickle.dump(past_data, file)
+    init_network_table(engine, new_network.id)
     engine.log(f"{player.username} created the network {name}")
     websocket.rest_notify_network_change(engine)
     return {"response": "success"}
@@ -73,9 +73,13 @@ def leave_network(engine, player):
     # delete network if it is empty
     if remaining_members_count == 0:
         engine.log(f"The network {network.name} has been deleted because it was empty")
+        time_series.close_store(time_series.network_store_path(network.id))
+        market_log.close_log(network.id)
         shutil.rmtree(f"instance/network_data/{network.id}")
         db.session.delete(network)
     db.session.commit()
+    if remaining_members_count > 0:
+        engine.data["network_capacities"][network.id].update_network(network)
     engine.log(f"{player.username} left the network {network.name}")
     websocket.rest_notify_network_change(engine)
     return {"response": "success"}
@@ -96,6 +96,8 @@ def buy_resource_from_market(player, quantity, sale_id):
             player_id=player.id,
         )
         db.session.add(new_shipment)
+        db.session.flush()
+        engine.event_schedule.add("shipment", new_shipment)
         sale.player.notify(
             "Resource transaction",
             f"{player.username} bought {format_mass(quantity)} of "
@@ -164,6 +166,7 @@ def pause_shipment(player, shipment_id):
     else:
         shipment.departure_time += engine.data["total_t"] - shipment.suspension_time
         shipment.suspension_time = None
+        engine.event_schedule.add("shipment", shipment)
     db.session.commit()
     return {
         "response": "success",
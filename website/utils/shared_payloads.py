@@ -0,0 +1,58 @@
+"""This file contains the cache of the websocket messages that are the same for all the clients"""
+
+
+class SharedPayloads:
+    """
+    Class that stores the websocket messages that are sent to all the clients (map, players, networks, scoreboard and
+    global data) serialised to JSON, so that they are built once and the same string is sent to every connection. The
+    messages that change every tick are stored with the tick they have been built at and rebuilt at the next tick,
+    the other ones are kept until they are invalidated by the event that changes them. The binary encoding of a message
+    (see `binary_messages.py`) is stored with it the first time it is sent to a client that has opted into it. The hit
+    and miss counters are cumulative.
+    """
+
+    def __init__(self):
+        self._entries = {}  # name -> [tick, message, binary encoding or None]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, tick, build):
+        """
+        Returns the message `name` for the tick `tick` (None if the message doesn't depend on the tick), `build` is
+        called to serialise it if it is not in the cache.
+        """
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == tick:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        message = build()
+        self._entries[name] = [tick, message, None]
+        return message
+
+    def encoded(self, message, encode):
+        """
+        Returns the binary encoding of a message if it is one of the cached messages, calling `encode` the first time,
+        None if it is not cached
+        """
+        for entry in self._entries.values():
+            if entry[1] is message:
+                if entry[2] is None:
+                    entry[2] = encode(message)
+                return entry[2]
+        return None
+
+    def invalidate(self, *names):
+        """Removes the messages `names`, they are rebuilt the next time they are sent"""
+        for name in names:
+            self._entries.pop(name, None)
+
+    def package(self):
+        """Packages the cached messages and the counters of the cache"""
+        requests = self.hits + self.misses
+        return {
+            "entries": {name: len(message) for name, (_, message, _) in self._entries.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else None,
+        }
@@ -0,0 +1,110 @@
+"""Timing instrumentation for the phases of the game ticks"""
+
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class TickMetrics:
+    """
+    Class that measures how long each phase of a tick takes and keeps the durations of the last `history` ticks.
+    Phases that run several times in one tick (ex: once per player) are summed over the tick.
+    Durations measured outside of a tick (ex: the broadcasts after the ticks) are stored as samples on their own.
+    """
+
+    def __init__(self, history=720):
+        self.history = history
+        self._samples = {}
+        self._current = defaultdict(float)
+        self._tick_start = None
+        self.last_tick = {}
+        self.overruns = 0
+        self.catch_up = {}  # progress of the last catch-up after the server fell behind
+
+    @contextmanager
+    def measure(self, phase):
+        """Context manager that adds the time spent in the `with` block to `phase`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add(self, phase, duration):
+        """Adds a measured duration in seconds to a phase"""
+        if self._tick_start is None:
+            self._record(phase, duration)
+        else:
+            self._current[phase] += duration
+
+    def start_tick(self):
+        """Starts the measurement of a new tick"""
+        self._current = defaultdict(float)
+        self._tick_start = time.perf_counter()
+
+    def end_tick(self, total_t):
+        """Ends the measurement of the current tick, stores its durations and returns the duration of the tick"""
+        self._current["tick"] = time.perf_counter() - self._tick_start
+        self._tick_start = None
+        for phase, duration in self._current.items():
+            self._record(phase, duration)
+        self.last_tick = {"total_t": total_t, "phases": dict(self._current)}
+        return self._current["tick"]
+
+    def _record(self, phase, duration):
+        if phase not in self._samples:
+            self._samples[phase] = deque(maxlen=self.history)
+        self._samples[phase].append(duration)
+
+    def slowest_phases(self, n=3):
+        """Returns the `n` slowest phases of the last tick as a list of (phase, duration)"""
+        phases = [(phase, d) for phase, d in self.last_tick.get("phases", {}).items() if phase != "tick"]
+        return sorted(phases, key=lambda x: x[1], reverse=True)[:n]
+
+    def package(self):
+        """Packages p50, p95 and max durations (in ms) of all phases over the recorded ticks"""
+        phases = {}
+        for phase, samples in self._samples.items():
+            values = np.fromiter(samples, dtype=np.float64) * 1000
+            phases[phase] = {
+                "count": len(values),
+                "p50": float(np.percentile(values, 50)),
+                "p95": float(np.percentile(values, 95)),
+                "max": float(values.max()),
+                "last": float(values[-1]),
+            }
+        return {
+            "history": self.history,
+            "overruns": self.overruns,
+            "catch_up": self.catch_up,
+            "last_tick": self.last_tick,
+            "phases": phases,
+        }
+
+
+class StartupTimer:
+    """Class that measures how long each phase of the startup of the server takes"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.phases = {}
+
+    def mark(self, phase):
+        """Stores the time since the start as the duration of `phase` (ex: the imports before the timer is created)"""
+        self.phases[phase] = time.perf_counter() - self.start
+
+    @contextmanager
+    def measure(self, phase):
+        """Context manager that adds the time spent in the `with` block to `phase`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def summary(self):
+        """Returns a one line description of the startup durations"""
+        phases = ", ".join(f"{phase} {duration:.2f}s" for phase, duration in self.phases.items())
+        return f"startup took {time.perf_counter() - self.start:.2f}s ({phases})"
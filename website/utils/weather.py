@@ -0,0 +1,208 @@
+"""Functions that calculate the weather and the cache of the weather values of the current tick"""
+
+import math
+
+import numpy as np
+from noise import pnoise3
+
+from website.config.assets import river_discharge_seasonal
+from website.utils.clear_sky import clear_sky_ghi
+
+
+def tile_position(tile):
+    """Returns the (x, y) position of the center of a tile, at which the weather of the tile is calculated"""
+    return tile.q + 0.5 * tile.r, tile.r * 0.5 * 3**0.5
+
+
+def calculate_solar_irradiance(x, y, total_seconds, random_seed):
+    """
+    The clear sky index is derived from a 3d perlin noise function that moves in time to simulate the cloud cover.
+    The clear sky index is then multiplied by the clear sky irradiance (calculated with pvlib, see `clear_sky.py`) to
+    get the solar irradiance. The irradiance is capped at 1000 W/m^2.
+    """
+
+    def transformation(x, threshold=0, smoothness=2):
+        """Sigmoid transformation"""
+        return 1 / (1 + np.exp(-(x - threshold) * 10 / smoothness))
+
+    # Calculate the real day and time in a year for a given tick
+    day_of_year = int((total_seconds / 3600 / 24 / 72) % 1 * 365)
+    time_of_day = total_seconds % (3600 * 24)
+
+    x_noise = x + total_seconds / 2400
+    y_noise = y + total_seconds / 4000
+    t = total_seconds / 3600 / 24
+    regional_noise = pnoise3(
+        x_noise / 50, y_noise / 50, t, octaves=2, persistence=0.5, lacunarity=2.0, base=random_seed
+    )
+    regional_noise = transformation(regional_noise, smoothness=1) * 2 - 1
+    cloud_cover_noise = pnoise3(x_noise, y_noise, t, octaves=6, persistence=0.5, lacunarity=2.0, base=random_seed)
+    cloud_cover_noise = transformation(
+        cloud_cover_noise, threshold=0.5 * regional_noise, smoothness=max(0.3, 1 - regional_noise)
+    )
+    csi = 1 - min(0.9, 5 - regional_noise * 5) * cloud_cover_noise
+    clear_sky = float(clear_sky_ghi((y - 10) * 85 / 21, day_of_year, time_of_day))
+    return min(1000, csi * clear_sky)
+
+
+def calculate_wind_speed(x, y, total_seconds, random_seed):
+    """
+    The wind speed is derived from a 3d perlin noise function with a superposition of specific frequencies.
+    Two sinusoidal functions are multiplied to the noise to simulate the diurnal and seasonal wind patterns.
+    """
+    # scipy is slow to import, it is only imported when the first wind speed is calculated
+    from scipy.special import ndtr
+
+    t = total_seconds / 60
+    wind_speed_noise = (
+        0.9 * pnoise3(x / 20, y / 20, t / 5760, base=random_seed)
+        + 0.06 * pnoise3(x, y, t / 360, base=random_seed)
+        + 0.03 * pnoise3(x * 3, y * 3, t / 90, base=random_seed)
+        + 0.007 * pnoise3(x * 18, y * 18, t / 15, base=random_seed)
+        + 0.003 * pnoise3(x * 108, y * 108, t / 2.5, base=random_seed)
+    )
+    # cumulative distribution function of the normal distribution with a standard deviation of 0.15
+    wind_speed_noise = ndtr(wind_speed_noise / 0.15)
+    wind_speed_noise = (1 - (1 - wind_speed_noise) ** 0.1282) ** 0.4673
+    wind_speed = (
+        wind_speed_noise
+        * (1 + 0.4 * math.sin(t / 60 / 24 / 72 * math.pi * 2 + 0.5 * math.pi))
+        * (1 + 0.1 * math.sin(t / 60 / 24 * math.pi * 2 + 0.4 * math.pi))
+        * 75
+    )
+    return wind_speed
+
+
+def calculate_wind_speeds(x, y, total_seconds, random_seed):
+    """
+    Vectorized version of `calculate_wind_speed` that returns the wind speeds at the positions of the lists `x` and `y`
+    at one point in time. The noise library only evaluates one point per call, so the noise terms are computed in one
+    loop and the rest of the calculation is done on arrays.
+    """
+    from scipy.special import ndtr
+
+    t = total_seconds / 60
+    wind_speed_noise = np.fromiter(
+        (
+            0.9 * pnoise3(xi / 20, yi / 20, t / 5760, base=random_seed)
+            + 0.06 * pnoise3(xi, yi, t / 360, base=random_seed)
+            + 0.03 * pnoise3(xi * 3, yi * 3, t / 90, base=random_seed)
+            + 0.007 * pnoise3(xi * 18, yi * 18, t / 15, base=random_seed)
+            + 0.003 * pnoise3(xi * 108, yi * 108, t / 2.5, base=random_seed)
+            for xi, yi in zip(x, y, strict=True)
+        ),
+        dtype=np.float64,
+        count=len(x),
+    )
+    wind_speed_noise = ndtr(wind_speed_noise / 0.15)
+    wind_speed_noise = (1 - (1 - wind_speed_noise) ** 0.1282) ** 0.4673
+    wind_speeds = (
+        wind_speed_noise
+        * (1 + 0.4 * math.sin(t / 60 / 24 / 72 * math.pi * 2 + 0.5 * math.pi))
+        * (1 + 0.1 * math.sin(t / 60 / 24 * math.pi * 2 + 0.4 * math.pi))
+        * 75
+    )
+    return wind_speeds
+
+
+def calculate_river_discharge(total_seconds):
+    """Calculate the river discharge by interpolating the values from the seasonal variation"""
+    days_since_start = math.floor(total_seconds / 3600 / 24)
+    current_day_fraction = (total_seconds % (3600 * 24)) / (3600 * 24)
+    discharge_factor = river_discharge_seasonal[days_since_start % 72] + current_day_fraction * (
+        river_discharge_seasonal[(days_since_start + 1) % 72] - river_discharge_seasonal[days_since_start % 72]
+    )
+    return discharge_factor * 150  # in m^3/s
+
+
+class WeatherCache:
+    """
+    Class that stores the solar irradiance and wind speed calculated at positions of the map, keyed by (tick, position).
+    The values of the current tick are calculated once by `fill()` at the start of the tick for all occupied tiles and
+    facility positions, and are then shared by the production update, the weather broadcasts and the HTTP requests.
+    Missing values are read from the weather forecast (see `weather_forecast.py`) when it covers them and calculated
+    otherwise. The values are discarded when the tick changes. The hit and miss counters are cumulative.
+    """
+
+    def __init__(self):
+        self.tick = None
+        self._irradiance = {}
+        self._wind_speed = {}
+        # positions filled at the last tick, the weather forecast is calculated at these positions
+        self.positions = set()
+        self.hits = 0
+        self.misses = 0
+        self.forecast_hits = 0
+
+    def _rollover(self, engine):
+        """Discards the values of the previous tick and returns the in-game time of the current tick in seconds"""
+        if engine.data["total_t"] != self.tick:
+            self.tick = engine.data["total_t"]
+            self._irradiance = {}
+            self._wind_speed = {}
+        return (engine.data["total_t"] + engine.data["delta_t"]) * engine.in_game_seconds_per_tick
+
+    def solar_irradiance(self, engine, x, y):
+        """Returns the solar irradiance at a position for the current tick"""
+        total_seconds = self._rollover(engine)
+        value = self._irradiance.get((x, y))
+        if value is None:
+            self.misses += 1
+            value = engine.weather_forecast.value("solar_irradiance", self.tick, (x, y))
+            if value is None:
+                value = calculate_solar_irradiance(x, y, total_seconds, engine.data["random_seed"])
+            else:
+                self.forecast_hits += 1
+            self._irradiance[(x, y)] = value
+        else:
+            self.hits += 1
+        return value
+
+    def wind_speed(self, engine, x, y):
+        """Returns the wind speed at a position for the current tick"""
+        return float(self.wind_speeds(engine, [x], [y])[0])
+
+    def wind_speeds(self, engine, x, y):
+        """Returns the wind speeds at the positions of the lists `x` and `y` for the current tick as an array"""
+        total_seconds = self._rollover(engine)
+        positions = list(zip(x, y, strict=True))
+        missing = list(dict.fromkeys(position for position in positions if position not in self._wind_speed))
+        self.misses += len(missing)
+        self.hits += len(positions) - len(missing)
+        forecasted = []
+        for position in missing:
+            value = engine.weather_forecast.value("wind_speed", self.tick, position)
+            if value is not None:
+                self._wind_speed[position] = value
+                forecasted.append(position)
+        if forecasted:
+            self.forecast_hits += len(forecasted)
+            missing = [position for position in missing if position not in self._wind_speed]
+        if missing:
+            missing_speeds = calculate_wind_speeds(
+                [position[0] for position in missing],
+                [position[1] for position in missing],
+                total_seconds,
+                engine.data["random_seed"],
+            )
+            self._wind_speed.update(zip(missing, missing_speeds.tolist(), strict=True))
+        return np.fromiter((self._wind_speed[position] for position in positions), dtype=np.float64, count=len(x))
+
+    def fill(self, engine, wind_positions, solar_positions):
+        """Calculates the wind speed and irradiance of the current tick at lists of (x, y) positions"""
+        self.positions = set(wind_positions) | set(solar_positions)
+        self.wind_speeds(engine, [x for x, _ in wind_positions], [y for _, y in wind_positions])
+        for x, y in solar_positions:
+            self.solar_irradiance(engine, x, y)
+
+    def package(self):
+        """Packages the hit and miss counters of the cache"""
+        requests = self.hits + self.misses
+        return {
+            "tick": self.tick,
+            "entries": len(self._irradiance) + len(self._wind_speed),
+            "hits": self.hits,
+            "misses": self.misses,
+            "forecast_hits": self.forecast_hits,
+            "hit_rate": self.hits / requests if requests > 0 else None,
+        }
@@ -0,0 +1,233 @@
+"""
+Precomputation of the weather of the next ticks. The weather only depends on the position, the time and the random
+seed, so it is calculated ahead of time in a background thread and stored in memory-mapped arrays in
+`instance/server_data/weather_forecast`. The calculation is pure Python and holds the GIL, it competes with the ticks
+for the CPU: the forecast hides the latency of the weather calculation from the ticks, it doesn't add parallelism.
+"""
+
+import json
+import os
+import shutil
+
+import eventlet
+import numpy as np
+from eventlet import tpool
+
+from website.utils.weather import (
+    calculate_river_discharge,
+    calculate_solar_irradiance,
+    calculate_wind_speeds,
+    tile_position,
+)
+
+forecast_dir = "instance/server_data/weather_forecast"
+
+
+def calculate_forecast(positions, first_tick, ticks, delta_t, in_game_seconds_per_tick, random_seed, directory=None):
+    """
+    Calculates the wind speed, solar irradiance and river discharge at the (x, y) `positions` for `ticks` ticks from
+    `first_tick`. If `directory` is given the arrays are written there as .npy files, otherwise they are returned in
+    memory.
+    """
+
+    def new_array(name, shape):
+        if directory is None:
+            return np.empty(shape, dtype=np.float64)
+        path = os.path.join(directory, f"{name}.npy")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape)
+
+    x = [position[0] for position in positions]
+    y = [position[1] for position in positions]
+    arrays = {
+        "wind_speed": new_array("wind_speed", (ticks, len(positions))),
+        "solar_irradiance": new_array("solar_irradiance", (ticks, len(positions))),
+        "river_discharge": new_array("river_discharge", (ticks,)),
+    }
+    for k in range(ticks):
+        total_seconds = (first_tick + k + delta_t) * in_game_seconds_per_tick
+        if positions:
+            arrays["wind_speed"][k] = calculate_wind_speeds(x, y, total_seconds, random_seed)
+            arrays["solar_irradiance"][k] = [
+                calculate_solar_irradiance(xi, yi, total_seconds, random_seed) for xi, yi in positions
+            ]
+        arrays["river_discharge"][k] = calculate_river_discharge(total_seconds)
+    if directory is not None:
+        for array in arrays.values():
+            array.flush()
+    return arrays
+
+
+def write_forecast(positions, first_tick, ticks, delta_t, in_game_seconds_per_tick, random_seed, previous=None):
+    """
+    Calculates a forecast into a new directory and replaces the forecast directory with it. `previous` is the list of
+    positions and the arrays of the current forecast if it starts at the same tick: its columns are copied and only
+    the columns of the positions that are not in it are calculated.
+    """
+    new_dir = forecast_dir + ".new"
+    old_dir = forecast_dir + ".old"
+    shutil.rmtree(new_dir, ignore_errors=True)
+    os.makedirs(new_dir)
+    if previous is None:
+        calculate_forecast(positions, first_tick, ticks, delta_t, in_game_seconds_per_tick, random_seed, new_dir)
+    else:
+        previous_positions, previous_arrays = previous
+        known = set(previous_positions)
+        new_positions = [position for position in positions if position not in known]
+        added = calculate_forecast(new_positions, first_tick, ticks, delta_t, in_game_seconds_per_tick, random_seed)
+        positions = previous_positions + new_positions
+        for name in ["wind_speed", "solar_irradiance"]:
+            path = os.path.join(new_dir, f"{name}.npy")
+            array = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=(ticks, len(positions)))
+            array[:, : len(previous_positions)] = previous_arrays[name]
+            array[:, len(previous_positions) :] = added[name]
+            array.flush()
+        np.save(os.path.join(new_dir, "river_discharge.npy"), previous_arrays["river_discharge"])
+    np.save(os.path.join(new_dir, "positions.npy"), np.array(positions, dtype=np.float64).reshape(-1, 2))
+    meta = {
+        "first_tick": first_tick,
+        "ticks": ticks,
+        "delta_t": delta_t,
+        "in_game_seconds_per_tick": in_game_seconds_per_tick,
+        "random_seed": random_seed,
+    }
+    with open(os.path.join(new_dir, "meta.json"), "w") as file:
+        json.dump(meta, file)
+    # the arrays that are currently open stay valid after their files are removed
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.isdir(forecast_dir):
+        os.replace(forecast_dir, old_dir)
+    os.replace(new_dir, forecast_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class WeatherForecast:
+    """
+    Class that gives access to the weather precomputed for the next `ticks` ticks. The forecast is recalculated in a
+    background thread when half of it has been used and, at most every `position_check_interval` ticks, the columns
+    of the new facilities or players that have positions that are not in the forecast are added to it. Positions or
+    ticks that are not in the forecast are calculated by the `WeatherCache` as usual. `ticks` = 0 disables the
+    forecast.
+    """
+
+    position_check_interval = 10
+    # number of ticks calculated on request when the forecast is disabled
+    default_package_ticks = 72
+
+    def __init__(self, ticks=0):
+        self.ticks = ticks
+        self.first_tick = None
+        self.columns = {}  # (x, y) -> column in the arrays
+        self.arrays = {}
+        self.computing = False
+        self._last_position_check = None
+
+    def open(self, engine):
+        """Opens the forecast files if they match the parameters of the game"""
+        meta_path = os.path.join(forecast_dir, "meta.json")
+        if not os.path.isfile(meta_path):
+            return
+        with open(meta_path, "r") as file:
+            meta = json.load(file)
+        if (
+            meta["delta_t"] != engine.data["delta_t"]
+            or meta["in_game_seconds_per_tick"] != engine.in_game_seconds_per_tick
+            or meta["random_seed"] != engine.data["random_seed"]
+        ):
+            return
+        positions = np.load(os.path.join(forecast_dir, "positions.npy"))
+        self.arrays = {
+            name: np.load(os.path.join(forecast_dir, f"{name}.npy"), mmap_mode="r")
+            for name in ["wind_speed", "solar_irradiance", "river_discharge"]
+        }
+        self.columns = {(x, y): column for column, (x, y) in enumerate(positions.tolist())}
+        self.first_tick = meta["first_tick"]
+
+    def _row(self, tick):
+        if self.first_tick is None:
+            return None
+        if not self.first_tick <= tick < self.first_tick + len(self.arrays["river_discharge"]):
+            return None
+        return tick - self.first_tick
+
+    def value(self, name, tick, position):
+        """Returns the forecasted value of `name` at a tick and position, None if it is not in the forecast"""
+        row = self._row(tick)
+        column = self.columns.get(position)
+        if row is None or column is None:
+            return None
+        return float(self.arrays[name][row, column])
+
+    def update(self, engine):
+        """Starts the calculation of a new forecast in a background thread if the current one has to be renewed"""
+        if self.ticks <= 0 or self.computing:
+            return
+        total_t = engine.data["total_t"]
+        if self.first_tick is None:
+            self.open(engine)
+        expired = self.first_tick is None or total_t >= self.first_tick + self.ticks // 2
+        if not expired:
+            last_check = self._last_position_check
+            if last_check is not None and total_t - last_check < self.position_check_interval:
+                return
+            self._last_position_check = total_t
+        # the occupied tiles and the wind and solar facilities, collected by the last tick for the weather cache
+        positions = sorted(engine.weather_cache.positions)
+        if expired:
+            first_tick, ticks, previous = total_t + 1, self.ticks, None
+        else:
+            if all(position in self.columns for position in positions):
+                return
+            # only the new positions are calculated, for the ticks of the current forecast
+            first_tick, ticks = self.first_tick, len(self.arrays["river_discharge"])
+            previous = (sorted(self.columns, key=self.columns.get), self.arrays)
+        self.computing = True
+        eventlet.spawn(
+            self._compute,
+            engine,
+            positions,
+            first_tick,
+            ticks,
+            engine.data["delta_t"],
+            engine.in_game_seconds_per_tick,
+            engine.data["random_seed"],
+            previous,
+        )
+
+    def _compute(self, engine, *args):
+        try:
+            # the calculation runs in a native thread so that the server keeps answering the requests while it runs,
+            # but it holds the GIL most of the time and slows the ticks down
+            tpool.execute(write_forecast, *args)
+            self.open(engine)
+        except (OSError, ValueError, KeyError) as e:
+            engine.warn(f"The weather forecast could not be calculated: {e}")
+        finally:
+            self.computing = False
+
+    def package(self, engine, player):
+        """Packages the forecast of the weather at the tile of a player for the next ticks"""
+        total_t = engine.data["total_t"]
+        position = tile_position(player.tile)
+        first_row = self._row(total_t + 1)
+        if first_row is not None and position in self.columns:
+            column = self.columns[position]
+            forecast = {
+                "wind_speed": self.arrays["wind_speed"][first_row:, column].tolist(),
+                "solar_irradiance": self.arrays["solar_irradiance"][first_row:, column].tolist(),
+                "river_discharge": self.arrays["river_discharge"][first_row:].tolist(),
+            }
+        else:
+            forecast = calculate_forecast(
+                [position],
+                total_t + 1,
+                self.ticks if self.ticks > 0 else self.default_package_ticks,
+                engine.data["delta_t"],
+                engine.in_game_seconds_per_tick,
+                engine.data["random_seed"],
+            )
+            forecast = {
+                "wind_speed": forecast["wind_speed"][:, 0].tolist(),
+                "solar_irradiance": forecast["solar_irradiance"][:, 0].tolist(),
+                "river_discharge": forecast["river_discharge"].tolist(),
+            }
+        return {"first_tick": total_t + 1} | forecast